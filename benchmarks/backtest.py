@@ -0,0 +1,46 @@
+"""
+Measure the throughput of the vectorized backtester in candidate portfolios per second.
+
+Random long-only weight vectors over a synthetic universe are backtested with a mix of rebalancing
+schedules, in this process and sharded across worker processes::
+
+    python -m benchmarks.backtest --tickers 500 --years 5 --candidates 10000 --workers 1 4
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.main.analysis.backtest import backtest
+
+# The rebalancing schedules of the candidates: buy and hold, daily, weekly, monthly and quarterly
+SCHEDULES: list[int] = [0, 1, 5, 21, 63]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=10000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1])
+    args = parser.parse_args()
+
+    generator: np.random.Generator = np.random.default_rng(0)
+    returns: pd.DataFrame = pd.DataFrame(generator.normal(0.0004, 0.015, (252 * args.years, args.tickers)))
+    weights: np.ndarray = generator.dirichlet(np.ones(args.tickers), args.candidates)
+    rebalance_every: np.ndarray = generator.choice(SCHEDULES, args.candidates)
+
+    results: list[dict] = []
+    for workers in args.workers:
+        start: float = time.perf_counter()
+        backtest(returns, weights, rebalance_every, cost=0.001, max_workers=workers)
+        seconds: float = time.perf_counter() - start
+        results.append({"workers": workers, "seconds": seconds, "portfolios_per_second": args.candidates / seconds})
+    print(json.dumps({"tickers": args.tickers, "years": args.years, "candidates": args.candidates,
+                      "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Compare the pandas and polars engines cleaning the stock price data of a universe of tickers.
+
+The results of both engines are checked to be identical before the timings are reported::
+
+    python -m benchmarks.clean_stock_price_engines --tickers 500 --years 5
+"""
+import argparse
+import json
+import time
+
+import pandas as pd
+
+from benchmarks.fakes import synthetic_stock_price
+from src.main.data_models.stock_price_polars import clean_stock_price_universe
+
+ENGINES: list[str] = ["pandas", "polars"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    stock_prices: dict[str, pd.DataFrame] = {
+        f"T{seed}": synthetic_stock_price(252 * args.years, seed) for seed in range(args.tickers)
+    }
+    results: dict[str, dict] = {}
+    cleaned: dict[str, dict[str, pd.DataFrame]] = {}
+    for engine in ENGINES:
+        timings: list[float] = []
+        for _ in range(args.repeat):
+            start: float = time.perf_counter()
+            cleaned[engine] = clean_stock_price_universe(stock_prices, engine=engine)
+            timings.append(time.perf_counter() - start)
+        results[engine] = {"best_seconds": min(timings), "timings": timings}
+
+    mismatches: list[str] = [
+        ticker for ticker, frame in cleaned["pandas"].items() if not frame.equals(cleaned["polars"][ticker])
+    ]
+    print(json.dumps({"tickers": args.tickers, "years": args.years, "results": results,
+                      "speedup": results["pandas"]["best_seconds"] / results["polars"]["best_seconds"],
+                      "mismatched_tickers": mismatches}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
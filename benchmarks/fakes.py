@@ -0,0 +1,280 @@
+"""
+In-memory stand-ins for the firestore client and the openbb provider used by the benchmarks.
+"""
+import threading
+import time
+from types import SimpleNamespace
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.main.helpers.firestore_init import FirestoreDB
+
+OPERATORS: dict = {
+    "<": lambda a, b: a < b, "<=": lambda a, b: a <= b, "==": lambda a, b: a == b,
+    ">=": lambda a, b: a >= b, ">": lambda a, b: a > b,
+}
+
+
+class FakeSnapshot:
+    """
+    A document snapshot of the fake firestore client.
+    """
+
+    def __init__(self, doc_id: str, data: Optional[dict]):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[dict]:
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    """
+    A document reference of the fake firestore client, each call counts as one RPC.
+    """
+
+    def __init__(self, client: "FakeFirestoreClient", path: str):
+        self.client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def get(self) -> FakeSnapshot:
+        self.client.count(reads=1, rpcs=1)
+        return FakeSnapshot(self.id, self.client.documents.get(self.path))
+
+    def set(self, data: dict, merge: bool = False) -> None:
+        self.client.count(writes=1, rpcs=1)
+        self.client.put(self.path, data, merge)
+
+    def update(self, data: dict) -> None:
+        self.client.count(writes=1, rpcs=1)
+        self.client.put(self.path, data, True)
+
+
+class FakeQuery:
+    """
+    A query of the fake firestore client supporting order_by, where, limit, start_after, select and stream.
+    """
+
+    def __init__(self, client: "FakeFirestoreClient", path: str, order: Optional[tuple] = None,
+                 filters: tuple = (), limit: Optional[int] = None, cursor: Optional[dict] = None,
+                 fields: Optional[tuple] = None):
+        self.client = client
+        self.path = path
+        self._order = order
+        self._filters = filters
+        self._limit = limit
+        self._cursor = cursor
+        self._fields = fields
+
+    def _replace(self, **changes) -> "FakeQuery":
+        state: dict = {"order": self._order, "filters": self._filters, "limit": self._limit, "cursor": self._cursor,
+                       "fields": self._fields, **changes}
+        return FakeQuery(self.client, self.path, **state)
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "FakeQuery":
+        return self._replace(order=(field, direction == "DESCENDING"))
+
+    def where(self, field: str, operator: str, value) -> "FakeQuery":
+        return self._replace(filters=self._filters + ((field, operator, value),))
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._replace(limit=count)
+
+    def start_after(self, document_fields: dict) -> "FakeQuery":
+        return self._replace(cursor=document_fields)
+
+    def select(self, field_paths: list[str]) -> "FakeQuery":
+        return self._replace(fields=tuple(field_paths))
+
+    def stream(self) -> Iterator[FakeSnapshot]:
+        self.client.count(rpcs=1)
+        prefix: str = self.path + "/"
+        documents: list[tuple[str, dict]] = [
+            (path[len(prefix):], data) for path, data in list(self.client.documents.items())
+            if path.startswith(prefix) and "/" not in path[len(prefix):]
+        ]
+        for field, operator, value in self._filters:
+            documents = [(doc_id, data) for doc_id, data in documents
+                         if field in data and OPERATORS[operator](data[field], value)]
+        if self._order is not None:
+            field, descending = self._order
+            documents = [(doc_id, data) for doc_id, data in documents if field == "__name__" or field in data]
+            documents.sort(key=lambda item: item[0] if field == "__name__" else item[1][field], reverse=descending)
+            if self._cursor is not None:
+                documents = [(doc_id, data) for doc_id, data in documents
+                             if OPERATORS["<" if descending else ">"](data[field], self._cursor[field])]
+        for doc_id, data in documents[:self._limit]:
+            self.client.count(reads=1)
+            if self._fields is not None:
+                data = {field: data[field] for field in self._fields if field in data}
+            yield FakeSnapshot(doc_id, data)
+
+
+class FakeCollection(FakeQuery):
+    """
+    A collection reference of the fake firestore client.
+    """
+
+    def document(self, doc_id: str) -> FakeDocument:
+        return FakeDocument(self.client, f"{self.path}/{doc_id}")
+
+
+class FakeWriteBatch:
+    """
+    A write batch of the fake firestore client, committing counts as one RPC.
+    """
+
+    def __init__(self, client: "FakeFirestoreClient"):
+        self.client = client
+        self._writes: list[tuple[FakeDocument, dict, bool]] = []
+
+    def set(self, document: FakeDocument, data: dict, merge: bool = False) -> None:
+        self._writes.append((document, data, merge))
+
+    def commit(self) -> None:
+        if len(self._writes) > 500:
+            raise ValueError("A write batch holds at most 500 writes")
+        self.client.count(writes=len(self._writes), rpcs=1, commits=1)
+        for document, data, merge in self._writes:
+            self.client.put(document.path, data, merge)
+        self._writes = []
+
+
+class FakeFirestoreClient:
+    """
+    An in-memory firestore client counting document reads, writes and RPCs.
+
+    Attributes
+    ----------
+    documents: dict[str, dict]
+        The data of each document keyed by document path.
+    latency: float
+        The delay in seconds added to every RPC.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.documents: dict[str, dict] = {}
+        self.latency = latency
+        self.counters: dict[str, int] = {"reads": 0, "writes": 0, "rpcs": 0, "commits": 0}
+        self._lock = threading.Lock()
+
+    def count(self, **counts: int) -> None:
+        with self._lock:
+            for counter, value in counts.items():
+                self.counters[counter] += value
+        if counts.get("rpcs") and self.latency:
+            time.sleep(self.latency)
+
+    def put(self, path: str, data: dict, merge: bool) -> None:
+        with self._lock:
+            if merge and path in self.documents:
+                self.documents[path] = {**self.documents[path], **data}
+            else:
+                self.documents[path] = dict(data)
+
+    def collection(self, path: str) -> FakeCollection:
+        return FakeCollection(self, path)
+
+    def document(self, path: str) -> FakeDocument:
+        return FakeDocument(self, path)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def get_all(self, references: list[FakeDocument]) -> Iterator[FakeSnapshot]:
+        self.count(reads=len(references), rpcs=1)
+        for reference in references:
+            yield FakeSnapshot(reference.id, self.documents.get(reference.path))
+
+
+def fake_firestore_db(latency: float = 0.0) -> FirestoreDB:
+    """
+    Create a FirestoreDB backed by a FakeFirestoreClient instead of a firebase app.
+
+    Parameters
+    ----------
+    latency: float
+        The delay in seconds added to every RPC.
+
+    Returns
+    -------
+    FirestoreDB
+        A FirestoreDB whose db attribute is a FakeFirestoreClient.
+    """
+    firestore_db: FirestoreDB = FirestoreDB.__new__(FirestoreDB)
+    firestore_db.db = FakeFirestoreClient(latency=latency)
+    return firestore_db
+
+
+def synthetic_stock_price(n_days: int, seed: int, end_date: str = "2024-01-01") -> pd.DataFrame:
+    """
+    Generate raw stock price data following a random walk.
+
+    Parameters
+    ----------
+    n_days: int
+        The number of business days of data.
+    seed: int
+        The seed of the random number generator.
+    end_date: str
+        The date of the last bar.
+
+    Returns
+    -------
+    pd.DataFrame
+        Raw stock price data with a close column indexed by date, as returned by the provider.
+    """
+    rng: np.random.Generator = np.random.default_rng(seed)
+    dates: pd.DatetimeIndex = pd.bdate_range(end=end_date, periods=n_days)
+    close: np.ndarray = 100 * np.cumprod(1 + rng.normal(0, 0.01, n_days))
+    return pd.DataFrame({"close": close}, index=pd.Index(dates, name="date"))
+
+
+class StubProvider:
+    """
+    A stand-in for obb.equity.price.historical returning synthetic data after a configurable latency.
+
+    Attributes
+    ----------
+    latency: float
+        The delay in seconds of every request.
+    n_days: int
+        The number of business days returned for a symbol.
+    calls: int
+        The number of requests made.
+    """
+
+    def __init__(self, latency: float = 0.0, n_days: int = 252):
+        self.latency = latency
+        self.n_days = n_days
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def historical(self, symbol: str, provider: str = "", start_date: Optional[str] = None,
+                   end_date: Optional[str] = None, interval: str = "1d", **kwargs) -> SimpleNamespace:
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        frames: list[pd.DataFrame] = []
+        for ticker in symbol.split(","):
+            frame: pd.DataFrame = synthetic_stock_price(self.n_days, seed=sum(map(ord, ticker)))
+            if start_date is not None:
+                frame = frame.loc[frame.index >= pd.Timestamp(start_date)]
+            if end_date is not None:
+                frame = frame.loc[frame.index <= pd.Timestamp(end_date)]
+            if "," in symbol:
+                frame = frame.assign(symbol=ticker)
+            frames.append(frame)
+        stock_price: pd.DataFrame = pd.concat(frames)
+        return SimpleNamespace(to_df=lambda: stock_price)
+
+    def as_obb(self) -> SimpleNamespace:
+        """
+        Get an object with the obb.equity.price.historical layout calling this stub.
+        """
+        return SimpleNamespace(equity=SimpleNamespace(price=SimpleNamespace(historical=self.historical)))
@@ -0,0 +1,111 @@
+"""
+Measure the import time of the pipeline modules with python -X importtime and check for regressions.
+
+Each target is imported in a fresh interpreter, the cumulative import time is reported, and the run
+fails if a target imports one of the heavy SDKs or exceeds its time budget::
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms 1500 --output import_time.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# The modules or command lines to measure, each run in a fresh interpreter
+TARGETS: dict[str, list[str]] = {
+    "cli --help": ["-m", "src.main.cli", "--help"],
+    "src.main.app": ["-c", "import src.main.app"],
+    "src.main.data_models.stock_price_data": ["-c", "import src.main.data_models.stock_price_data"],
+    "src.main.helpers.firestore_update": ["-c", "import src.main.helpers.firestore_update"],
+}
+# The SDKs which must only be imported by the code paths calling them
+HEAVY_MODULES: list[str] = ["openbb", "firebase_admin"]
+# The root of the repository, where the targets are run so that the src and config packages are found
+PROJECT_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(arguments: list[str]) -> tuple[dict[str, int], dict[str, int]]:
+    """
+    Run the interpreter with -X importtime and get the cumulative import time of the imported modules.
+
+    Parameters
+    ----------
+    arguments: list[str]
+        The arguments of the interpreter after -X importtime, run from the root of the repository.
+
+    Returns
+    -------
+    tuple[dict[str, int], dict[str, int]]
+        The cumulative import time in microseconds of each module imported at the top level, and of
+        every module imported at any depth.
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime", *arguments], cwd=PROJECT_DIR, capture_output=True,
+                             text=True)
+    top_level: dict[str, int] = {}
+    modules: dict[str, int] = {}
+    for line in process.stderr.splitlines():
+        # Lines read 'import time: <self us> | <cumulative us> | <indentation><module>'
+        if not line.startswith("import time:") or line.startswith("import time: self"):
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        modules[module.strip()] = int(cumulative)
+        if not module.startswith("  "):
+            top_level[module.strip()] = int(cumulative)
+    return top_level, modules
+
+
+def measure(budget_ms: float) -> tuple[list[dict], bool]:
+    """
+    Measure every target and check it against the heavy modules and the time budget.
+
+    Parameters
+    ----------
+    budget_ms: float
+        The maximum total import time of a target in milliseconds.
+
+    Returns
+    -------
+    tuple[list[dict], bool]
+        One result per target with its total import time, slowest modules and heavy modules
+        imported, and whether every target passed.
+    """
+    results: list[dict] = []
+    passed: bool = True
+    for target, arguments in TARGETS.items():
+        top_level, modules = import_times(arguments)
+        total_ms: float = sum(top_level.values()) / 1000
+        heavy: list[str] = [module for module in HEAVY_MODULES if module in modules]
+        # The slowest third-party packages, the modules of this repository include them
+        packages: dict[str, int] = {module: cumulative for module, cumulative in modules.items()
+                                    if "." not in module and module not in ("src", "config")}
+        slowest: list[tuple[str, float]] = [(module, cumulative / 1000) for module, cumulative in
+                                            sorted(packages.items(), key=lambda item: -item[1])[:5]]
+        ok: bool = not heavy and total_ms <= budget_ms
+        passed = passed and ok
+        results.append({"target": target, "total_ms": total_ms, "slowest_ms": slowest, "heavy_modules": heavy,
+                        "ok": ok})
+    return results, passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=2000,
+                        help="maximum import time of each target in milliseconds")
+    parser.add_argument("--output", help="file to write the JSON results to")
+    args = parser.parse_args()
+
+    results, passed = measure(args.budget_ms)
+    for result in results:
+        slowest: str = ", ".join(f"{module} {ms:.0f}ms" for module, ms in result["slowest_ms"])
+        print(f"{'ok  ' if result['ok'] else 'FAIL'} {result['target']:40} {result['total_ms']:>8.1f}ms  {slowest}"
+              + (f"  imports {', '.join(result['heavy_modules'])}" if result["heavy_modules"] else ""))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Load test the query service and report the latency percentiles of cold and hot queries.
+
+A synthetic universe is written to a local panel store in a temporary directory and served on a local port,
+and concurrent clients with keep-alive connections send series and panel queries::
+
+    python -m benchmarks.query_service --tickers 500 --years 20 --requests 5000 --clients 4
+"""
+import argparse
+import http.client
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.main.data_models.stock_price_data import ColumnarStockData, clean_stock_price_panel, split_stock_price_panel
+from src.main.helpers.local_store import LocalPanelStore
+from src.main.helpers.query_service import QueryServer, QueryService, local_store_loader
+
+
+def synthetic_store(directory: str, tickers: int, years: int) -> list[str]:
+    """
+    Write random walks of the tickers over the years of business days to a local panel store, and return the tickers.
+    """
+    dates: pd.DatetimeIndex = pd.bdate_range(end="2024-01-01", periods=252 * years)
+    generator: np.random.Generator = np.random.default_rng(0)
+    symbols: list[str] = [f"T{position:05d}" for position in range(tickers)]
+    close: pd.DataFrame = pd.DataFrame(100 * np.exp(np.cumsum(generator.normal(0, 0.01, (len(dates), tickers)),
+                                                              axis=0)), index=dates, columns=symbols)
+    local_store: LocalPanelStore = LocalPanelStore(directory)
+    for ticker, frame in split_stock_price_panel(clean_stock_price_panel(close)).items():
+        local_store.write(ColumnarStockData(ticker=ticker, frame=frame))
+    return symbols
+
+
+def percentiles(latencies: list[float]) -> dict:
+    """
+    Summarize the latencies in seconds as their count and percentiles in milliseconds.
+    """
+    milliseconds: np.ndarray = np.asarray(latencies) * 1000
+    return {"requests": len(milliseconds), "p50_ms": float(np.percentile(milliseconds, 50)),
+            "p99_ms": float(np.percentile(milliseconds, 99)), "max_ms": float(milliseconds.max())}
+
+
+def run_clients(port: int, paths: list[str], clients: int) -> tuple[list[float], float]:
+    """
+    Send the GET requests from concurrent clients, each with its own keep-alive connection.
+
+    Returns
+    -------
+    tuple[list[float], float]
+        The latency of each request in seconds, and the elapsed time.
+    """
+    def client(client_paths: list[str]) -> list[float]:
+        connection: http.client.HTTPConnection = http.client.HTTPConnection("127.0.0.1", port)
+        latencies: list[float] = []
+        for path in client_paths:
+            start: float = time.perf_counter()
+            connection.request("GET", path)
+            response: http.client.HTTPResponse = connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+            if response.status != 200:
+                raise RuntimeError(f"GET {path} returned {response.status}")
+        connection.close()
+        return latencies
+
+    start: float = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results: list[list[float]] = list(executor.map(client, [paths[index::clients] for index in range(clients)]))
+    return [latency for latencies in results for latency in latencies], time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--panel-size", type=int, default=20)
+    parser.add_argument("--hot-queries", type=int, default=100, help="distinct queries repeated by the hot cases")
+    parser.add_argument("--cache-mb", type=int, default=256)
+    args = parser.parse_args()
+
+    generator: np.random.Generator = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as directory:
+        symbols: list[str] = synthetic_store(directory, args.tickers, args.years)
+        service: QueryService = QueryService(local_store_loader(LocalPanelStore(directory)),
+                                             max_bytes=args.cache_mb * 2 ** 20)
+        server: QueryServer = QueryServer(("127.0.0.1", 0), service)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port: int = server.server_address[1]
+
+        def series_path() -> str:
+            start_year: int = 2024 - int(generator.integers(1, args.years + 1))
+            return f"/series/{generator.choice(symbols)}?start={start_year}-01-01"
+
+        def panel_path() -> str:
+            tickers: np.ndarray = generator.choice(symbols, min(args.panel_size, len(symbols)), replace=False)
+            return f"/panel?tickers={','.join(tickers)}&start={2024 - args.years // 2}-01-01"
+
+        cases: dict[str, list[str]] = {
+            "cold_series": [f"/series/{ticker}" for ticker in symbols],
+            "hot_series": [series_path() for _ in range(args.hot_queries)],
+            "hot_panel": [panel_path() for _ in range(args.hot_queries)],
+        }
+        results: list[dict] = []
+        for case, queries in cases.items():
+            service.invalidate()
+            if case == "cold_series":
+                paths: list[str] = queries
+            else:
+                # Answer each query once, so that the measured requests are all cache hits
+                run_clients(port, queries, args.clients)
+                paths = [queries[index] for index in generator.integers(0, len(queries), args.requests)]
+            latencies, seconds = run_clients(port, paths, args.clients)
+            results.append({"case": case, **percentiles(latencies), "requests_per_second": len(paths) / seconds})
+        server.shutdown()
+        server.server_close()
+    print(json.dumps({"tickers": args.tickers, "years": args.years, "clients": args.clients,
+                      "cache": service.cache.stats(), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
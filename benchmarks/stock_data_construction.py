@@ -0,0 +1,97 @@
+"""
+Compare the construction time and peak memory of StockData and ColumnarStockData.
+
+Each variant runs in its own process so that its peak resident set size is measured in isolation::
+
+    python -m benchmarks.stock_data_construction --tickers 500 --years 5
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.fakes import synthetic_stock_price
+from src.main.data_models.stock_price_data import (ColumnarStockData, StockData, StockPriceData,
+                                                   clean_stock_price)
+
+VARIANTS: list[str] = ["stock_data", "columnar_stock_data"]
+
+
+def peak_rss_mib() -> float:
+    """
+    Get the peak resident set size of the current process in MiB.
+    """
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in KiB elsewhere
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def run_variant(variant: str, tickers: int, years: int) -> dict:
+    """
+    Build the stock data of the given number of tickers and years with one variant.
+
+    Parameters
+    ----------
+    variant: str
+        'stock_data' to build one StockPriceData per bar, or 'columnar_stock_data'.
+    tickers: int
+        The number of tickers.
+    years: int
+        The number of years of daily bars per ticker.
+
+    Returns
+    -------
+    dict
+        The construction time in seconds and the peak memory in MiB, before and after construction.
+    """
+    frames: list[pd.DataFrame] = [clean_stock_price(synthetic_stock_price(252 * years, seed))
+                                  for seed in range(tickers)]
+    rss_before: float = peak_rss_mib()
+    start: float = time.perf_counter()
+    if variant == "stock_data":
+        stock_data_list: list = [
+            StockData(ticker=f"T{i}", stock_price_data=[
+                StockPriceData(**{str(k): v for k, v in data.items()}) for data in frame.to_dict("records")
+            ]) for i, frame in enumerate(frames)
+        ]
+    else:
+        stock_data_list = [ColumnarStockData(ticker=f"T{i}", frame=frame) for i, frame in enumerate(frames)]
+    elapsed: float = time.perf_counter() - start
+    return {
+        "variant": variant,
+        "tickers": tickers,
+        "years": years,
+        "construction_seconds": elapsed,
+        "peak_rss_mib_before": rss_before,
+        "peak_rss_mib_after": peak_rss_mib(),
+        "objects": len(stock_data_list),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--variant", choices=VARIANTS, help="run a single variant in this process")
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args.tickers, args.years)))
+        return
+    results: list[dict] = []
+    for variant in VARIANTS:
+        output: str = subprocess.run(
+            [sys.executable, "-m", "benchmarks.stock_data_construction", "--variant", variant,
+             "--tickers", str(args.tickers), "--years", str(args.years)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
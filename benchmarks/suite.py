@@ -0,0 +1,179 @@
+"""
+Benchmark the hot paths of the ingestion pipeline on synthetic data and write the results as JSON.
+
+Each case runs on every combination of ticker count and years of daily bars, and the firestore cases
+run against an in-memory client counting RPCs::
+
+    python -m benchmarks.suite --tickers 1 50 500 --years 1 5 20 --output bench.json
+    python -m benchmarks.suite --compare baseline.json bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import time
+from typing import Callable
+
+import pandas as pd
+
+import src.main.data_models.stock_price_data as stock_price_data
+from benchmarks.fakes import StubProvider, fake_firestore_db, synthetic_stock_price
+from src.main.app import fetch_stock_data_concurrently, log_stock_data
+from src.main.data_models.stock_price_data import ColumnarStockData, StockData, StockPriceData, clean_stock_price
+from src.main.helpers.firestore_update import store_data
+from src.main.helpers.rate_limiter import ProviderRateLimiter
+
+
+def best_of(function: Callable[[], object], repeat: int) -> tuple[float, object]:
+    """
+    Run a function several times and return its fastest wall time and its last result.
+    """
+    timings: list[float] = []
+    result: object = None
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def stock_data_list(frames: list[pd.DataFrame]) -> list[StockData]:
+    return [
+        StockData(ticker=f"T{i}", stock_price_data=[
+            StockPriceData(**{str(k): v for k, v in data.items()}) for data in frame.to_dict("records")
+        ]) for i, frame in enumerate(frames)
+    ]
+
+
+def columnar_stock_data_list(frames: list[pd.DataFrame]) -> list[ColumnarStockData]:
+    return [ColumnarStockData(ticker=f"T{i}", frame=frame) for i, frame in enumerate(frames)]
+
+
+def run_cases(tickers: int, years: int, repeat: int, provider_latency: float) -> list[dict]:
+    """
+    Run every benchmark case on synthetic data of the given size.
+
+    Parameters
+    ----------
+    tickers: int
+        The number of tickers.
+    years: int
+        The number of years of daily bars per ticker.
+    repeat: int
+        The number of runs of each case, the fastest is reported.
+    provider_latency: float
+        The latency in seconds of each request to the stub provider.
+
+    Returns
+    -------
+    list[dict]
+        One result per case with its wall time, throughput and, for firestore cases, RPC counts.
+    """
+    n_days: int = 252 * years
+    rows: int = tickers * n_days
+    raw: list[pd.DataFrame] = [synthetic_stock_price(n_days, seed) for seed in range(tickers)]
+    frames: list[pd.DataFrame] = [clean_stock_price(frame) for frame in raw]
+    results: list[dict] = []
+
+    def record(case: str, seconds: float, **extra) -> None:
+        results.append({"case": case, "tickers": tickers, "years": years, "rows": rows, "seconds": seconds,
+                        "rows_per_second": rows / seconds if seconds else None, **extra})
+
+    seconds, _ = best_of(lambda: [clean_stock_price(frame) for frame in raw], repeat)
+    record("clean_stock_price", seconds)
+
+    seconds, _ = best_of(lambda: stock_data_list(frames), repeat)
+    record("stock_data_construction", seconds)
+
+    seconds, columnar_models = best_of(lambda: columnar_stock_data_list(frames), repeat)
+    record("columnar_stock_data_construction", seconds)
+
+    def log() -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            log_stock_data(columnar_models)
+
+    seconds, _ = best_of(log, repeat)
+    record("log_stock_data", seconds)
+
+    for layout in ("daily", "monthly"):
+        def store() -> dict:
+            firestore_db = fake_firestore_db()
+            with contextlib.redirect_stdout(io.StringIO()):
+                store_data(columnar_models, firestore_db, layout=layout)
+            return firestore_db.db.counters
+
+        seconds, counters = best_of(store, repeat)
+        record(f"store_data_{layout}", seconds, **counters)
+
+    stub: StubProvider = StubProvider(latency=provider_latency, n_days=n_days)
+    original_obb = stock_price_data.obb
+    stock_price_data.obb = stub.as_obb()
+    try:
+        limiter: ProviderRateLimiter = ProviderRateLimiter(requests_per_minute=10 ** 9)
+        seconds, _ = best_of(lambda: list(fetch_stock_data_concurrently(
+            [f"T{i}" for i in range(tickers)], rate_limiter=limiter)), repeat)
+    finally:
+        stock_price_data.obb = original_obb
+    record("fetch_stock_data", seconds, provider_calls=stub.calls // repeat, provider_latency=provider_latency)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], check=True, capture_output=True,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(baseline_path: str, candidate_path: str) -> None:
+    """
+    Print the ratio of the wall times of two benchmark result files, case by case.
+    """
+    with open(baseline_path) as baseline_file, open(candidate_path) as candidate_file:
+        baseline, candidate = json.load(baseline_file), json.load(candidate_file)
+
+    def key(result: dict) -> tuple:
+        return result["case"], result["tickers"], result["years"]
+
+    baseline_results: dict[tuple, dict] = {key(result): result for result in baseline["results"]}
+    print(f"{'case':36} {'tickers':>7} {'years':>5} {baseline['commit']:>10} {candidate['commit']:>10} {'ratio':>7}")
+    for result in candidate["results"]:
+        before: dict = baseline_results.get(key(result))
+        if before is None:
+            continue
+        print(f"{result['case']:36} {result['tickers']:>7} {result['years']:>5} {before['seconds']:>10.4f} "
+              f"{result['seconds']:>10.4f} {result['seconds'] / before['seconds']:>7.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickers", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--provider-latency", type=float, default=0.05)
+    parser.add_argument("--output", help="file to write the JSON results to, printed if not given")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+                        help="compare two result files instead of running the benchmarks")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    results: list[dict] = []
+    for tickers in args.tickers:
+        for years in args.years:
+            results.extend(run_cases(tickers, years, args.repeat, args.provider_latency))
+    report: str = json.dumps({"commit": git_commit(), "python": platform.python_version(),
+                              "timestamp": time.time(), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
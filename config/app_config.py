@@ -1,7 +1,56 @@
 from typing import Literal, cast
-from decouple import config
+from decouple import Csv, config
 
 DATA_PROVIDER: Literal['fmp', 'intrinio', 'polygon', 'tiingo', 'yfinance'] \
     = cast(Literal['fmp', 'intrinio', 'polygon', 'tiingo', 'yfinance'], config('DATA_PROVIDER', default='yfinance'))
 TICKER_SYMBOLS_LIST: str = str(config('TICKER_SYMBOLS_LIST', default="../../data/test.csv"))
 FIRESTORE_SERVICE_ACCOUNT: str = str(config('FIRESTORE_SERVICE_ACCOUNT', default=None))
+START_DATE: str = str(config('START_DATE', default="2024-01-01"))
+INCREMENTAL_FETCH: bool = bool(config('INCREMENTAL_FETCH', default=True, cast=bool))
+COLUMNAR_STOCK_DATA: bool = bool(config('COLUMNAR_STOCK_DATA', default=True, cast=bool))
+FETCH_MAX_WORKERS: int = int(config('FETCH_MAX_WORKERS', default=8, cast=int))
+PROVIDER_RATE_LIMIT: int = int(config('PROVIDER_RATE_LIMIT', default=120, cast=int))
+PROVIDER_BATCH_SIZE: int = int(config('PROVIDER_BATCH_SIZE', default=25, cast=int))
+HEDGE_PROVIDERS: list[str] = config('HEDGE_PROVIDERS', default="", cast=Csv())
+HEDGE_PERCENTILE: float = float(config('HEDGE_PERCENTILE', default=95, cast=float))
+HEDGE_MIN_SAMPLES: int = int(config('HEDGE_MIN_SAMPLES', default=20, cast=int))
+HEDGE_INITIAL_DELAY: float = float(config('HEDGE_INITIAL_DELAY', default=5, cast=float))
+HEDGE_MAX_WORKERS: int = int(config('HEDGE_MAX_WORKERS', default=16, cast=int))
+FIRESTORE_BATCH_SIZE: int = int(config('FIRESTORE_BATCH_SIZE', default=500, cast=int))
+STORE_MAX_WORKERS: int = int(config('STORE_MAX_WORKERS', default=8, cast=int))
+FIRESTORE_LAYOUT: Literal['daily', 'monthly', 'yearly'] \
+    = cast(Literal['daily', 'monthly', 'yearly'], config('FIRESTORE_LAYOUT', default='daily'))
+FIRESTORE_READ_MAX_WORKERS: int = int(config('FIRESTORE_READ_MAX_WORKERS', default=16, cast=int))
+FIRESTORE_READ_PAGE_SIZE: int = int(config('FIRESTORE_READ_PAGE_SIZE', default=1000, cast=int))
+STORE_MANIFEST: Literal['off', 'firestore', 'local'] \
+    = cast(Literal['off', 'firestore', 'local'], config('STORE_MANIFEST', default='firestore'))
+STORE_MANIFEST_DIR: str = str(config('STORE_MANIFEST_DIR', default=".cache/manifests"))
+LOCAL_STORE_ENABLED: bool = bool(config('LOCAL_STORE_ENABLED', default=False, cast=bool))
+LOCAL_STORE_DIR: str = str(config('LOCAL_STORE_DIR', default=".cache/panels"))
+RESAMPLE_INTERVALS: list[str] = config('RESAMPLE_INTERVALS', default="", cast=Csv())
+RUN_JOURNAL_PATH: str = str(config('RUN_JOURNAL_PATH', default=".cache/run_journal.sqlite"))
+RUN_RETRIES: int = int(config('RUN_RETRIES', default=2, cast=int))
+RUN_RETRY_BACKOFF: float = float(config('RUN_RETRY_BACKOFF', default=5, cast=float))
+VALIDATION_MODE: Literal['off', 'report', 'drop'] \
+    = cast(Literal['off', 'report', 'drop'], config('VALIDATION_MODE', default='off'))
+VALIDATION_SIGMA: float = float(config('VALIDATION_SIGMA', default=10, cast=float))
+QUERY_SERVICE_HOST: str = str(config('QUERY_SERVICE_HOST', default="127.0.0.1"))
+QUERY_SERVICE_PORT: int = int(config('QUERY_SERVICE_PORT', default=8050, cast=int))
+QUERY_SERVICE_URL: str = str(config('QUERY_SERVICE_URL', default=""))
+QUERY_SERVICE_SOURCE: Literal['firestore', 'local'] \
+    = cast(Literal['firestore', 'local'], config('QUERY_SERVICE_SOURCE', default='firestore'))
+QUERY_CACHE_MAX_MB: int = int(config('QUERY_CACHE_MAX_MB', default=256, cast=int))
+PIPELINE_MAX_IN_FLIGHT: int = int(config('PIPELINE_MAX_IN_FLIGHT', default=16, cast=int))
+DATAFRAME_ENGINE: Literal['pandas', 'polars'] \
+    = cast(Literal['pandas', 'polars'], config('DATAFRAME_ENGINE', default='pandas'))
+RESPONSE_CACHE_ENABLED: bool = bool(config('RESPONSE_CACHE_ENABLED', default=False, cast=bool))
+RESPONSE_CACHE_DIR: str = str(config('RESPONSE_CACHE_DIR', default=".cache/provider"))
+RESPONSE_CACHE_MAX_MB: int = int(config('RESPONSE_CACHE_MAX_MB', default=512, cast=int))
+RESPONSE_CACHE_TTL: float = float(config('RESPONSE_CACHE_TTL', default=900, cast=float))
+COVARIANCE_CACHE_PATH: str = str(config('COVARIANCE_CACHE_PATH', default=".cache/covariance.npz"))
+PORTFOLIO_MIN_HISTORY: int = int(config('PORTFOLIO_MIN_HISTORY', default=252, cast=int))
+BACKTEST_MAX_WORKERS: int = int(config('BACKTEST_MAX_WORKERS', default=1, cast=int))
+INSTRUMENTATION_ENABLED: bool = bool(config('INSTRUMENTATION_ENABLED', default=False, cast=bool))
+INSTRUMENTATION_DIR: str = str(config('INSTRUMENTATION_DIR', default="metrics"))
+INSTRUMENTATION_PROFILE: bool = bool(config('INSTRUMENTATION_PROFILE', default=False, cast=bool))
+INSTRUMENTATION_TRACEMALLOC: bool = bool(config('INSTRUMENTATION_TRACEMALLOC', default=False, cast=bool))
@@ -0,0 +1,178 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from config.app_config import BACKTEST_MAX_WORKERS
+from src.main.analysis.indicators import PERIODS_PER_YEAR
+
+# The metrics of each candidate portfolio, the columns of the frame returned by backtest
+BACKTEST_METRICS: list[str] = ["rebalance_every", "final_value", "cagr", "sharpe", "max_drawdown", "turnover"]
+
+
+def equity_curves(growth: np.ndarray, weights: np.ndarray, rebalance_every: int = 0,
+                  cost: float = 0.0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the equity curves of candidate portfolios sharing a rebalancing schedule.
+
+    Parameters
+    ----------
+    growth: np.ndarray
+        The gross returns 1 + r of the assets, with one row per period and one column per asset.
+    weights: np.ndarray
+        The target weights of the candidates, with one row per candidate and one column per asset.
+        The part of a row not invested in the assets is held in cash at a zero return.
+    rebalance_every: int
+        The number of periods between two rebalancings back to the target weights, 0 to buy and hold.
+    cost: float
+        The transaction cost as a fraction of the traded value, charged at each rebalancing.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The value of each candidate at the end of each period for a starting value of 1, with one
+        row per candidate, and the total turnover of each candidate, the sum of the absolute weight
+        changes of its rebalancings.
+
+    Notes
+    -----
+    1. Implementation Details
+        - Between two rebalancings the holdings drift with the prices, so the value of every
+          candidate over the block is one matrix product of the weights with the cumulative growth
+          of the assets since the start of the block. The loop runs over the blocks, not the candidates.
+    """
+    n_periods: int = len(growth)
+    cash: np.ndarray = 1 - weights.sum(axis=1)
+    curves: np.ndarray = np.empty((len(weights), n_periods))
+    turnover: np.ndarray = np.zeros(len(weights))
+    level: np.ndarray = np.ones(len(weights))
+    # The rebalancings are memory bound, so their P x N temporaries are computed in place in one buffer
+    absolute_weights: np.ndarray = np.abs(weights)
+    deviation: np.ndarray = np.empty_like(weights)
+    step: int = rebalance_every if rebalance_every > 0 else n_periods
+    for start in range(0, n_periods, step):
+        end: int = min(start + step, n_periods)
+        block_growth: np.ndarray = np.cumprod(growth[start:end], axis=0)
+        values: np.ndarray = weights @ block_growth.T + cash[:, None]
+        curves[:, start:end] = level[:, None] * values
+        level = curves[:, end - 1]
+        if end < n_periods:
+            # |w_i - w_i g_i / v| = |w_i| |g_i - v| / v, which avoids a P x N division
+            np.subtract(block_growth[-1], values[:, -1:], out=deviation)
+            np.abs(deviation, out=deviation)
+            traded: np.ndarray = np.einsum("ij,ij->i", absolute_weights, deviation) / values[:, -1]
+            turnover += traded
+            level = level * (1 - cost * traded)
+    return curves, turnover
+
+
+def performance_metrics(curves: np.ndarray, turnover: np.ndarray,
+                        periods_per_year: int = PERIODS_PER_YEAR) -> dict[str, np.ndarray]:
+    """
+    Calculate the performance metrics of equity curves starting at a value of 1.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        The 'final_value', the compound annual growth rate 'cagr', the annualized 'sharpe' ratio of
+        the period returns without risk-free rate, the 'max_drawdown' as a negative fraction and the
+        annualized 'turnover' of each curve.
+    """
+    n_periods: int = curves.shape[1]
+    years: float = n_periods / periods_per_year
+    with_start: np.ndarray = np.hstack([np.ones((len(curves), 1)), curves])
+    returns: np.ndarray = with_start[:, 1:] / with_start[:, :-1] - 1
+    volatility: np.ndarray = returns.std(axis=1, ddof=1) if n_periods > 1 else np.full(len(curves), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe: np.ndarray = returns.mean(axis=1) / volatility * np.sqrt(periods_per_year)
+    return {
+        "final_value": curves[:, -1],
+        "cagr": curves[:, -1] ** (1 / years) - 1,
+        "sharpe": np.where(volatility > 0, sharpe, np.nan),
+        "max_drawdown": (with_start / np.maximum.accumulate(with_start, axis=1) - 1).min(axis=1),
+        "turnover": turnover / years,
+    }
+
+
+def _backtest_shard(growth: np.ndarray, weights: np.ndarray, rebalance_every: np.ndarray, cost: float,
+                    periods_per_year: int, chunk_size: int) -> dict[str, np.ndarray]:
+    # The candidates are grouped by schedule and evaluated chunk_size at a time to bound the memory of the curves
+    metrics: dict[str, np.ndarray] = {metric: np.empty(len(weights)) for metric in BACKTEST_METRICS[1:]}
+    for schedule in np.unique(rebalance_every):
+        candidates: np.ndarray = np.flatnonzero(rebalance_every == schedule)
+        for start in range(0, len(candidates), chunk_size):
+            chunk: np.ndarray = candidates[start:start + chunk_size]
+            curves, turnover = equity_curves(growth, weights[chunk], int(schedule), cost)
+            for metric, values in performance_metrics(curves, turnover, periods_per_year).items():
+                metrics[metric][chunk] = values
+    return metrics
+
+
+def backtest(returns: pd.DataFrame, weights: Union[np.ndarray, pd.DataFrame],
+             rebalance_every: Union[int, np.ndarray] = 21, cost: float = 0.0,
+             periods_per_year: int = PERIODS_PER_YEAR, max_workers: Optional[int] = BACKTEST_MAX_WORKERS,
+             chunk_size: int = 1000) -> pd.DataFrame:
+    """
+    Backtest many candidate portfolios over a returns panel at once.
+
+    Parameters
+    ----------
+    returns: pd.DataFrame
+        The returns with one row per date and one column per ticker, e.g. from returns_matrix. A
+        missing return is taken as zero, the position being carried at its last price.
+    weights: Union[np.ndarray, pd.DataFrame]
+        The target weights of the candidates, with one row per candidate and one column per ticker
+        of `returns`. The columns of a DataFrame are aligned on the tickers.
+    rebalance_every: Union[int, np.ndarray]
+        The number of periods between two rebalancings, 0 to buy and hold, for every candidate or
+        one per candidate.
+    cost: float
+        The transaction cost as a fraction of the traded value.
+    periods_per_year: int
+        The number of periods of the returns in a year, to annualize the metrics.
+    max_workers: Optional[int]
+        The number of processes the candidates are sharded across, 1 to run in this process and
+        None for one per core.
+    chunk_size: int
+        The number of candidates whose equity curves are held in memory at once by each process.
+
+    Returns
+    -------
+    pd.DataFrame
+        The BACKTEST_METRICS of each candidate, with one row per candidate in the order of `weights`.
+
+    Notes
+    -----
+    1. Rationale
+        clean_stock_price computes the value of 1000 invested in a single ticker, while ranking
+        compositions of the universe needs the performance of thousands of weight vectors. The
+        equity curves of all the candidates sharing a schedule are batched matrix products, so
+        the cost is a few BLAS calls per rebalancing block rather than a Python loop per portfolio.
+
+    2. Implementation Details
+        - With several workers, the candidates are split into one contiguous shard per process,
+          each of which receives the growth matrix once.
+    """
+    if isinstance(weights, pd.DataFrame):
+        weights = weights.reindex(columns=returns.columns, fill_value=0.0)
+    weight_matrix: np.ndarray = np.atleast_2d(np.asarray(weights, dtype=float))
+    schedules: np.ndarray = np.broadcast_to(np.asarray(rebalance_every, dtype=int), len(weight_matrix))
+    growth: np.ndarray = 1 + np.nan_to_num(returns.to_numpy(dtype=float), nan=0.0)
+
+    workers: int = max_workers or os.cpu_count() or 1
+    shards: list[np.ndarray] = [shard for shard in np.array_split(np.arange(len(weight_matrix)), workers)
+                                if len(shard)]
+    if len(shards) <= 1:
+        metrics: dict[str, np.ndarray] = _backtest_shard(growth, weight_matrix, schedules, cost, periods_per_year,
+                                                         chunk_size)
+    else:
+        with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+            results = list(executor.map(_backtest_shard, [growth] * len(shards),
+                                        [weight_matrix[shard] for shard in shards],
+                                        [schedules[shard] for shard in shards], [cost] * len(shards),
+                                        [periods_per_year] * len(shards), [chunk_size] * len(shards)))
+        metrics = {metric: np.concatenate([result[metric] for result in results]) for metric in results[0]}
+    return pd.DataFrame({"rebalance_every": schedules, **metrics},
+                        index=weights.index if isinstance(weights, pd.DataFrame) else None)
@@ -0,0 +1,302 @@
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel
+
+# The default parameters of the indicators, shared by the panel functions and IndicatorState
+SMA_WINDOW: int = 20
+EMA_SPAN: int = 20
+RSI_WINDOW: int = 14
+MACD_FAST: int = 12
+MACD_SLOW: int = 26
+MACD_SIGNAL: int = 9
+BOLLINGER_WINDOW: int = 20
+BOLLINGER_STD: float = 2.0
+VOLATILITY_WINDOW: int = 20
+PERIODS_PER_YEAR: int = 252
+# The fields of the indicator values, stored next to the StockPriceData fields of each date document
+INDICATOR_FIELDS: list[str] = [
+    "sma", "ema", "rsi", "macd", "macd_signal", "macd_histogram", "bollinger_upper", "bollinger_lower",
+    "volatility", "drawdown"
+]
+
+
+def previous_close(close: pd.DataFrame) -> pd.DataFrame:
+    """
+    Get the previous close of each bar, skipping the dates on which a ticker has no bar.
+
+    Parameters
+    ----------
+    close: pd.DataFrame
+        The closing prices with one row per date and one column per ticker, NaN where a ticker has no bar.
+
+    Returns
+    -------
+    pd.DataFrame
+        The last non-NaN close of each ticker before each bar, NaN for the first bar and for dates
+        without a bar.
+    """
+    return close.ffill().shift(1).where(close.notna())
+
+
+def sma(close: pd.DataFrame, window: int = SMA_WINDOW) -> pd.DataFrame:
+    """
+    Calculate the simple moving average of the closing prices over a rolling window.
+    """
+    return close.rolling(window, min_periods=window).mean()
+
+
+def ema(close: pd.DataFrame, span: int = EMA_SPAN) -> pd.DataFrame:
+    """
+    Calculate the exponential moving average of the closing prices, with alpha = 2 / (span + 1).
+
+    Notes
+    -----
+    1. Implementation Details
+        - The average starts at the first close of each ticker and is updated recursively, without the
+          adjustment of the first values, so it can be continued one bar at a time by IndicatorState.
+        - Dates without a bar are skipped.
+    """
+    return close.ewm(span=span, adjust=False, ignore_na=True).mean().where(close.notna())
+
+
+def rsi(close: pd.DataFrame, window: int = RSI_WINDOW) -> pd.DataFrame:
+    """
+    Calculate the relative strength index of the closing prices with Wilder's smoothing.
+
+    Notes
+    -----
+    1. Implementation Details
+        - The average gain and loss are exponential moving averages with alpha = 1 / window of the
+          positive and negative close-to-close changes, starting at the first change.
+        - The index is NaN until a ticker has window changes, and 100 when its average loss is zero.
+    """
+    delta: pd.DataFrame = close - previous_close(close)
+    average_gain: pd.DataFrame = delta.clip(lower=0).ewm(alpha=1 / window, adjust=False, ignore_na=True,
+                                                         min_periods=window).mean()
+    average_loss: pd.DataFrame = (-delta).clip(lower=0).ewm(alpha=1 / window, adjust=False, ignore_na=True,
+                                                            min_periods=window).mean()
+    return (100 - 100 / (1 + average_gain / average_loss)).where(delta.notna())
+
+
+def macd(close: pd.DataFrame, fast: int = MACD_FAST, slow: int = MACD_SLOW,
+         signal: int = MACD_SIGNAL) -> dict[str, pd.DataFrame]:
+    """
+    Calculate the moving average convergence divergence of the closing prices.
+
+    Returns
+    -------
+    dict[str, pd.DataFrame]
+        The 'macd' line, the difference of the fast and slow exponential moving averages, its
+        'macd_signal' exponential moving average and the 'macd_histogram' difference of the two.
+    """
+    line: pd.DataFrame = ema(close, fast) - ema(close, slow)
+    signal_line: pd.DataFrame = ema(line, signal)
+    return {"macd": line, "macd_signal": signal_line, "macd_histogram": line - signal_line}
+
+
+def bollinger_bands(close: pd.DataFrame, window: int = BOLLINGER_WINDOW,
+                    num_std: float = BOLLINGER_STD) -> dict[str, pd.DataFrame]:
+    """
+    Calculate the Bollinger bands of the closing prices.
+
+    Returns
+    -------
+    dict[str, pd.DataFrame]
+        The 'bollinger_upper' and 'bollinger_lower' bands, num_std population standard deviations
+        above and below the simple moving average over the window.
+    """
+    middle: pd.DataFrame = sma(close, window)
+    deviation: pd.DataFrame = close.rolling(window, min_periods=window).std(ddof=0)
+    return {"bollinger_upper": middle + num_std * deviation, "bollinger_lower": middle - num_std * deviation}
+
+
+def rolling_volatility(close: pd.DataFrame, window: int = VOLATILITY_WINDOW,
+                       periods_per_year: int = PERIODS_PER_YEAR) -> pd.DataFrame:
+    """
+    Calculate the annualized volatility of the returns over a rolling window.
+    """
+    returns: pd.DataFrame = close / previous_close(close) - 1
+    return returns.rolling(window, min_periods=window).std() * np.sqrt(periods_per_year)
+
+
+def drawdown(close: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calculate the decline of the closing prices from their running maximum, as a negative fraction.
+    """
+    return close / close.cummax() - 1
+
+
+def indicator_panels(close: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """
+    Calculate every indicator of INDICATOR_FIELDS with its default parameters over a panel of closing prices.
+
+    Parameters
+    ----------
+    close: pd.DataFrame
+        The closing prices with one row per date and one column per ticker, NaN where a ticker has
+        no bar, e.g. as returned by to_close_panel.
+
+    Returns
+    -------
+    dict[str, pd.DataFrame]
+        Each indicator as a panel with the same index and columns as `close`, keyed by field.
+
+    Notes
+    -----
+    1. Rationale
+        Technical analysis models need the same indicators for every ticker of the universe.
+        Calculating them on the whole date x ticker panel runs each rolling window or exponential
+        average once for all tickers, instead of once per ticker.
+
+    2. Implementation Details
+        - The exponential averages and close-to-close changes skip the dates on which a ticker
+          has no bar, so they match IndicatorState fed with the ticker's bars.
+        - The rolling windows span dates, so a window containing a date without a bar is NaN.
+    """
+    return {
+        "sma": sma(close),
+        "ema": ema(close),
+        "rsi": rsi(close),
+        **macd(close),
+        **bollinger_bands(close),
+        "volatility": rolling_volatility(close),
+        "drawdown": drawdown(close),
+    }
+
+
+def indicator_records(panels: dict[str, pd.DataFrame], ticker: str) -> Iterator[dict]:
+    """
+    Iterate over the indicator values of a ticker as one dictionary per date.
+
+    Parameters
+    ----------
+    panels: dict[str, pd.DataFrame]
+        The indicator panels returned by indicator_panels, indexed by the date strings of the
+        stored date documents.
+    ticker: str
+        The ticker symbol of the stock.
+
+    Yields
+    ------
+    dict
+        The 'date' and the INDICATOR_FIELDS values of each date on which the ticker has a bar,
+        with None for the values which are not defined yet, ready to be merged into the date document.
+    """
+    columns: dict[str, np.ndarray] = {field: panels[field][ticker].to_numpy(dtype=float)
+                                      for field in INDICATOR_FIELDS}
+    has_bar: np.ndarray = ~np.isnan(columns["drawdown"])
+    dates: pd.Index = panels["drawdown"].index
+    for row in np.flatnonzero(has_bar):
+        yield {"date": str(dates[row]),
+               **{field: None if np.isnan(values[row]) else float(values[row]) for field, values in columns.items()}}
+
+
+def _ewm(average: Optional[float], value: float, alpha: float) -> float:
+    # The recursion of pandas ewm with adjust=False
+    return value if average is None else (1 - alpha) * average + alpha * value
+
+
+class IndicatorState(BaseModel):
+    """
+    Pydantic model for the compact state of the indicators of a ticker, updated one bar at a time.
+
+    Attributes
+    ----------
+    bars: int
+        The number of bars seen.
+    closes: list[float]
+        The closes of the last max(SMA_WINDOW, BOLLINGER_WINDOW) bars.
+    returns: list[float]
+        The returns of the last VOLATILITY_WINDOW bars.
+    ema, ema_fast, ema_slow, macd_signal: Optional[float]
+        The exponential moving averages of the closes, and of the MACD line for the signal.
+    average_gain, average_loss: Optional[float]
+        Wilder's averages of the close-to-close gains and losses of the RSI.
+    peak: Optional[float]
+        The highest close seen, for the drawdown.
+
+    Notes
+    -----
+    1. Rationale
+        Appending one daily bar to a ticker should not recompute its indicators over the whole
+        history. Every indicator of INDICATOR_FIELDS only depends on a fixed-size window of recent
+        values or on a running average, so this state updates them in O(1) per bar.
+
+    2. Compatibility
+        The values returned by update match those of indicator_panels for the same bars, within
+        floating point rounding. The state serializes with model_dump, so it can be stored next to
+        the stock price data and loaded back for the next run.
+    """
+    bars: int = 0
+    closes: list[float] = []
+    returns: list[float] = []
+    ema: Optional[float] = None
+    ema_fast: Optional[float] = None
+    ema_slow: Optional[float] = None
+    macd_signal: Optional[float] = None
+    average_gain: Optional[float] = None
+    average_loss: Optional[float] = None
+    peak: Optional[float] = None
+
+    @classmethod
+    def from_closes(cls, closes: Iterable[float]) -> "IndicatorState":
+        """
+        Build the state of a ticker from the closing prices of its history, in date order.
+        """
+        state: IndicatorState = cls()
+        for close in closes:
+            state.update(close)
+        return state
+
+    def update(self, close: float) -> dict[str, Optional[float]]:
+        """
+        Add the closing price of a new bar and get the indicator values of that bar.
+
+        Parameters
+        ----------
+        close: float
+            The closing price of the new bar.
+
+        Returns
+        -------
+        dict[str, Optional[float]]
+            The INDICATOR_FIELDS values of the bar, None for the values which are not defined yet.
+        """
+        close = float(close)
+        if self.closes:
+            last_close: float = self.closes[-1]
+            self.returns = (self.returns + [close / last_close - 1])[-VOLATILITY_WINDOW:]
+            change: float = close - last_close
+            self.average_gain = _ewm(self.average_gain, max(change, 0.0), 1 / RSI_WINDOW)
+            self.average_loss = _ewm(self.average_loss, max(-change, 0.0), 1 / RSI_WINDOW)
+        self.closes = (self.closes + [close])[-max(SMA_WINDOW, BOLLINGER_WINDOW):]
+        self.bars += 1
+        self.ema = _ewm(self.ema, close, 2 / (EMA_SPAN + 1))
+        self.ema_fast = _ewm(self.ema_fast, close, 2 / (MACD_FAST + 1))
+        self.ema_slow = _ewm(self.ema_slow, close, 2 / (MACD_SLOW + 1))
+        line: float = self.ema_fast - self.ema_slow
+        self.macd_signal = _ewm(self.macd_signal, line, 2 / (MACD_SIGNAL + 1))
+        self.peak = close if self.peak is None else max(self.peak, close)
+
+        values: dict[str, Optional[float]] = dict.fromkeys(INDICATOR_FIELDS)
+        if len(self.closes) >= SMA_WINDOW:
+            values["sma"] = float(np.mean(self.closes[-SMA_WINDOW:]))
+        values["ema"] = self.ema
+        if self.bars > RSI_WINDOW and (self.average_gain or self.average_loss):
+            values["rsi"] = (100.0 if self.average_loss == 0
+                             else 100 - 100 / (1 + self.average_gain / self.average_loss))
+        values["macd"] = line
+        values["macd_signal"] = self.macd_signal
+        values["macd_histogram"] = line - self.macd_signal
+        if len(self.closes) >= BOLLINGER_WINDOW:
+            window: np.ndarray = np.asarray(self.closes[-BOLLINGER_WINDOW:])
+            middle: float = float(window.mean())
+            deviation: float = float(window.std())
+            values["bollinger_upper"] = middle + BOLLINGER_STD * deviation
+            values["bollinger_lower"] = middle - BOLLINGER_STD * deviation
+        if len(self.returns) >= VOLATILITY_WINDOW:
+            values["volatility"] = float(np.std(self.returns, ddof=1) * np.sqrt(PERIODS_PER_YEAR))
+        values["drawdown"] = close / self.peak - 1
+        return values
@@ -0,0 +1,413 @@
+import os
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from config.app_config import COVARIANCE_CACHE_PATH, PORTFOLIO_MIN_HISTORY
+from src.main.analysis.indicators import previous_close
+from src.main.data_models.stock_price_data import ColumnarStockData, StockData, to_close_panel
+
+
+def returns_matrix(stock_data_list: Iterable[Union[StockData, ColumnarStockData]]) -> pd.DataFrame:
+    """
+    Build the date x ticker matrix of daily returns from the stock data of several tickers.
+
+    Parameters
+    ----------
+    stock_data_list: Iterable[Union[StockData, ColumnarStockData]]
+        The stock data of each ticker.
+
+    Returns
+    -------
+    pd.DataFrame
+        The close-to-close returns with one row per date string and one column per ticker, NaN on
+        the first bar of a ticker and on the dates on which it has no bar. Dates without any
+        return are dropped.
+    """
+    close: pd.DataFrame = to_close_panel(stock_data_list)
+    return (close / previous_close(close) - 1).dropna(how="all")
+
+
+class CovarianceCache:
+    """
+    Shrinkage covariance of the daily returns of a universe, updated one day at a time.
+
+    Attributes
+    ----------
+    tickers: list[str]
+        The tickers of the rows and columns of the covariance matrix.
+    count: int
+        The number of days of returns added.
+    last_date: Optional[str]
+        The date of the last day added, if known.
+
+    Notes
+    -----
+    1. Rationale
+        Re-optimizing a portfolio of about 500 assets every day should not recompute the 500 x 500
+        covariance matrix over the whole history. The cache keeps the running moments of the returns,
+        so a new day is added with rank-one updates in O(N^2), and the covariance is only rebuilt from
+        them when it is requested.
+
+    2. Implementation Details
+        - The running moments are the sums of the returns x, of the outer products x x^T, of the
+          squared norms a = x^T x, of a^2 and of a x. The sample covariance and the Ledoit-Wolf
+          shrinkage intensity are exact functions of them, so the incremental result equals the
+          one of a full recomputation, within floating point rounding.
+        - The sample covariance is shrunk towards a scaled identity matrix with the Ledoit-Wolf
+          intensity, which keeps the matrix well conditioned when there are fewer days than assets.
+        - The shrunk covariance is cached until the next update.
+    """
+
+    def __init__(self, tickers: list[str]):
+        """
+        Initialize an empty cache for the given tickers.
+        """
+        n_tickers: int = len(tickers)
+        self.tickers = list(tickers)
+        self.count = 0
+        self.last_date: Optional[str] = None
+        self._sum: np.ndarray = np.zeros(n_tickers)
+        self._outer_sum: np.ndarray = np.zeros((n_tickers, n_tickers))
+        self._norm_sum: float = 0.0
+        self._norm_square_sum: float = 0.0
+        self._norm_weighted_sum: np.ndarray = np.zeros(n_tickers)
+        self._covariance: Optional[np.ndarray] = None
+        self._shrinkage: Optional[float] = None
+
+    @classmethod
+    def from_returns(cls, returns: pd.DataFrame) -> "CovarianceCache":
+        """
+        Build the cache from a returns matrix, using the dates on which every ticker has a return.
+
+        The estimation window thus starts with the first return of the ticker with the shortest history,
+        see optimize_portfolio for the tickers with too short a history.
+
+        Parameters
+        ----------
+        returns: pd.DataFrame
+            The returns with one row per date and one column per ticker, e.g. from returns_matrix.
+
+        Returns
+        -------
+        CovarianceCache
+            The cache holding the moments of the complete rows of the returns.
+        """
+        cache: CovarianceCache = cls([str(ticker) for ticker in returns.columns])
+        complete: pd.DataFrame = returns.dropna()
+        values: np.ndarray = complete.to_numpy(dtype=float)
+        norms: np.ndarray = np.einsum("ij,ij->i", values, values)
+        cache.count = len(values)
+        cache.last_date = str(complete.index[-1]) if len(complete) else None
+        cache._sum = values.sum(axis=0)
+        cache._outer_sum = values.T @ values
+        cache._norm_sum = float(norms.sum())
+        cache._norm_square_sum = float(norms @ norms)
+        cache._norm_weighted_sum = norms @ values
+        return cache
+
+    def update(self, returns: Union[pd.Series, np.ndarray], date: Optional[str] = None) -> None:
+        """
+        Add the returns of a new day with rank-one updates of the moments.
+
+        Parameters
+        ----------
+        returns: Union[pd.Series, np.ndarray]
+            The returns of the day, a Series indexed by ticker or an array in the order of tickers.
+        date: Optional[str]
+            The date of the day.
+
+        Raises
+        ------
+        ValueError
+            If a return of the day is missing.
+        """
+        if isinstance(returns, pd.Series):
+            returns = returns.reindex(self.tickers)
+        values: np.ndarray = np.asarray(returns, dtype=float)
+        if values.shape != self._sum.shape or np.isnan(values).any():
+            raise ValueError(f"Expected a return for each of the {len(self.tickers)} tickers")
+        norm: float = float(values @ values)
+        self.count += 1
+        self._sum += values
+        self._outer_sum += np.outer(values, values)
+        self._norm_sum += norm
+        self._norm_square_sum += norm * norm
+        self._norm_weighted_sum += norm * values
+        self.last_date = date if date is not None else self.last_date
+        self._covariance = None
+        self._shrinkage = None
+
+    def extend(self, returns: pd.DataFrame) -> int:
+        """
+        Add the days of a returns matrix after last_date on which every ticker has a return.
+
+        Returns
+        -------
+        int
+            The number of days added.
+        """
+        new_days: pd.DataFrame = returns.reindex(columns=self.tickers)
+        if self.last_date is not None:
+            new_days = new_days.loc[new_days.index.astype(str) > self.last_date]
+        new_days = new_days.dropna()
+        for date, day in zip(new_days.index, new_days.to_numpy(dtype=float)):
+            self.update(day, date=str(date))
+        return len(new_days)
+
+    def mean(self) -> np.ndarray:
+        """
+        Get the mean daily return of each ticker.
+        """
+        return self._sum / self.count
+
+    def sample_covariance(self) -> np.ndarray:
+        """
+        Get the sample covariance of the daily returns, normalized by the number of days.
+        """
+        mean: np.ndarray = self.mean()
+        return self._outer_sum / self.count - np.outer(mean, mean)
+
+    def _shrink(self) -> None:
+        sample: np.ndarray = self.sample_covariance()
+        mean: np.ndarray = self.mean()
+        mean_norm: float = float(mean @ mean)
+        # The sum over the days of the squared norms of the demeaned returns, from the running moments
+        fourth_moment: float = (self._norm_square_sum
+                                - 4 * float(mean @ self._norm_weighted_sum)
+                                + 2 * mean_norm * self._norm_sum
+                                + 4 * float(mean @ self._outer_sum @ mean)
+                                - 4 * mean_norm * float(mean @ self._sum)
+                                + self.count * mean_norm ** 2)
+        target_variance: float = float(np.trace(sample)) / len(self.tickers)
+        target: np.ndarray = target_variance * np.eye(len(self.tickers))
+        distance: float = float(np.sum((sample - target) ** 2))
+        sample_norm: float = float(np.sum(sample ** 2))
+        estimation_error: float = min(max((fourth_moment - self.count * sample_norm) / self.count ** 2, 0.0),
+                                      distance)
+        self._shrinkage = estimation_error / distance if distance > 0 else 0.0
+        self._covariance = self._shrinkage * target + (1 - self._shrinkage) * sample
+
+    @property
+    def shrinkage(self) -> float:
+        """
+        Get the Ledoit-Wolf shrinkage intensity, between 0 and 1.
+        """
+        if self._shrinkage is None:
+            self._shrink()
+        return self._shrinkage
+
+    def covariance(self) -> np.ndarray:
+        """
+        Get the shrinkage covariance of the daily returns, computed once per update.
+        """
+        if self._covariance is None:
+            self._shrink()
+        return self._covariance
+
+    def save(self, path: str = COVARIANCE_CACHE_PATH) -> None:
+        """
+        Save the moments of the cache to a NumPy .npz file.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, tickers=np.array(self.tickers), count=self.count, last_date=np.array(self.last_date or ""),
+                 sum=self._sum, outer_sum=self._outer_sum, norm_sum=self._norm_sum,
+                 norm_square_sum=self._norm_square_sum, norm_weighted_sum=self._norm_weighted_sum)
+
+    @classmethod
+    def load(cls, path: str = COVARIANCE_CACHE_PATH) -> Optional["CovarianceCache"]:
+        """
+        Load a cache saved with save, or None if the file does not exist.
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as saved:
+            cache: CovarianceCache = cls([str(ticker) for ticker in saved["tickers"]])
+            cache.count = int(saved["count"])
+            cache.last_date = str(saved["last_date"]) or None
+            cache._sum = saved["sum"]
+            cache._outer_sum = saved["outer_sum"]
+            cache._norm_sum = float(saved["norm_sum"])
+            cache._norm_square_sum = float(saved["norm_square_sum"])
+            cache._norm_weighted_sum = saved["norm_weighted_sum"]
+        return cache
+
+
+def mean_variance_weights(expected_returns: np.ndarray, covariance: np.ndarray, risk_aversion: float = 1.0,
+                          long_only: bool = True) -> np.ndarray:
+    """
+    Calculate the fully invested weights maximizing the expected return minus the variance penalty.
+
+    Parameters
+    ----------
+    expected_returns: np.ndarray
+        The expected return of each asset.
+    covariance: np.ndarray
+        The covariance matrix of the returns of the assets.
+    risk_aversion: float
+        The weight lambda of the variance in the objective w^T mu - lambda / 2 w^T Sigma w.
+    long_only: bool
+        Whether short positions are excluded.
+
+    Returns
+    -------
+    np.ndarray
+        The weights of the assets, summing to 1.
+
+    Notes
+    -----
+    1. Implementation Details
+        - The optimum under the budget constraint has the closed form
+          w = Sigma^-1 (mu - gamma 1) / lambda, with gamma chosen so that the weights sum to 1.
+        - With long_only, the assets with negative weights are dropped and the weights are solved
+          again on the remaining assets, until no weight is negative.
+    """
+    expected_returns = np.asarray(expected_returns, dtype=float)
+    n_assets: int = len(expected_returns)
+    active: np.ndarray = np.ones(n_assets, dtype=bool)
+    weights: np.ndarray = np.zeros(n_assets)
+    while active.any():
+        sub_covariance: np.ndarray = covariance[np.ix_(active, active)]
+        solved: np.ndarray = np.linalg.solve(sub_covariance,
+                                             np.column_stack([np.ones(active.sum()), expected_returns[active]]))
+        inverse_ones, inverse_returns = solved[:, 0], solved[:, 1]
+        gamma: float = (inverse_returns.sum() - risk_aversion) / inverse_ones.sum()
+        active_weights: np.ndarray = (inverse_returns - gamma * inverse_ones) / risk_aversion
+        if not long_only or (active_weights >= 0).all():
+            weights[:] = 0.0
+            weights[active] = active_weights
+            return weights
+        active[np.flatnonzero(active)[active_weights < 0]] = False
+    raise ValueError("No long-only portfolio found")
+
+
+def minimum_variance_weights(covariance: np.ndarray, long_only: bool = True) -> np.ndarray:
+    """
+    Calculate the fully invested weights of minimum variance.
+
+    Parameters
+    ----------
+    covariance: np.ndarray
+        The covariance matrix of the returns of the assets.
+    long_only: bool
+        Whether short positions are excluded.
+
+    Returns
+    -------
+    np.ndarray
+        The weights Sigma^-1 1 / (1^T Sigma^-1 1) of the assets, solved as mean_variance_weights with
+        zero expected returns.
+    """
+    return mean_variance_weights(np.zeros(len(covariance)), covariance, long_only=long_only)
+
+
+def risk_parity_weights(covariance: np.ndarray, tolerance: float = 1e-10, max_iterations: int = 1000) -> np.ndarray:
+    """
+    Calculate the long-only weights for which every asset contributes equally to the portfolio variance.
+
+    Parameters
+    ----------
+    covariance: np.ndarray
+        The covariance matrix of the returns of the assets.
+    tolerance: float
+        The largest change of a weight between two sweeps at which the iteration stops.
+    max_iterations: int
+        The maximum number of sweeps over the assets.
+
+    Returns
+    -------
+    np.ndarray
+        The weights of the assets, summing to 1.
+
+    Notes
+    -----
+    1. Implementation Details
+        - The weights minimize 1/2 y^T Sigma y - sum(log(y_i)) / N, whose solution has equal risk
+          contributions once normalized to sum to 1.
+        - The objective is minimized by cyclical coordinate descent, each coordinate being the
+          positive root of a quadratic equation, while the product Sigma y is updated in O(N)
+          per coordinate.
+    """
+    n_assets: int = len(covariance)
+    variances: np.ndarray = np.diag(covariance).astype(float)
+    budget: float = 1.0 / n_assets
+    weights: np.ndarray = 1.0 / np.sqrt(variances)
+    weights /= np.sqrt(weights @ covariance @ weights)
+    product: np.ndarray = covariance @ weights
+    for _ in range(max_iterations):
+        largest_change: float = 0.0
+        for i in range(n_assets):
+            others: float = product[i] - variances[i] * weights[i]
+            weight: float = (-others + np.sqrt(others * others + 4 * variances[i] * budget)) / (2 * variances[i])
+            change: float = weight - weights[i]
+            product += covariance[:, i] * change
+            weights[i] = weight
+            largest_change = max(largest_change, abs(change))
+        if largest_change < tolerance:
+            break
+    return weights / weights.sum()
+
+
+def optimize_portfolio(returns: pd.DataFrame, method: str = "minimum_variance",
+                       cache: Optional[CovarianceCache] = None, risk_aversion: float = 1.0,
+                       long_only: bool = True,
+                       min_history: int = PORTFOLIO_MIN_HISTORY) -> tuple[pd.Series, CovarianceCache]:
+    """
+    Calculate the weights of a portfolio of the tickers of a returns matrix, reusing a covariance cache.
+
+    Parameters
+    ----------
+    returns: pd.DataFrame
+        The returns with one row per date and one column per ticker, e.g. from returns_matrix.
+    method: str
+        'minimum_variance', 'mean_variance' or 'risk_parity'.
+    cache: Optional[CovarianceCache]
+        The covariance cache of a previous run. It is extended with the days after its last date if
+        it covers the same tickers, and rebuilt from the returns otherwise.
+    risk_aversion: float
+        The risk aversion of the mean-variance objective.
+    long_only: bool
+        Whether short positions are excluded, risk parity weights are always positive.
+    min_history: int
+        The minimum number of returns of a ticker for it to be included in the portfolio.
+
+    Returns
+    -------
+    tuple[pd.Series, CovarianceCache]
+        The weights indexed by ticker, 0 for the tickers with fewer than min_history returns, and
+        the updated cache of the other tickers to pass to the next run.
+
+    Raises
+    ------
+    ValueError
+        If no ticker has min_history returns, or the method is unknown.
+
+    Notes
+    -----
+    1. Rationale
+        The covariance is estimated on the dates on which every ticker has a return, so a single
+        recent listing would truncate the history of the whole universe to its own. The tickers
+        with fewer than min_history returns are left out of the portfolio instead, until they have
+        enough history, at which point the cache is rebuilt with them.
+    """
+    included: pd.Series = returns.count() >= min_history
+    if not included.any():
+        raise ValueError(f"No ticker has {min_history} returns")
+    all_tickers: list[str] = [str(ticker) for ticker in returns.columns]
+    returns = returns.loc[:, included]
+    tickers: list[str] = [str(ticker) for ticker in returns.columns]
+    if cache is None or cache.tickers != tickers:
+        cache = CovarianceCache.from_returns(returns)
+    else:
+        cache.extend(returns)
+    covariance: np.ndarray = cache.covariance()
+    if method == "minimum_variance":
+        weights: np.ndarray = minimum_variance_weights(covariance, long_only=long_only)
+    elif method == "mean_variance":
+        weights = mean_variance_weights(cache.mean(), covariance, risk_aversion=risk_aversion, long_only=long_only)
+    elif method == "risk_parity":
+        weights = risk_parity_weights(covariance)
+    else:
+        raise ValueError(f"Unknown method {method}, expected 'minimum_variance', 'mean_variance' or 'risk_parity'")
+    return pd.Series(weights, index=cache.tickers).reindex(all_tickers, fill_value=0.0), cache
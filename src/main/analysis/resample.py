@@ -0,0 +1,170 @@
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from src.main.data_models.stock_price_data import (DATE_FORMAT, STOCK_PRICE_FIELDS, ColumnarStockData, StockData,
+                                                   StockPriceData, clean_stock_price_panel, split_stock_price_panel,
+                                                   to_close_panel)
+
+# The pandas period frequency of each interval derived from the daily bars, keyed by its name in get_stock_data
+RESAMPLE_FREQUENCIES: dict[str, str] = {"1W": "W-FRI", "1M": "M"}
+
+
+def periods(dates: pd.Index, interval: str) -> pd.PeriodIndex:
+    """
+    Get the period of the given interval holding each date, weeks ending on Friday or months.
+
+    Raises
+    ------
+    ValueError
+        If the interval is not one of RESAMPLE_FREQUENCIES.
+    """
+    if interval not in RESAMPLE_FREQUENCIES:
+        raise ValueError(f"Unknown interval {interval}, expected one of {list(RESAMPLE_FREQUENCIES)}")
+    return pd.DatetimeIndex(pd.to_datetime(dates)).to_period(RESAMPLE_FREQUENCIES[interval])
+
+
+def period_labels(period_index: pd.PeriodIndex) -> pd.Index:
+    """
+    Get the date string labelling each period, its last calendar day, e.g. the Friday of a week.
+    """
+    return period_index.end_time.normalize().strftime(DATE_FORMAT)
+
+
+def resample_close_panel(close: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    Resample a panel of daily closing prices to the last close of each ticker in each period.
+
+    Parameters
+    ----------
+    close: pd.DataFrame
+        The daily closing prices with one row per date, in date order, and one column per ticker,
+        NaN where a ticker has no bar, e.g. as returned by to_close_panel.
+    interval: str
+        One of RESAMPLE_FREQUENCIES, '1W' or '1M'.
+
+    Returns
+    -------
+    pd.DataFrame
+        The closing prices with one row per period holding a date of `close`, indexed by the
+        period_labels, and the same columns. A ticker without a bar in a period is NaN.
+
+    Notes
+    -----
+    1. Implementation Details
+        - The rows of a period are contiguous, so the last row of each period is found by comparing
+          the period ordinals of consecutive rows, and only the labels of the periods are formatted.
+        - The last bar of each ticker up to each row is carried forward with a running maximum of
+          the row numbers, as in clean_stock_price_panel, and taken at the last row of each period
+          if it falls within the period, for all tickers at once.
+    """
+    period_index: pd.PeriodIndex = periods(close.index, interval)
+    values: np.ndarray = close.to_numpy(dtype=float)
+    n_dates, n_tickers = values.shape
+    if not n_dates:
+        return pd.DataFrame(values, index=pd.Index([], name=close.index.name), columns=close.columns)
+    ordinals: np.ndarray = period_index.asi8
+    last_rows: np.ndarray = np.append(np.flatnonzero(ordinals[1:] != ordinals[:-1]), n_dates - 1)
+    first_rows: np.ndarray = np.insert(last_rows[:-1] + 1, 0, 0)
+
+    last_valid_row: np.ndarray = np.where(~np.isnan(values), np.arange(n_dates)[:, None], -1)
+    np.maximum.accumulate(last_valid_row, axis=0, out=last_valid_row)
+    period_rows: np.ndarray = last_valid_row[last_rows]
+    resampled: np.ndarray = np.where(period_rows >= first_rows[:, None],
+                                     values[np.maximum(period_rows, 0), np.arange(n_tickers)], np.nan)
+    return pd.DataFrame(resampled, index=pd.Index(period_labels(period_index[last_rows]), name=close.index.name),
+                        columns=close.columns)
+
+
+def resample_stock_price_panel(close: pd.DataFrame, interval: str,
+                               last_stock_prices: Optional[dict[str, Optional[StockPriceData]]] = None
+                               ) -> dict[str, pd.DataFrame]:
+    """
+    Calculate the stock price metrics of an interval from a panel of daily closing prices.
+
+    Parameters
+    ----------
+    close: pd.DataFrame
+        The daily closing prices with one row per date, in date order, and one column per ticker.
+    interval: str
+        One of RESAMPLE_FREQUENCIES, '1W' or '1M'.
+    last_stock_prices: Optional[dict[str, Optional[StockPriceData]]]
+        The most recent bar of the interval already stored for each ticker, if any. The metrics of
+        the tickers with a stored bar continue from it.
+
+    Returns
+    -------
+    dict[str, pd.DataFrame]
+        The metrics of clean_stock_price_panel calculated on the resampled closing prices, keyed by field.
+
+    Notes
+    -----
+    1. Rationale
+        The weekly and monthly bars are the last daily bar of each period, so they are derived from
+        the daily bars already fetched instead of requesting each interval from the provider.
+
+    2. Incremental updates
+        When only the daily bars after the stored ones are resampled, the first period of a ticker
+        either continues the last stored bar of the interval, or replaces it if the new daily bars
+        fall in the same period. In the first case, the returns and portfolio value continue from
+        the stored bar, as in clean_stock_price. In the second, they continue from the bar before
+        it, whose closing price and portfolio value are the stored ones divided by the stored
+        holding period return, so no other bar is read.
+    """
+    resampled: pd.DataFrame = resample_close_panel(close, interval)
+    last_stock_prices = last_stock_prices or {}
+    base_close: np.ndarray = np.full(len(resampled.columns), np.nan)
+    base_portfolio: np.ndarray = np.full(len(resampled.columns), np.nan)
+    for position, ticker in enumerate(resampled.columns):
+        last_stock_price: Optional[StockPriceData] = last_stock_prices.get(ticker)
+        first_valid = resampled[ticker].first_valid_index()
+        if last_stock_price is None or first_valid is None or first_valid < last_stock_price.date:
+            continue
+        if first_valid > last_stock_price.date:
+            base_close[position] = last_stock_price.closing_price
+            base_portfolio[position] = last_stock_price.portfolio_of_1000
+        elif pd.notna(last_stock_price.holding_period_return):
+            base_close[position] = last_stock_price.closing_price / last_stock_price.holding_period_return
+            base_portfolio[position] = last_stock_price.portfolio_of_1000 / last_stock_price.holding_period_return
+    if np.isnan(base_close).all():
+        return clean_stock_price_panel(resampled)
+
+    # Prepend the closing prices the tickers continue from as a row, and scale their portfolio values to match
+    extended: pd.DataFrame = pd.concat([pd.DataFrame([base_close], columns=resampled.columns), resampled])
+    panel: dict[str, pd.DataFrame] = {field: values.iloc[1:].set_axis(resampled.index)
+                                      for field, values in clean_stock_price_panel(extended).items()}
+    scale: np.ndarray = np.where(np.isnan(base_portfolio), 1.0, base_portfolio / 1000)
+    panel["portfolio_of_1000"] = panel["portfolio_of_1000"] * scale
+    return panel
+
+
+def resample_stock_data(stock_data_list: Iterable[Union[StockData, ColumnarStockData]], interval: str,
+                        last_stock_prices: Optional[dict[str, Optional[StockPriceData]]] = None
+                        ) -> list[ColumnarStockData]:
+    """
+    Derive the bars of an interval from the daily stock data of several tickers.
+
+    Parameters
+    ----------
+    stock_data_list: Iterable[Union[StockData, ColumnarStockData]]
+        The daily stock data of each ticker.
+    interval: str
+        One of RESAMPLE_FREQUENCIES, '1W' or '1M'.
+    last_stock_prices: Optional[dict[str, Optional[StockPriceData]]]
+        The most recent bar of the interval already stored for each ticker, if any, see
+        resample_stock_price_panel.
+
+    Returns
+    -------
+    list[ColumnarStockData]
+        The bars of the interval of each ticker, dated by the period_labels, in the given order.
+    """
+    stock_data_list = list(stock_data_list)
+    close: pd.DataFrame = to_close_panel(stock_data_list)
+    frames: dict[str, pd.DataFrame] = split_stock_price_panel(
+        resample_stock_price_panel(close, interval, last_stock_prices)
+    ) if len(close.columns) else {}
+    empty: pd.DataFrame = pd.DataFrame(columns=STOCK_PRICE_FIELDS)
+    return [ColumnarStockData(ticker=stock_data.ticker, frame=frames.get(stock_data.ticker, empty))
+            for stock_data in stock_data_list]
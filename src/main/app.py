@@ -1,12 +1,28 @@
 import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Iterator, Optional, TextIO, Union
 
-from config.app_config import DATA_PROVIDER, TICKER_SYMBOLS_LIST
-from src.main.helpers.read_csv import read_ticker_symbols
-from src.main.helpers.firestore_update import FirestoreDB, store_data
-from src.main.data_models.stock_price_data import get_stock_data, StockData
+from config.app_config import (COLUMNAR_STOCK_DATA, DATA_PROVIDER, FETCH_MAX_WORKERS, HEDGE_PROVIDERS,
+                               INCREMENTAL_FETCH, LOCAL_STORE_ENABLED, PIPELINE_MAX_IN_FLIGHT, PROVIDER_BATCH_SIZE,
+                               RESAMPLE_INTERVALS, RESPONSE_CACHE_ENABLED, START_DATE, STORE_MAX_WORKERS)
+from src.main.helpers.hedged_fetch import HedgedFetcher
+from src.main.helpers.instrumentation import instrumentation
+from src.main.helpers.local_store import LocalPanelStore
+from src.main.helpers.rate_limiter import ProviderRateLimiter
+from src.main.helpers.run_journal import RunJournal
+from src.main.helpers.response_cache import ProviderCache
+from src.main.helpers.firestore_update import (FirestoreDB, get_latest_stock_price, store_interval_data,
+                                               store_ticker_data)
+from src.main.data_models.stock_price_data import (get_stock_data, get_stock_data_batch, ColumnarStockData,
+                                                   MULTI_SYMBOL_PROVIDERS, StockData, StockPriceData)
 
 
-def fetch_stock_data(symbols) -> list[StockData]:
+def fetch_stock_data(symbols, max_workers: int = FETCH_MAX_WORKERS,
+                     rate_limiter: Optional[ProviderRateLimiter] = None,
+                     firestore_db: Optional[FirestoreDB] = None) -> list[Union[StockData, ColumnarStockData]]:
     """
     Fetch stock data for given symbols.
 
@@ -14,20 +30,189 @@ def fetch_stock_data(symbols) -> list[StockData]:
     ----------
     symbols : list
         list of ticker symbols to fetch data for.
+    max_workers : int
+        maximum number of concurrent requests to the data provider.
+    rate_limiter : ProviderRateLimiter, optional
+        rate limiter shared by the workers, a new one is created if not given.
+    firestore_db : FirestoreDB, optional
+        if given, only the data after the latest date stored for each ticker is fetched.
 
     Returns
     -------
     list
-        list of stock data for each ticker symbol.
+        list of stock data for each ticker symbol that was fetched successfully, in completion order.
     """
-    ticker_list: list[StockData] = []
-    for ticker in symbols:
-        data: StockData = get_stock_data(symbol=ticker, provider=DATA_PROVIDER, start_date="2024-01-01", interval="1d")
+    ticker_list: list[Union[StockData, ColumnarStockData]] = []
+    failed: dict[str, Exception] = {}
+    for data in fetch_stock_data_concurrently(symbols, max_workers=max_workers, rate_limiter=rate_limiter,
+                                              firestore_db=firestore_db, failed=failed):
         # Append the data to the stock_ticker_list
         ticker_list.append(data)
+    if failed:
+        print(f"Failed to fetch {len(failed)} of {len(ticker_list) + len(failed)} tickers: {sorted(failed)}",
+              file=sys.stderr)
     return ticker_list
 
 
+def fetch_stock_data_concurrently(symbols, max_workers: int = FETCH_MAX_WORKERS,
+                                  rate_limiter: Optional[ProviderRateLimiter] = None,
+                                  firestore_db: Optional[FirestoreDB] = None,
+                                  failed: Optional[dict[str, Exception]] = None,
+                                  max_in_flight: Optional[int] = None,
+                                  cache: Optional[ProviderCache] = None,
+                                  provider: str = DATA_PROVIDER,
+                                  start_date: str = START_DATE,
+                                  end_date: Optional[str] = None,
+                                  batch_size: int = PROVIDER_BATCH_SIZE,
+                                  hedge: Optional[HedgedFetcher] = None
+                                  ) -> Iterator[Union[StockData, ColumnarStockData]]:
+    """
+    Fetch stock data for given symbols concurrently, yielding each result as soon as it completes.
+
+    Parameters
+    ----------
+    symbols : list
+        list of ticker symbols to fetch data for.
+    max_workers : int
+        maximum number of concurrent requests to the data provider.
+    rate_limiter : ProviderRateLimiter, optional
+        rate limiter shared by the workers, a new one is created if not given.
+    firestore_db : FirestoreDB, optional
+        if given, only the data after the latest date stored for each ticker is fetched.
+    failed : dict, optional
+        if given, the exception raised for every ticker that could not be fetched is recorded
+        here, keyed by ticker symbol.
+    max_in_flight : int, optional
+        if given, at most this many tickers are being fetched or waiting to be consumed at any
+        time, otherwise all tickers are submitted at once.
+    cache : ProviderCache, optional
+        on-disk cache of the provider responses, not used if not given.
+    provider : str
+        data provider to fetch the stock data from.
+    start_date : str
+        first date to fetch, in 'YYYY-MM-DD' format.
+    end_date : str, optional
+        last date to fetch, in 'YYYY-MM-DD' format, the latest available bar if not given.
+    batch_size : int
+        number of tickers per provider request, for the providers accepting several symbols.
+    hedge : HedgedFetcher, optional
+        if given, each request is hedged to its other providers when `provider` is slow or fails,
+        and the rate limiter of the HedgedFetcher is used if rate_limiter is not given.
+
+    Yields
+    ------
+    Union[StockData, ColumnarStockData]
+        stock data for each ticker symbol that was fetched successfully, in completion order.
+
+    Notes
+    -----
+    1. Rationale
+        Fetching one ticker at a time bounds a run by the sum of all provider round-trips.
+        Running the requests on a thread pool overlaps the network latency, while the shared
+        token bucket keeps the request rate within the provider's quota, so the run time
+        approaches what the rate limit allows.
+
+    2. Implementation Details
+        - Tickers are fetched in batches of batch_size when the provider is one of
+          MULTI_SYMBOL_PROVIDERS and neither a cache nor hedging is used, otherwise one at a time.
+          With max_in_flight, the batches are made small enough for max_workers of them to be in
+          flight at once, so that batching does not serialize the requests.
+        - Each worker acquires a token for the provider before each request, so a batch
+          costs a single token.
+        - In incremental mode, each worker first reads the latest stored date document of
+          its tickers concurrently, so the provider is only asked for the bars after it.
+        - If a batch request fails, or a ticker is missing from its response, the tickers are
+          requested one at a time.
+        - Results are yielded as they complete, so consumers can process a ticker while
+          the remaining tickers are still being fetched.
+        - With max_in_flight, the tickers submitted and not yet consumed are counted, and a new
+          batch is only submitted once it fits within max_in_flight, so a slow consumer holds
+          back the fetching and memory stays bounded.
+        - A failing ticker is reported on stderr and recorded in `failed`, the remaining
+          tickers are still fetched.
+    """
+    rate_limiter = rate_limiter or (hedge.rate_limiter if hedge is not None else ProviderRateLimiter())
+    if (str(getattr(provider, "value", provider)) not in MULTI_SYMBOL_PROVIDERS or cache is not None
+            or hedge is not None):
+        batch_size = 1
+    if max_in_flight:
+        batch_size = min(batch_size, max_in_flight // max(1, max_workers))
+    batch_size = max(1, batch_size)
+
+    def latest(ticker: str) -> Optional[StockPriceData]:
+        with instrumentation.stage("latest", ticker):
+            return get_latest_stock_price(ticker, firestore_db) if firestore_db is not None else None
+
+    def fetch(ticker: str, last_stock_price: Optional[StockPriceData]) -> Union[StockData, ColumnarStockData]:
+        # A hedged request acquires the rate limiter of each provider it asks
+        if hedge is None:
+            with instrumentation.stage("rate_limit", ticker):
+                rate_limiter.acquire(provider)
+        return get_stock_data(symbol=ticker, provider=provider, start_date=start_date, interval="1d",
+                              last_stock_price=last_stock_price, columnar=COLUMNAR_STOCK_DATA, cache=cache,
+                              end_date=end_date, hedge=hedge)
+
+    def fetch_batch(batch: list[str]) -> tuple[list[Union[StockData, ColumnarStockData]], dict[str, Exception]]:
+        if firestore_db is not None and len(batch) > 1:
+            with ThreadPoolExecutor(max_workers=len(batch)) as reader:
+                last_stock_prices: dict[str, Optional[StockPriceData]] = dict(zip(batch, reader.map(latest, batch)))
+        else:
+            last_stock_prices = {ticker: latest(ticker) for ticker in batch}
+        fetched: dict[str, Union[StockData, ColumnarStockData]] = {}
+        if len(batch) > 1:
+            with instrumentation.stage("rate_limit"):
+                rate_limiter.acquire(provider)
+            try:
+                fetched = get_stock_data_batch(batch, provider=provider, start_date=start_date, interval="1d",
+                                               last_stock_prices=last_stock_prices, columnar=COLUMNAR_STOCK_DATA,
+                                               end_date=end_date)
+            except Exception as e:
+                print(f"Error fetching batch {','.join(batch)}: {e}, fetching its tickers one at a time",
+                      file=sys.stderr)
+        errors: dict[str, Exception] = {}
+        for ticker in batch:
+            if ticker not in fetched:
+                try:
+                    fetched[ticker] = fetch(ticker, last_stock_prices[ticker])
+                except Exception as e:
+                    errors[ticker] = e
+        return [fetched[ticker] for ticker in batch if ticker in fetched], errors
+
+    tickers: Iterator[str] = iter(symbols)
+    batches: Iterator[list[str]] = iter(lambda: list(islice(tickers, batch_size)), [])
+    next_batch: Optional[list[str]] = next(batches, None)
+    futures: dict[Future, list[str]] = {}
+    # The number of tickers submitted and not yet consumed or failed
+    in_flight: int = 0
+
+    def fill(executor: ThreadPoolExecutor) -> None:
+        # Submit the next batches while they fit in the window, or at least one if nothing is in flight
+        nonlocal next_batch, in_flight
+        while next_batch is not None and (not max_in_flight or not in_flight
+                                          or in_flight + len(next_batch) <= max_in_flight):
+            futures[executor.submit(fetch_batch, next_batch)] = next_batch
+            in_flight += len(next_batch)
+            next_batch = next(batches, None)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        fill(executor)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                futures.pop(future)
+                data, errors = future.result()
+                for ticker, e in errors.items():
+                    print(f"Error fetching {ticker}: {e}", file=sys.stderr)
+                    if failed is not None:
+                        failed[ticker] = e
+                in_flight -= len(errors)
+                fill(executor)
+                for stock_data in data:
+                    yield stock_data
+                    in_flight -= 1
+                    fill(executor)
+
+
 def log_stock_data(ticker_list):
     """
     Log stock data for given ticker list.
@@ -39,22 +224,177 @@ def log_stock_data(ticker_list):
     """
     # Log stock_ticker_list as a prettified JSON
     ticker_list_json = json.dumps(
-        [data.dict() for data in ticker_list], indent=2
+        [data.to_dict() for data in ticker_list], indent=2
     )
     print(ticker_list_json)
 
 
-if __name__ == "__main__":
-    # Read the ticker symbols from the CSV file
-    ticker_symbols: list[str] = list(read_ticker_symbols(file_path=TICKER_SYMBOLS_LIST,
-                                                         ticker_column="Symbol"))
-    print(ticker_symbols)
+def log_stock_data_ndjson(stock_data: Union[StockData, ColumnarStockData], stream: TextIO = sys.stdout) -> None:
+    """
+    Log the stock data of a single ticker as one line of newline-delimited JSON.
+
+    Parameters
+    ----------
+    stock_data : Union[StockData, ColumnarStockData]
+        stock data to log.
+    stream : TextIO
+        stream to write the line to.
+    """
+    stream.write(json.dumps(stock_data.to_dict()) + "\n")
+    stream.flush()
 
-    stock_ticker_list: list[StockData] = list(fetch_stock_data(symbols=ticker_symbols))
-    log_stock_data(stock_ticker_list)
 
-    # Create a firestore database object
-    firestore_db = FirestoreDB()
+def run_pipeline(symbols, firestore_db: FirestoreDB, max_in_flight: int = PIPELINE_MAX_IN_FLIGHT,
+                 store_workers: int = STORE_MAX_WORKERS, incremental: bool = INCREMENTAL_FETCH,
+                 cache: Optional[ProviderCache] = None,
+                 log_stream: Optional[TextIO] = sys.stdout,
+                 provider: str = DATA_PROVIDER,
+                 start_date: str = START_DATE,
+                 end_date: Optional[str] = None,
+                 batch_size: int = PROVIDER_BATCH_SIZE,
+                 local_store: Optional[LocalPanelStore] = None,
+                 journal: Optional[RunJournal] = None,
+                 hedge: Optional[HedgedFetcher] = None,
+                 intervals: Optional[list[str]] = None) -> dict[str, Exception]:
+    """
+    Fetch, clean, log and store the stock data of each ticker as a stream.
+
+    Parameters
+    ----------
+    symbols : list
+        list of ticker symbols to process.
+    firestore_db : FirestoreDB
+        firestore database to store the stock data in.
+    max_in_flight : int
+        maximum number of tickers being fetched, and maximum number of tickers being stored,
+        at any time.
+    store_workers : int
+        maximum number of tickers stored concurrently.
+    incremental : bool
+        whether to fetch only the data after the latest date stored for each ticker.
+    cache : ProviderCache, optional
+        on-disk cache of the provider responses, created from the app config if
+        RESPONSE_CACHE_ENABLED is set and not given.
+    log_stream : TextIO, optional
+        stream to log each ticker's stock data to as NDJSON, nothing is logged if None.
+    provider : str
+        data provider to fetch the stock data from.
+    start_date : str
+        first date to fetch, in 'YYYY-MM-DD' format.
+    end_date : str, optional
+        last date to fetch, in 'YYYY-MM-DD' format, the latest available bar if not given.
+    batch_size : int
+        number of tickers per provider request, for the providers accepting several symbols.
+    local_store : LocalPanelStore, optional
+        local memory-mapped store to also write the stock data to, created from the app config if
+        LOCAL_STORE_ENABLED is set and not given.
+    journal : RunJournal, optional
+        journal to record the progress of each ticker in, so that an interrupted run can be resumed.
+    hedge : HedgedFetcher, optional
+        hedged fetcher asking the other providers when `provider` is slow or fails, created from
+        the app config if HEDGE_PROVIDERS is set and not given.
+    intervals : list, optional
+        coarser intervals, e.g. ['1W', '1M'], whose bars are derived from the daily bars and stored
+        next to them, RESAMPLE_INTERVALS if not given.
+
+    Returns
+    -------
+    dict
+        the exception raised for every ticker that could not be fetched or stored, keyed by
+        ticker symbol.
+
+    Notes
+    -----
+    1. Rationale
+        Collecting the stock data of every ticker before storing any of it makes peak memory
+        grow with the size of the universe, and delays the first write until the last fetch
+        has finished. Streaming each ticker through the stages independently keeps memory flat
+        and starts writing as soon as the first ticker is fetched.
+
+    2. Implementation Details
+        - Tickers are fetched and cleaned by fetch_stock_data_concurrently with a window of
+          max_in_flight tickers.
+        - Each fetched ticker is logged as one NDJSON line and submitted to a thread pool that
+          stores it with store_ticker_data. If a local store is used, the ticker is also written
+          to it from the pipeline thread, so it has a single writer. A ticker failing to be written
+          to the local store is reported as failed and not stored to firestore.
+        - Only the new or changed bars are written, and their content hashes are added to the
+          manifest, also in incremental mode where all the fetched bars are new, so that a later
+          full run does not rewrite them.
+        - With intervals, the bars of each interval are derived from the fetched daily bars by
+          store_interval_data, without any other provider request. They are stored before the
+          daily bars, so a ticker failing in between fetches the same daily bars again.
+        - With a journal, each ticker is recorded as fetched with the date range of its bars,
+          then as stored, and the failed tickers are recorded at the end of the run.
+        - When max_in_flight tickers are waiting to be stored, the pipeline waits for one of
+          them before consuming the next fetched ticker, which in turn holds back the fetching.
+    """
+    if cache is None and RESPONSE_CACHE_ENABLED:
+        cache = ProviderCache()
+    if local_store is None and LOCAL_STORE_ENABLED:
+        local_store = LocalPanelStore()
+    if hedge is None and HEDGE_PROVIDERS:
+        hedge = HedgedFetcher()
+    intervals = RESAMPLE_INTERVALS if intervals is None else intervals
+    failed: dict[str, Exception] = {}
+    pending: dict[Future, str] = {}
+    written: int = 0
+    start: float = time.perf_counter()
+
+    def store(stock_data: Union[StockData, ColumnarStockData]) -> int:
+        return (store_interval_data(stock_data, firestore_db, intervals, incremental=incremental)
+                + store_ticker_data(stock_data, firestore_db))
+
+    def collect(done: set[Future]) -> None:
+        nonlocal written
+        for future in done:
+            ticker: str = pending.pop(future)
+            try:
+                written += future.result()
+                if journal is not None:
+                    journal.record_stored(ticker)
+            except Exception as e:
+                print(f"Error storing {ticker}: {e}", file=sys.stderr)
+                failed[ticker] = e
+
+    with ThreadPoolExecutor(max_workers=max(1, store_workers)) as executor:
+        for stock_data in fetch_stock_data_concurrently(symbols, firestore_db=firestore_db if incremental else None,
+                                                        failed=failed, max_in_flight=max_in_flight, cache=cache,
+                                                        provider=provider, start_date=start_date,
+                                                        end_date=end_date, batch_size=batch_size, hedge=hedge):
+            if journal is not None:
+                journal.record_fetched(stock_data)
+            if log_stream is not None:
+                log_stock_data_ndjson(stock_data, log_stream)
+            if local_store is not None:
+                try:
+                    with instrumentation.stage("local_store", stock_data.ticker):
+                        local_store.write(stock_data)
+                except Exception as e:
+                    print(f"Error writing {stock_data.ticker} to the local store: {e}", file=sys.stderr)
+                    failed[stock_data.ticker] = e
+                    # Not stored to firestore either, so the journal and the manifest fetch it again on resume
+                    continue
+            pending[executor.submit(store, stock_data)] = stock_data.ticker
+            if len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(wait(pending).done)
+    if journal is not None:
+        for ticker, e in failed.items():
+            journal.record_failed(ticker, e)
+
+    elapsed: float = time.perf_counter() - start
+    print(f"Stored {written} documents in {elapsed:.2f}s, {len(failed)} tickers failed", file=sys.stderr)
+    if cache is not None:
+        print(f"Provider cache: {cache.stats()}", file=sys.stderr)
+    if hedge is not None:
+        print(f"Provider latency: {hedge.stats()}", file=sys.stderr)
+    return failed
+
+
+if __name__ == "__main__":
+    # Run the command line interface, which stores the tickers of TICKER_SYMBOLS_LIST without arguments
+    from src.main.cli import main
 
-    # Store the data
-    store_data(stock_data_list=stock_ticker_list, firestore_db=firestore_db)
+    sys.exit(main())
@@ -0,0 +1,330 @@
+"""
+Command line interface of the stock price pipeline.
+
+Only argparse, the app config and the instrumentation are imported at startup, the pipeline modules,
+and through them pandas, openbb and firebase_admin, are imported by the subcommand that needs them::
+
+    python -m src.main.cli fetch --tickers AAPL MSFT --start-date 2024-01-01 --end-date 2024-06-30
+    python -m src.main.cli store --tickers-file data/test.csv --provider fmp
+    python -m src.main.cli store --tickers-file data/test.csv --provider fmp --resume
+    python -m src.main.cli store --tickers-file data/test.csv --provider fmp --workers 4
+    python -m src.main.cli store --tickers-file data/test.csv --provider fmp --shard 1/4
+    python -m src.main.cli analyze --tickers AAPL MSFT --start-date 2024-01-01
+    python -m src.main.cli serve --tickers-file data/test.csv --warm
+"""
+import argparse
+import json
+import sys
+from typing import Optional
+
+from config.app_config import (DATA_PROVIDER, HEDGE_PROVIDERS, INSTRUMENTATION_DIR, LOCAL_STORE_DIR,
+                               LOCAL_STORE_ENABLED, PIPELINE_MAX_IN_FLIGHT, PROVIDER_BATCH_SIZE, QUERY_CACHE_MAX_MB,
+                               QUERY_SERVICE_HOST, QUERY_SERVICE_PORT, QUERY_SERVICE_SOURCE, RESAMPLE_INTERVALS,
+                               RUN_JOURNAL_PATH, RUN_RETRIES, RUN_RETRY_BACKOFF, START_DATE, TICKER_SYMBOLS_LIST)
+from src.main.helpers.instrumentation import instrumentation
+
+# The data providers supported by get_stock_data, see ProviderEnum
+PROVIDERS: list[str] = ["fmp", "intrinio", "polygon", "tiingo", "yfinance"]
+# The intervals derived from the daily bars, see RESAMPLE_FREQUENCIES
+INTERVALS: list[str] = ["1W", "1M"]
+
+
+def ticker_symbols(args: argparse.Namespace) -> list[str]:
+    """
+    Get the ticker symbols given on the command line, or read them from the tickers file, keeping
+    only the ones of the --shard if given.
+    """
+    if args.tickers:
+        symbols: list[str] = args.tickers
+    else:
+        from src.main.helpers.read_csv import read_ticker_symbols
+
+        symbols = list(read_ticker_symbols(file_path=args.tickers_file, ticker_column=args.ticker_column))
+    if args.shard:
+        from src.main.helpers.sharding import shard_symbols
+
+        symbols = shard_symbols(symbols, *args.shard)
+    return symbols
+
+
+def shard(value: str) -> tuple[int, int]:
+    """
+    Parse the --shard argument 'i/N' into the shard and the number of shards.
+    """
+    from src.main.helpers.sharding import parse_shard
+
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def launch(args: argparse.Namespace) -> int:
+    """
+    Run the subcommand in --workers processes, one per shard, and merge their summaries.
+    """
+    from src.main.helpers.sharding import launch_shards
+
+    return launch_shards(args.argv, args.workers, journal_path=getattr(args, "journal", None))
+
+
+def hedged_fetcher(args: argparse.Namespace):
+    """
+    Get the HedgedFetcher of the --hedge-providers, or None if no hedge provider is given.
+    """
+    if not args.hedge_providers:
+        return None
+    from src.main.helpers.hedged_fetch import HedgedFetcher
+
+    return HedgedFetcher(providers=args.hedge_providers)
+
+
+def fetch(args: argparse.Namespace) -> int:
+    """
+    Fetch the stock data of the tickers from the provider and log it as NDJSON, without storing it.
+    """
+    if args.workers > 1:
+        return launch(args)
+    from src.main.app import fetch_stock_data_concurrently, log_stock_data_ndjson
+
+    failed: dict[str, Exception] = {}
+    for stock_data in fetch_stock_data_concurrently(ticker_symbols(args), failed=failed,
+                                                    max_in_flight=args.max_in_flight, provider=args.provider,
+                                                    start_date=args.start_date, end_date=args.end_date,
+                                                    batch_size=args.batch_size, hedge=hedged_fetcher(args)):
+        log_stock_data_ndjson(stock_data)
+    return 1 if failed else 0
+
+
+def store(args: argparse.Namespace) -> int:
+    """
+    Fetch, log and store the stock data of the tickers in the firestore database.
+
+    The progress of each ticker is recorded in the run journal. With --resume, the tickers stored by
+    the previous run with the same parameters are skipped. The tickers failing in a run are retried
+    up to --retries times, with a delay doubling from RUN_RETRY_BACKOFF seconds. With --shard, the run
+    journal and the local panel store of the shard are kept next to the configured ones, see shard_path.
+    """
+    if args.workers > 1:
+        return launch(args)
+    import time
+
+    from src.main.app import run_pipeline
+    from src.main.helpers.firestore_update import FirestoreDB
+    from src.main.helpers.local_store import LocalPanelStore
+    from src.main.helpers.run_journal import RunJournal, retry_delay
+    from src.main.helpers.sharding import shard_path
+
+    symbols: list[str] = ticker_symbols(args)
+    journal: RunJournal = RunJournal(shard_path(args.journal, *args.shard) if args.shard else args.journal)
+    # The local panel store supports a single writing process, each shard writes its own
+    local_store: Optional[LocalPanelStore] = (LocalPanelStore(shard_path(LOCAL_STORE_DIR, *args.shard))
+                                              if args.shard and LOCAL_STORE_ENABLED else None)
+    parameters: dict = {"provider": args.provider, "start_date": args.start_date, "end_date": args.end_date,
+                        "full": args.full}
+    if args.resume:
+        try:
+            journal.resume(parameters)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        print(f"Resuming the run in {journal.path}: {journal.summary()}", file=sys.stderr)
+        symbols = journal.pending(symbols)
+    else:
+        journal.start(parameters)
+    print(symbols, file=sys.stderr)
+
+    firestore_db: FirestoreDB = FirestoreDB()
+    hedge = hedged_fetcher(args)
+    failed: dict[str, Exception] = {}
+    for attempt in range(args.retries + 1):
+        if attempt:
+            delay: float = retry_delay(attempt, RUN_RETRY_BACKOFF)
+            print(f"Retrying {len(failed)} failed tickers in {delay:.0f}s, attempt {attempt} of {args.retries}",
+                  file=sys.stderr)
+            time.sleep(delay)
+            symbols = [symbol for symbol in symbols if symbol in failed]
+        failed = run_pipeline(symbols=symbols, firestore_db=firestore_db, max_in_flight=args.max_in_flight,
+                              incremental=not args.full, log_stream=None if args.quiet else sys.stdout,
+                              provider=args.provider, start_date=args.start_date, end_date=args.end_date,
+                              batch_size=args.batch_size, journal=journal, hedge=hedge,
+                              local_store=local_store, intervals=args.intervals)
+        if not failed:
+            break
+    print(f"Run journal: {journal.summary()}", file=sys.stderr)
+    journal.close()
+    return 1 if failed else 0
+
+
+def analyze(args: argparse.Namespace) -> int:
+    """
+    Read the stored closing prices of the tickers in bulk and print a summary of each as one line of JSON.
+    """
+    import numpy as np
+    import pandas as pd
+
+    from src.main.helpers.firestore_bulk import read_panel
+    from src.main.helpers.firestore_init import FirestoreDB
+
+    close_panel: pd.DataFrame = read_panel(ticker_symbols(args), FirestoreDB(), fields=["closing_price"],
+                                           start_date=args.start_date, end_date=args.end_date)["closing_price"]
+    for ticker in close_panel.columns:
+        closing_price: pd.Series = close_panel[ticker].dropna()
+        summary: dict = {"ticker": ticker, "bars": len(closing_price)}
+        if len(closing_price):
+            returns: pd.Series = closing_price.pct_change().dropna()
+            summary.update({
+                "first_date": closing_price.index[0],
+                "last_date": closing_price.index[-1],
+                "total_return": closing_price.iloc[-1] / closing_price.iloc[0] - 1,
+                "annualized_volatility": returns.std() * np.sqrt(252) if len(returns) > 1 else None,
+                "max_drawdown": (closing_price / closing_price.cummax() - 1).min(),
+            })
+        print(json.dumps(summary))
+    return 0
+
+
+def serve(args: argparse.Namespace) -> int:
+    """
+    Serve the stored series and panels over HTTP from an in-memory cache, until interrupted.
+
+    With --warm, the closing prices of the tickers are loaded into the cache before serving. The stores of this
+    process invalidate the cache directly, the ones of other processes through QUERY_SERVICE_URL.
+    """
+    from src.main.helpers.firestore_update import store_listeners
+    from src.main.helpers.query_service import (PanelLoader, QueryServer, QueryService, firestore_loader,
+                                                local_store_loader)
+
+    if args.source == "local":
+        from src.main.helpers.local_store import LocalPanelStore
+
+        loader: PanelLoader = local_store_loader(LocalPanelStore())
+    else:
+        from src.main.helpers.firestore_init import FirestoreDB
+
+        loader = firestore_loader(FirestoreDB())
+    service: QueryService = QueryService(loader, max_bytes=args.cache_mb * 2 ** 20)
+    store_listeners.append(service.invalidate)
+    if args.warm:
+        service.series(ticker_symbols(args), "closing_price")
+        print(f"Warmed the cache: {service.cache.stats()}", file=sys.stderr)
+    server: QueryServer = QueryServer((args.host, args.port), service)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the parser of the command line interface with its fetch, store, analyze and serve subcommands.
+    """
+    common = argparse.ArgumentParser(add_help=False)
+    tickers = common.add_mutually_exclusive_group()
+    tickers.add_argument("--tickers", nargs="+", metavar="TICKER", help="ticker symbols to process")
+    tickers.add_argument("--tickers-file", default=TICKER_SYMBOLS_LIST,
+                         help="CSV file listing the ticker symbols (default: %(default)s)")
+    common.add_argument("--ticker-column", default="Symbol",
+                        help="column of the tickers file holding the symbols (default: %(default)s)")
+    common.add_argument("--start-date", default=START_DATE, help="first date, YYYY-MM-DD (default: %(default)s)")
+    common.add_argument("--end-date", help="last date, YYYY-MM-DD (default: latest available)")
+    common.add_argument("--shard", type=shard, metavar="I/N",
+                        help="only process the tickers of the I-th of N shards, counting from 0, assigned by a hash "
+                             "of the ticker symbol")
+
+    provider = argparse.ArgumentParser(add_help=False)
+    provider.add_argument("--provider", choices=PROVIDERS, default=DATA_PROVIDER,
+                          help="data provider (default: %(default)s)")
+    provider.add_argument("--hedge-providers", nargs="+", choices=PROVIDERS, default=HEDGE_PROVIDERS,
+                          metavar="PROVIDER", help="providers asked when the provider is slow or fails, in order "
+                                                   "(default: HEDGE_PROVIDERS)")
+    provider.add_argument("--max-in-flight", type=int, default=PIPELINE_MAX_IN_FLIGHT,
+                          help="maximum number of tickers in flight (default: %(default)s)")
+    provider.add_argument("--batch-size", type=int, default=PROVIDER_BATCH_SIZE,
+                          help="tickers per request for providers accepting several symbols (default: %(default)s)")
+    provider.add_argument("--workers", type=int, default=1,
+                          help="number of worker processes, each running one shard (default: %(default)s)")
+
+    parser = argparse.ArgumentParser(prog="python -m src.main.cli", description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", metavar="{fetch,store,analyze,serve}")
+    fetch_parser = subparsers.add_parser("fetch", parents=[common, provider],
+                                         help="fetch the stock data and log it as NDJSON without storing it")
+    fetch_parser.set_defaults(handler=fetch)
+    store_parser = subparsers.add_parser("store", parents=[common, provider],
+                                         help="fetch, log and store the stock data in firestore")
+    store_parser.add_argument("--full", action="store_true",
+                              help="fetch the whole date range instead of only the bars after the stored ones")
+    store_parser.add_argument("--quiet", action="store_true", help="do not log the stock data as NDJSON")
+    store_parser.add_argument("--resume", action="store_true",
+                              help="skip the tickers stored by the previous run with the same parameters")
+    store_parser.add_argument("--retries", type=int, default=RUN_RETRIES,
+                              help="number of times the failed tickers are retried (default: %(default)s)")
+    store_parser.add_argument("--intervals", nargs="*", choices=INTERVALS, default=RESAMPLE_INTERVALS,
+                              metavar="INTERVAL", help="coarser intervals derived from the daily bars and stored "
+                                                       "next to them, e.g. 1W 1M (default: RESAMPLE_INTERVALS)")
+    store_parser.add_argument("--journal", default=RUN_JOURNAL_PATH,
+                              help="SQLite file recording the progress of the run (default: %(default)s)")
+    store_parser.set_defaults(handler=store)
+    analyze_parser = subparsers.add_parser("analyze", parents=[common],
+                                           help="summarize the stock data stored in firestore")
+    analyze_parser.set_defaults(handler=analyze)
+    serve_parser = subparsers.add_parser("serve", parents=[common],
+                                         help="serve the stored series and panels over HTTP from a memory cache")
+    serve_parser.add_argument("--host", default=QUERY_SERVICE_HOST, help="address to listen on (default: %(default)s)")
+    serve_parser.add_argument("--port", type=int, default=QUERY_SERVICE_PORT,
+                              help="port to listen on (default: %(default)s)")
+    serve_parser.add_argument("--source", choices=["firestore", "local"], default=QUERY_SERVICE_SOURCE,
+                              help="store the series are loaded from, firestore or the local panel store "
+                                   "(default: %(default)s)")
+    serve_parser.add_argument("--cache-mb", type=int, default=QUERY_CACHE_MAX_MB,
+                              help="memory budget of the cache in MB (default: %(default)s)")
+    serve_parser.add_argument("--warm", action="store_true",
+                              help="load the closing prices of the tickers into the cache before serving")
+    serve_parser.set_defaults(handler=serve)
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Run the command line interface.
+
+    Parameters
+    ----------
+    argv: Optional[list[str]]
+        The command line arguments, sys.argv[1:] if not given. Without a subcommand, the store
+        subcommand runs with its defaults, as app.py did before it had subcommands.
+
+    Returns
+    -------
+    int
+        The exit status, 1 if any ticker failed.
+    """
+    parser: argparse.ArgumentParser = build_parser()
+    args: argparse.Namespace = parser.parse_args(argv)
+    if args.command is None:
+        argv = ["store"]
+        args = parser.parse_args(argv)
+    # The arguments are kept to run the subcommand in the worker processes of --workers
+    args.argv = list(sys.argv[1:] if argv is None else argv)
+    if getattr(args, "workers", 1) > 1 and args.shard:
+        parser.error("--workers and --shard cannot be combined")
+
+    # If instrumentation is enabled, the stage timings and counters are exported at the end of the run
+    instrumentation.start()
+    try:
+        return args.handler(args)
+    finally:
+        if args.shard:
+            from src.main.helpers.sharding import shard_path
+
+            instrumentation.export(shard_path(INSTRUMENTATION_DIR, *args.shard))
+        else:
+            instrumentation.export()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,44 @@
+import sys
 from enum import Enum
 
-from typing import Optional, Literal
-from pydantic import BaseModel
-from openbb import obb
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional, Literal, Union
+from pydantic import BaseModel, ConfigDict, field_validator
 
+import numpy as np
 import pandas as pd
 
+from config.app_config import DATAFRAME_ENGINE, VALIDATION_MODE
+from src.main.helpers.instrumentation import instrumentation
+from src.main.helpers.response_cache import ProviderCache
+
+if TYPE_CHECKING:
+    from src.main.helpers.hedged_fetch import HedgedFetcher
+
+# Format of the date strings used as document ids and date fields
+DATE_FORMAT: str = "%Y-%m-%d %H:%M:%S%z"
+# The fields of StockPriceData, in the order in which they are stored
+STOCK_PRICE_FIELDS: list[str] = [
+    "date", "closing_price", "returns", "holding_period_yield", "holding_period_return", "portfolio_of_1000"
+]
+# The openbb client, imported on first use by provider_client as importing openbb takes seconds
+obb = None
+
+
+def provider_client():
+    """
+    Get the openbb client, importing openbb on the first call.
+
+    Returns
+    -------
+    obb
+        The openbb client, or the object assigned to the module level obb, e.g. a stub in benchmarks.
+    """
+    global obb
+    if obb is None:
+        from openbb import obb as openbb_client
+        obb = openbb_client
+    return obb
+
 
 class ProviderEnum(Enum):
     """
@@ -18,6 +51,10 @@ class ProviderEnum(Enum):
     YFINANCE: str = 'yfinance'
 
 
+# The data providers accepting a comma-separated list of symbols in a single request
+MULTI_SYMBOL_PROVIDERS: set[str] = {ProviderEnum.FMP.value, ProviderEnum.POLYGON.value, ProviderEnum.YFINANCE.value}
+
+
 # Define a Pydantic model for the stock price data
 class StockPriceData(BaseModel):
     """
@@ -30,17 +67,6 @@ class StockPriceData(BaseModel):
     holding_period_return: Optional[float]
     portfolio_of_1000: Optional[float]
 
-    def validation(self):
-        """
-        TODO: Validate the data types and formats.
-        
-        Raises
-        ------
-        ValueError
-            If any validation fails.
-        """
-        pass
-
     def convert(self):
         """
         TODO:Convert the data types and formats as needed.
@@ -72,12 +98,100 @@ class StockData(BaseModel):
     ticker: str
     stock_price_data: list[StockPriceData]
 
+    def records(self) -> Iterator[dict]:
+        """
+        Iterate over the dictionary representations of the stock price data.
+        """
+        return (stock_price.to_dict() for stock_price in self.stock_price_data)
+
+    def to_dict(self) -> dict:
+        """
+        Return a dictionary representation of the object.
+        """
+        return {"ticker": self.ticker, "stock_price_data": list(self.records())}
+
+
+# Define a Pydantic model for the stock data backed by a DataFrame
+class ColumnarStockData(BaseModel):
+    """
+    Pydantic model for representing stock data as columns instead of one object per bar.
+
+    Notes
+    -----
+    1. Rationale
+        Building one StockPriceData model per bar creates millions of small objects for a
+        universe of tickers over years of history. This model keeps the cleaned stock price
+        data as a DataFrame with one column per StockPriceData field, validates each column
+        once as a whole, and only materializes per-bar dictionaries when they are consumed,
+        e.g. when they are written to firestore.
+
+    2. Compatibility
+        The stock_price_data property materializes the StockPriceData list of the StockData
+        model, and records and to_dict behave as those of StockData, so both models can be
+        passed to the logging and storing functions.
+
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    ticker: str
+    frame: pd.DataFrame
+
+    @field_validator("frame")
+    @classmethod
+    def validate_frame(cls, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Validate the columns of the stock price data.
+
+        Raises
+        ------
+        ValueError
+            If a StockPriceData field is missing, a closing price is missing, or a numeric column
+            cannot be converted to floats.
+        """
+        missing: list[str] = [field for field in STOCK_PRICE_FIELDS if field not in frame.columns]
+        if missing:
+            raise ValueError(f"Missing stock price data columns: {missing}")
+        columns: dict[str, pd.Series] = {"date": frame["date"].astype(str)}
+        for field in STOCK_PRICE_FIELDS[1:]:
+            columns[field] = pd.to_numeric(frame[field], errors="raise").astype("float64")
+        if columns["closing_price"].isna().any():
+            raise ValueError("Missing closing prices")
+        return pd.DataFrame(columns)
+
+    @property
+    def stock_price_data(self) -> list[StockPriceData]:
+        """
+        Materialize the stock price data as a list of StockPriceData models.
+        """
+        return [StockPriceData(**record) for record in self.records()]
+
+    def records(self) -> Iterator[dict]:
+        """
+        Iterate over the dictionary representations of the stock price data, one bar at a time.
+        """
+        columns: list[list] = [self.frame[field].tolist() for field in STOCK_PRICE_FIELDS]
+        return (dict(zip(STOCK_PRICE_FIELDS, values)) for values in zip(*columns))
+
+    def to_dict(self) -> dict:
+        """
+        Return a dictionary representation of the object, in the layout of StockData.
+        """
+        return {"ticker": self.ticker, "stock_price_data": list(self.records())}
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
 
 def get_stock_data(symbol: str,
                    provider: Literal[
                        ProviderEnum.FMP, ProviderEnum.INTRINIO, ProviderEnum.POLYGON,
                        ProviderEnum.TIINGO, ProviderEnum.YFINANCE],
-                   start_date: str, interval: str) -> StockData:
+                   start_date: str, interval: str,
+                   last_stock_price: Optional[StockPriceData] = None,
+                   columnar: bool = False,
+                   cache: Optional[ProviderCache] = None,
+                   end_date: Optional[str] = None,
+                   hedge: Optional["HedgedFetcher"] = None) -> Union[StockData, ColumnarStockData]:
     """
     Retrieves and processes stock data for a given symbol, provider, start date, and interval.
 
@@ -92,31 +206,267 @@ def get_stock_data(symbol: str,
         The start date for the data retrieval in 'YYYY-MM-DD' format.
     interval: str
         The interval for the stock data (e.g., '1d' = One day, '1W' = One week, '1M' = One month).
+    last_stock_price: Optional[StockPriceData]
+        The most recent stock price data already stored, if any. When given, only the bars after it are
+        fetched and the calculated metrics continue from it.
+    columnar: bool
+        Whether to return the cleaned stock price data as a ColumnarStockData instead of a StockData.
+    cache: Optional[ProviderCache]
+        If given, the historical stock price data is served from this on-disk cache, and only the
+        dates it does not hold are fetched from the provider.
+    end_date: Optional[str]
+        The end date for the data retrieval in 'YYYY-MM-DD' format, the latest available bar if not given.
+    hedge: Optional[HedgedFetcher]
+        If given, the request is sent to `provider` first and hedged to the other providers of
+        the HedgedFetcher when it is slow or fails, and the answer is normalized.
 
     Returns
     -------
-    StockData
-        A Pydantic model instance containing the stock ticker symbol and a list of cleaned stock price data.
+    Union[StockData, ColumnarStockData]
+        A Pydantic model instance containing the stock ticker symbol and the cleaned stock price data.
 
     Notes
     -----
     1. Implementation Details
         - Retrieves historical stock price data from the specified provider for given symbol, start date, and interval.
         - The raw stock price data is cleaned and additional metrics are calculated.
-        - The cleaned data is structured into a StockData Pydantic model.
+        - The cleaned data is structured into a StockData Pydantic model, or kept as columns in a
+          ColumnarStockData Pydantic model if columnar is set.
+        - When last_stock_price is given, the start date is moved to the day after it, and no request is made
+          if that day is in the future or after end_date.
+        - The openbb client is only imported on the first request, see provider_client.
+
+    """
+    if last_stock_price is not None:
+        start_date = max(start_date, next_start_date(last_stock_price))
+        if start_date > min(end_date or "9999-12-31", pd.Timestamp.today().strftime("%Y-%m-%d")):
+            return to_stock_data(symbol, None, columnar=columnar)
 
+    def historical(fetch_start_date: str, fetch_end_date: Optional[str] = None) -> pd.DataFrame:
+        def request(request_provider: str) -> pd.DataFrame:
+            instrumentation.count("provider_calls", ticker=symbol)
+            with instrumentation.stage("provider", symbol):
+                return provider_client().equity.price.historical(
+                    symbol=symbol, provider=request_provider, start_date=fetch_start_date, end_date=fetch_end_date,
+                    interval=interval).to_df()
+
+        if hedge is None:
+            return request(provider)
+        return hedge.fetch(request, primary=str(getattr(provider, "value", provider)), symbol=symbol)[0]
+
+    if cache is None:
+        stock_price: pd.DataFrame = historical(start_date, end_date)
+    else:
+        stock_price = cache.historical(historical, provider=str(getattr(provider, "value", provider)),
+                                       symbol=symbol, interval=interval, start_date=start_date, end_date=end_date)
+    return to_stock_data(symbol, stock_price, last_stock_price=last_stock_price, columnar=columnar)
+
+
+def to_stock_data(symbol: str, stock_price: Optional[pd.DataFrame],
+                  last_stock_price: Optional[StockPriceData] = None,
+                  columnar: bool = False, validation: str = VALIDATION_MODE,
+                  stock_price_clean: Optional[pd.DataFrame] = None) -> Union[StockData, ColumnarStockData]:
     """
-    stock_price: pd.DataFrame = obb.equity.price.historical(symbol=symbol, provider=provider, start_date=start_date,
-                                                            interval=interval).to_df()
-    stock_price_clean: pd.DataFrame = clean_stock_price(stock_price)
-    stock_price_data_dict: list[StockPriceData] = [
-        StockPriceData(**{str(k): v for k, v in data.items()}) for data in stock_price_clean.to_dict("records")
-    ]
-    stock_data: StockData = StockData(ticker=symbol, stock_price_data=stock_price_data_dict)
+    Clean the raw stock price data of a symbol and structure it into a Pydantic model.
+
+    Parameters
+    ----------
+    symbol: str
+        The stock ticker symbol.
+    stock_price: Optional[pd.DataFrame]
+        The raw stock price data indexed by date, as returned by the provider, or None if no data was fetched.
+    last_stock_price: Optional[StockPriceData]
+        The most recent stock price data already stored, if any, see clean_stock_price.
+    columnar: bool
+        Whether to return a ColumnarStockData instead of a StockData.
+    validation: str
+        'off' to skip the validation of the cleaned stock price data, 'report' to print the checks
+        failed by its rows, or 'drop' to also drop the bad rows and clean the remaining ones again,
+        see validate_stock_price. In 'drop' mode, only the isolated bad prices are return outliers, so
+        the good row after a bad price and the rows after a lasting jump are kept.
+    stock_price_clean: Optional[pd.DataFrame]
+        The stock price data already cleaned, e.g. by clean_stock_price_universe, in which case
+        stock_price is not cleaned again.
+
+    Returns
+    -------
+    Union[StockData, ColumnarStockData]
+        A Pydantic model instance containing the stock ticker symbol and the cleaned stock price data.
+    """
+    if stock_price is None:
+        if columnar:
+            return ColumnarStockData(ticker=symbol, frame=pd.DataFrame(columns=STOCK_PRICE_FIELDS))
+        return StockData(ticker=symbol, stock_price_data=[])
+    if stock_price_clean is None:
+        with instrumentation.stage("clean", symbol):
+            stock_price_clean = clean_stock_price(stock_price, last_stock_price=last_stock_price)
+    if validation != "off":
+        # Imported here as stock_price_validation imports the models of this module
+        from src.main.data_models.stock_price_validation import validate_stock_price
+
+        with instrumentation.stage("validate", symbol):
+            report, bad = validate_stock_price(stock_price_clean, symbol, spikes_only=validation == "drop")
+        if bad.any() or report.at[symbol, "missing_dates"]:
+            issues: dict = {check: int(count) for check, count in report.loc[symbol].items()
+                            if count and check != "rows"}
+            print(f"Validation of {symbol}: {issues}", file=sys.stderr)
+            instrumentation.count("bad_rows", int(bad.sum()), ticker=symbol)
+        if validation == "drop" and bad.any():
+            kept: pd.DataFrame = stock_price_clean.loc[~bad]
+            with instrumentation.stage("clean", symbol):
+                # The bars are already after last_stock_price, the metrics continue from it as before
+                stock_price_clean = clean_stock_price(
+                    pd.DataFrame({"close": kept["closing_price"].to_numpy()}, index=pd.to_datetime(kept["date"])),
+                    last_stock_price=last_stock_price)
+    instrumentation.count("rows", len(stock_price_clean), ticker=symbol)
+    with instrumentation.stage("model", symbol):
+        if columnar:
+            return ColumnarStockData(ticker=symbol, frame=stock_price_clean)
+        stock_price_data_dict: list[StockPriceData] = [
+            StockPriceData(**{str(k): v for k, v in data.items()}) for data in stock_price_clean.to_dict("records")
+        ]
+        stock_data: StockData = StockData(ticker=symbol, stock_price_data=stock_price_data_dict)
     return stock_data
 
 
-def clean_stock_price(stock_price: pd.DataFrame) -> pd.DataFrame:
+def split_stock_price(stock_price: pd.DataFrame, symbols: list[str]) -> dict[str, pd.DataFrame]:
+    """
+    Split the raw stock price data returned for several symbols into the data of each symbol.
+
+    Parameters
+    ----------
+    stock_price: pd.DataFrame
+        The raw stock price data indexed by date, with a 'symbol' column when several symbols were requested.
+    symbols: list[str]
+        The requested symbols.
+
+    Returns
+    -------
+    dict[str, pd.DataFrame]
+        The raw stock price data of each symbol found in the response, without the 'symbol' column,
+        keyed by symbol.
+    """
+    if "symbol" not in stock_price.columns:
+        # A single symbol is returned without a symbol column
+        return {symbols[0]: stock_price} if len(symbols) == 1 and len(stock_price) else {}
+    requested: set[str] = set(symbols)
+    return {
+        str(symbol): frame.drop(columns="symbol")
+        for symbol, frame in stock_price.groupby("symbol", sort=False)
+        if symbol in requested
+    }
+
+
+def get_stock_data_batch(symbols: list[str],
+                         provider: Literal[
+                             ProviderEnum.FMP, ProviderEnum.POLYGON, ProviderEnum.YFINANCE],
+                         start_date: str, interval: str,
+                         last_stock_prices: Optional[dict[str, Optional[StockPriceData]]] = None,
+                         columnar: bool = False,
+                         end_date: Optional[str] = None,
+                         engine: str = DATAFRAME_ENGINE) -> dict[str, Union[StockData, ColumnarStockData]]:
+    """
+    Retrieves and processes the stock data of several symbols with a single provider request.
+
+    Parameters
+    ----------
+    symbols: list[str]
+        The stock ticker symbols.
+    provider: Literal[ProviderEnum.FMP, ProviderEnum.POLYGON, ProviderEnum.YFINANCE]
+        The data provider, one of MULTI_SYMBOL_PROVIDERS.
+    start_date: str
+        The start date for the data retrieval in 'YYYY-MM-DD' format.
+    interval: str
+        The interval for the stock data (e.g., '1d' = One day, '1W' = One week, '1M' = One month).
+    last_stock_prices: Optional[dict[str, Optional[StockPriceData]]]
+        The most recent stock price data already stored for each symbol, if any. When given, only the
+        bars after it are kept for each symbol and the calculated metrics continue from it.
+    columnar: bool
+        Whether to return ColumnarStockData instead of StockData.
+    end_date: Optional[str]
+        The end date for the data retrieval in 'YYYY-MM-DD' format, the latest available bar if not given.
+    engine: str
+        'polars' to clean the symbols of the response in a single polars query, or 'pandas' to clean
+        them one at a time, see clean_stock_price_universe.
+
+    Returns
+    -------
+    dict[str, Union[StockData, ColumnarStockData]]
+        The stock data of each symbol found in the response, keyed by symbol. Symbols missing from
+        the response are left out, so the caller can request them on their own.
+
+    Notes
+    -----
+    1. Rationale
+        Requesting one symbol at a time costs one HTTP round-trip and one rate limit token per symbol.
+        The providers of MULTI_SYMBOL_PROVIDERS return a single long frame for a comma-separated list
+        of symbols, dividing both by the number of symbols per request.
+
+    2. Implementation Details
+        - In incremental mode, the symbols whose next start date is in the future are not requested, and
+          the others are requested from the earliest of their start dates. The bars each symbol already
+          has are dropped by clean_stock_price.
+        - The response is split on its 'symbol' column and each symbol is cleaned as in get_stock_data.
+          With the 'polars' DATAFRAME_ENGINE, the symbols of the response are cleaned at once by
+          clean_stock_price_universe instead.
+        - The response cache is not used, as its entries are per symbol.
+        - Errors of the request are raised, so the caller can fall back to single-symbol requests.
+    """
+    last_stock_prices = last_stock_prices or {}
+    last_date: str = min(end_date or "9999-12-31", pd.Timestamp.today().strftime("%Y-%m-%d"))
+    start_dates: dict[str, str] = {}
+    stock_data: dict[str, Union[StockData, ColumnarStockData]] = {}
+    for symbol in symbols:
+        last_stock_price: Optional[StockPriceData] = last_stock_prices.get(symbol)
+        symbol_start_date: str = (max(start_date, next_start_date(last_stock_price)) if last_stock_price is not None
+                                  else start_date)
+        if symbol_start_date > last_date:
+            stock_data[symbol] = to_stock_data(symbol, None, columnar=columnar)
+        else:
+            start_dates[symbol] = symbol_start_date
+    if not start_dates:
+        return stock_data
+
+    requested: list[str] = list(start_dates)
+    instrumentation.count("provider_calls")
+    with instrumentation.stage("provider"):
+        stock_price: pd.DataFrame = provider_client().equity.price.historical(
+            symbol=",".join(requested), provider=provider, start_date=min(start_dates.values()),
+            end_date=end_date, interval=interval).to_df()
+    stock_prices: dict[str, pd.DataFrame] = split_stock_price(stock_price, requested)
+    stock_prices_clean: dict[str, pd.DataFrame] = {}
+    if engine == "polars":
+        # Imported here as stock_price_polars imports the models of this module
+        from src.main.data_models.stock_price_polars import clean_stock_price_universe
+
+        with instrumentation.stage("clean"):
+            stock_prices_clean = clean_stock_price_universe(stock_prices, last_stock_prices=last_stock_prices)
+    for symbol, symbol_stock_price in stock_prices.items():
+        stock_data[symbol] = to_stock_data(symbol, symbol_stock_price,
+                                           last_stock_price=last_stock_prices.get(symbol), columnar=columnar,
+                                           stock_price_clean=stock_prices_clean.get(symbol))
+    return stock_data
+
+
+def next_start_date(last_stock_price: StockPriceData) -> str:
+    """
+    Get the start date for fetching the bars after the given stock price data.
+
+    Parameters
+    ----------
+    last_stock_price: StockPriceData
+        The most recent stock price data already stored.
+
+    Returns
+    -------
+    str
+        The day after the date of last_stock_price in 'YYYY-MM-DD' format.
+    """
+    return (pd.Timestamp(last_stock_price.date[:10]) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def clean_stock_price(stock_price: pd.DataFrame,
+                      last_stock_price: Optional[StockPriceData] = None) -> pd.DataFrame:
     """
     Clean the raw stock price data and enhance it with additional calculated metrics.
 
@@ -124,6 +474,9 @@ def clean_stock_price(stock_price: pd.DataFrame) -> pd.DataFrame:
     ----------
     stock_price: pd.DataFrame
         The raw stock price data.
+    last_stock_price: Optional[StockPriceData]
+        The most recent stock price data already stored, if any. Bars up to and including its date are
+        dropped, and the returns and portfolio value of the remaining bars continue from it.
 
     Returns
     -------
@@ -138,19 +491,177 @@ def clean_stock_price(stock_price: pd.DataFrame) -> pd.DataFrame:
         metrics such as holding period yield, holding period return, and portfolio value based on
         a hypothetical initial investment of $1000.
 
+    2. Incremental updates
+        When only the bars after the last stored bar are cleaned, the first new bar has no previous close
+        in the frame. Its returns are calculated against the stored closing price, and the portfolio value
+        is compounded from the stored portfolio value, so the cumulative metrics stay continuous with the
+        stored history.
+
     """
+    # Format the dates once, they are used for both the date column and the index
+    dates: pd.Index = pd.to_datetime(stock_price.index).strftime(DATE_FORMAT)
+    if last_stock_price is not None:
+        # Keep only the bars after the last stored bar
+        new_bars = dates > last_stock_price.date
+        stock_price = stock_price.loc[new_bars]
+        dates = dates[new_bars]
     stock_price_clean: pd.DataFrame = stock_price.loc[:, ["close"]]
     stock_price_clean["closing_price"] = stock_price_clean["close"]
-    stock_price_clean["date"] = pd.to_datetime(stock_price_clean.index).strftime("%Y-%m-%d %H:%M:%S%z")
+    stock_price_clean["date"] = dates
     stock_price_clean["returns"] = stock_price_clean["close"].pct_change()
-    stock_price_clean["holding_period_yield"] = (
-            stock_price_clean["close"] / stock_price_clean["close"].shift(1) - 1
-    )
+    # The holding period yield is the same quantity as the returns
+    stock_price_clean["holding_period_yield"] = stock_price_clean["returns"]
     stock_price_clean["holding_period_return"] = stock_price_clean[
                                                      "close"
                                                  ] / stock_price_clean["close"].shift(1)
     stock_price_clean["portfolio_of_1000"] = (
             1000 * stock_price_clean["holding_period_return"].cumprod()
     )
-    stock_price_clean.index = pd.to_datetime(stock_price_clean.index).strftime("%Y-%m-%d %H:%M:%S%z")
+    stock_price_clean.index = dates
+    if last_stock_price is not None and not stock_price_clean.empty:
+        # Continue the metrics of the first new bar from the last stored bar
+        first_bar: str = stock_price_clean.index[0]
+        first_holding_period_return: float = (
+                stock_price_clean.at[first_bar, "close"] / last_stock_price.closing_price
+        )
+        stock_price_clean.at[first_bar, "returns"] = first_holding_period_return - 1
+        stock_price_clean.at[first_bar, "holding_period_yield"] = first_holding_period_return - 1
+        stock_price_clean.at[first_bar, "holding_period_return"] = first_holding_period_return
+        portfolio_base: float = (
+            last_stock_price.portfolio_of_1000 if pd.notna(last_stock_price.portfolio_of_1000) else 1000
+        )
+        stock_price_clean["portfolio_of_1000"] = (
+                portfolio_base * stock_price_clean["holding_period_return"].cumprod()
+        )
     return stock_price_clean
+
+
+def clean_stock_price_panel(close: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """
+    Calculate the stock price metrics of many tickers at once from a panel of closing prices.
+
+    Parameters
+    ----------
+    close: pd.DataFrame
+        The closing prices with one row per date and one column per ticker. Dates on which a
+        ticker has no bar, e.g. before its listing date, are NaN.
+
+    Returns
+    -------
+    dict[str, pd.DataFrame]
+        The closing_price, returns, holding_period_yield, holding_period_return and
+        portfolio_of_1000 metrics, each as a panel with the same index and columns as `close`.
+
+    Notes
+    -----
+    1. Rationale
+        Running clean_stock_price once per ticker costs a separate pandas pipeline per ticker.
+        Calculating the metrics on the whole date x ticker matrix in NumPy processes the universe
+        in a handful of vectorized operations.
+
+    2. Implementation Details
+        - The previous close of each bar is the last non-NaN close of its ticker before the bar,
+          so a ticker's metrics match those of clean_stock_price on its own bars, whatever the
+          dates of the other tickers.
+        - The first bar of each ticker has no previous close, so its returns, holding period
+          metrics and portfolio value are NaN, as in clean_stock_price.
+        - Bars with a NaN close have NaN metrics and leave the cumulative portfolio value unchanged.
+
+    """
+    values: np.ndarray = close.to_numpy(dtype=float)
+    n_dates, n_tickers = values.shape
+    valid: np.ndarray = ~np.isnan(values)
+
+    # Row of the last non-NaN close up to and including each bar, -1 if there is none yet
+    last_valid_row: np.ndarray = np.where(valid, np.arange(n_dates)[:, None], -1)
+    np.maximum.accumulate(last_valid_row, axis=0, out=last_valid_row)
+    previous_row: np.ndarray = np.full_like(last_valid_row, -1)
+    previous_row[1:] = last_valid_row[:-1]
+    previous_close: np.ndarray = np.where(
+        previous_row >= 0, values[np.maximum(previous_row, 0), np.arange(n_tickers)], np.nan
+    )
+
+    holding_period_return: np.ndarray = values / previous_close
+    returns: np.ndarray = holding_period_return - 1
+    growth: np.ndarray = np.where(np.isnan(holding_period_return), 1.0, holding_period_return)
+    portfolio_of_1000: np.ndarray = 1000 * np.cumprod(growth, axis=0)
+    portfolio_of_1000[np.isnan(holding_period_return)] = np.nan
+
+    def to_panel(metric: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(metric, index=close.index, columns=close.columns)
+
+    return {
+        "closing_price": to_panel(values),
+        "returns": to_panel(returns),
+        "holding_period_yield": to_panel(returns),
+        "holding_period_return": to_panel(holding_period_return),
+        "portfolio_of_1000": to_panel(portfolio_of_1000),
+    }
+
+
+def split_stock_price_panel(panel: dict[str, pd.DataFrame]) -> dict[str, pd.DataFrame]:
+    """
+    Split the panel metrics of clean_stock_price_panel into one cleaned frame per ticker.
+
+    Parameters
+    ----------
+    panel: dict[str, pd.DataFrame]
+        The panel metrics returned by clean_stock_price_panel.
+
+    Returns
+    -------
+    dict[str, pd.DataFrame]
+        The cleaned stock price data of each ticker keyed by ticker, with the same columns and
+        index as the output of clean_stock_price. Dates on which the ticker has no bar are dropped.
+    """
+    closing_price: pd.DataFrame = panel["closing_price"]
+    # Format the dates once for all tickers
+    dates: pd.Index = pd.to_datetime(closing_price.index).strftime(DATE_FORMAT)
+    stock_price_clean: dict[str, pd.DataFrame] = {}
+    for ticker in closing_price.columns:
+        has_bar: np.ndarray = closing_price[ticker].notna().to_numpy()
+        ticker_dates: pd.Index = dates[has_bar]
+        close: np.ndarray = closing_price[ticker].to_numpy()[has_bar]
+        stock_price_clean[ticker] = pd.DataFrame({
+            "close": close,
+            "closing_price": close,
+            "date": ticker_dates,
+            **{metric: panel[metric][ticker].to_numpy()[has_bar]
+               for metric in ("returns", "holding_period_yield", "holding_period_return", "portfolio_of_1000")},
+        }, index=ticker_dates)
+    return stock_price_clean
+
+
+def to_close_panel(stock_data_list: Iterable[Union[StockData, ColumnarStockData]]) -> pd.DataFrame:
+    """
+    Arrange the closing prices of several tickers into a date x ticker panel.
+
+    Parameters
+    ----------
+    stock_data_list: Iterable[Union[StockData, ColumnarStockData]]
+        The stock data of each ticker.
+
+    Returns
+    -------
+    pd.DataFrame
+        The closing prices with one row per date string, in date order, and one column per ticker.
+        Dates on which a ticker has no bar are NaN.
+
+    Notes
+    -----
+    1. Implementation Details
+        - The closing prices of a ColumnarStockData are taken from its frame, without materializing
+          a StockPriceData per bar.
+        - If a ticker has several bars on the same date, the last one is kept.
+    """
+    columns: dict[str, pd.Series] = {}
+    for stock_data in stock_data_list:
+        if isinstance(stock_data, ColumnarStockData):
+            close: pd.Series = pd.Series(stock_data.frame["closing_price"].to_numpy(dtype=float),
+                                         index=pd.Index(stock_data.frame["date"], name="date"))
+        else:
+            close = pd.Series([stock_price.closing_price for stock_price in stock_data.stock_price_data],
+                              index=pd.Index([stock_price.date for stock_price in stock_data.stock_price_data],
+                                             name="date"), dtype=float)
+        columns[stock_data.ticker] = close[~close.index.duplicated(keep="last")]
+    return pd.DataFrame(columns).sort_index()
@@ -0,0 +1,175 @@
+from typing import Optional
+
+import pandas as pd
+import polars as pl
+
+from src.main.data_models.stock_price_data import DATE_FORMAT, StockPriceData, clean_stock_price
+
+# The columns of the cleaned stock price data, in the order produced by clean_stock_price
+CLEAN_COLUMNS: list[str] = [
+    "close", "closing_price", "date", "returns", "holding_period_yield", "holding_period_return",
+    "portfolio_of_1000"
+]
+
+
+def to_date_series(dates: pd.DatetimeIndex) -> pl.Series:
+    """
+    Convert a pandas datetime index to a polars datetime series, keeping its timezone.
+
+    Parameters
+    ----------
+    dates: pd.DatetimeIndex
+        The dates to convert.
+
+    Returns
+    -------
+    pl.Series
+        The dates with the same wall times and timezone.
+    """
+    # Polars supports datetimes down to microseconds, pandas may infer seconds
+    dates = dates.as_unit("us")
+    if dates.tz is None:
+        return pl.Series(dates.to_numpy())
+    return pl.Series(dates.tz_localize(None).to_numpy()).dt.replace_time_zone(str(dates.tz))
+
+
+def to_long_frame(stock_prices: dict[str, pd.DataFrame],
+                  last_stock_prices: Optional[dict[str, Optional[StockPriceData]]] = None) -> pl.LazyFrame:
+    """
+    Combine the raw stock price data of many tickers into a single long frame.
+
+    Parameters
+    ----------
+    stock_prices: dict[str, pd.DataFrame]
+        The raw stock price data of each ticker keyed by ticker, as returned by the provider.
+    last_stock_prices: Optional[dict[str, Optional[StockPriceData]]]
+        The most recent stock price data already stored for each ticker, if any.
+
+    Returns
+    -------
+    pl.LazyFrame
+        A lazy frame with one (ticker, date, close) row per bar, in the bar order of each ticker, and
+        the date, closing price and portfolio value of the last stored bar of the ticker, null if none.
+    """
+    last_stock_prices = last_stock_prices or {}
+    frames: list[pl.DataFrame] = []
+    for ticker, stock_price in stock_prices.items():
+        last_stock_price: Optional[StockPriceData] = last_stock_prices.get(ticker)
+        last_portfolio: Optional[float] = None
+        if last_stock_price is not None and pd.notna(last_stock_price.portfolio_of_1000):
+            last_portfolio = last_stock_price.portfolio_of_1000
+        frames.append(pl.DataFrame({
+            "ticker": [ticker] * len(stock_price),
+            "date": to_date_series(pd.to_datetime(stock_price.index)),
+            "close": stock_price["close"].to_numpy(dtype=float),
+            "last_date": pl.Series([last_stock_price.date if last_stock_price is not None else None]
+                                   * len(stock_price), dtype=pl.String),
+            "last_close": pl.Series([last_stock_price.closing_price if last_stock_price is not None else None]
+                                    * len(stock_price), dtype=pl.Float64),
+            "last_portfolio": pl.Series([last_portfolio] * len(stock_price), dtype=pl.Float64),
+        }))
+    if not frames:
+        return pl.LazyFrame(schema={"ticker": pl.String, "date": pl.Datetime, "close": pl.Float64,
+                                    "last_date": pl.String, "last_close": pl.Float64,
+                                    "last_portfolio": pl.Float64})
+    return pl.concat(frames, how="vertical_relaxed").lazy()
+
+
+def clean_stock_price_lazy(long_frame: pl.LazyFrame) -> pl.LazyFrame:
+    """
+    Build the query calculating the stock price metrics of every ticker in a long frame.
+
+    Parameters
+    ----------
+    long_frame: pl.LazyFrame
+        A lazy frame with one (ticker, date, close) row per bar, in the bar order of each ticker, and
+        the last stored bar of each ticker, as returned by to_long_frame.
+
+    Returns
+    -------
+    pl.LazyFrame
+        The bars after the last stored bar of each ticker, with the columns of clean_stock_price added
+        and the date formatted as a string.
+
+    Notes
+    -----
+    1. Rationale
+        Expressing the metrics as window expressions over the ticker column lets polars compute the
+        whole universe in one multi-threaded query plan, instead of one pandas pipeline per ticker.
+
+    2. Implementation Details
+        - Each expression is evaluated per ticker with over("ticker"), so the first bar of each ticker
+          has no previous close and null metrics.
+        - A NaN close is mapped to null, as polars carries a NaN through cum_prod while it skips nulls.
+          As with pct_change in pandas, the previous close is the close of the previous bar, so the bar
+          of a missing close and the bar after it have null metrics, and the portfolio value resumes
+          after them.
+        - The returns and holding period yield are derived from the holding period return as
+          close / previous close - 1, which is how pandas calculates pct_change, so the values match
+          clean_stock_price exactly.
+        - Dates are formatted with DATE_FORMAT, without the UTC offset for timezone-naive dates, as pandas does.
+        - As in clean_stock_price, only the bars after the last stored bar of a ticker are kept, the first
+          of them is compared to the stored closing price, and the portfolio value is compounded from the
+          stored one.
+    """
+    date_format: str = DATE_FORMAT
+    if long_frame.collect_schema()["date"].time_zone is None:
+        date_format = date_format.replace("%z", "")
+    # Only the first bar of a ticker continues from the stored close, a missing previous close stays null
+    previous_close: pl.Expr = (pl.when(pl.int_range(pl.len()).over("ticker") == 0).then(pl.col("last_close"))
+                               .otherwise(pl.col("close").shift(1).over("ticker")))
+    return (
+        long_frame
+        .with_columns(close=pl.col("close").fill_nan(None))
+        .with_columns(
+            closing_price=pl.col("close"),
+            date=pl.col("date").dt.strftime(date_format),
+        )
+        .filter(pl.col("last_date").is_null() | (pl.col("date") > pl.col("last_date")))
+        .with_columns(holding_period_return=pl.col("close") / previous_close)
+        .with_columns(
+            returns=pl.col("holding_period_return") - 1,
+            holding_period_yield=pl.col("holding_period_return") - 1,
+            portfolio_of_1000=(pl.col("last_portfolio").fill_null(1000)
+                               * pl.col("holding_period_return").cum_prod().over("ticker")),
+        )
+    )
+
+
+def clean_stock_price_universe(stock_prices: dict[str, pd.DataFrame], engine: str = "polars",
+                               last_stock_prices: Optional[dict[str, Optional[StockPriceData]]] = None
+                               ) -> dict[str, pd.DataFrame]:
+    """
+    Clean the raw stock price data of many tickers with the selected engine.
+
+    Parameters
+    ----------
+    stock_prices: dict[str, pd.DataFrame]
+        The raw stock price data of each ticker keyed by ticker, as returned by the provider.
+    engine: str
+        'polars' to clean all tickers in a single polars query, or 'pandas' to run clean_stock_price
+        on each ticker.
+    last_stock_prices: Optional[dict[str, Optional[StockPriceData]]]
+        The most recent stock price data already stored for each ticker, if any, see clean_stock_price.
+
+    Returns
+    -------
+    dict[str, pd.DataFrame]
+        The cleaned stock price data of each ticker keyed by ticker, in the layout of clean_stock_price.
+        A ticker without bars after its last stored bar is left out by the polars engine.
+    """
+    last_stock_prices = last_stock_prices or {}
+    if engine == "pandas":
+        return {ticker: clean_stock_price(stock_price, last_stock_price=last_stock_prices.get(ticker))
+                for ticker, stock_price in stock_prices.items()}
+    if engine != "polars":
+        raise ValueError(f"Unknown engine {engine}, expected 'pandas' or 'polars'")
+    cleaned: pl.DataFrame = clean_stock_price_lazy(to_long_frame(stock_prices, last_stock_prices)).collect()
+    stock_price_clean: dict[str, pd.DataFrame] = {}
+    for (ticker,), frame in cleaned.partition_by("ticker", as_dict=True, maintain_order=True).items():
+        dates: pd.Index = pd.Index(frame["date"].to_list())
+        stock_price_clean[ticker] = pd.DataFrame(
+            {column: dates if column == "date" else frame[column].to_numpy() for column in CLEAN_COLUMNS},
+            index=dates,
+        )
+    return stock_price_clean
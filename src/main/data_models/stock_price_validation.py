@@ -0,0 +1,258 @@
+from functools import lru_cache
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import (AbstractHolidayCalendar, GoodFriday, Holiday, USLaborDay, USMartinLutherKingJr,
+                                    USMemorialDay, USPresidentsDay, USThanksgivingDay, nearest_workday,
+                                    sunday_to_monday)
+
+from config.app_config import VALIDATION_SIGMA
+from src.main.data_models.stock_price_data import ColumnarStockData, StockData
+
+# The checks of each row, a row failing any of them is marked as bad
+ROW_CHECKS: list[str] = ["invalid_dates", "unsorted_dates", "duplicate_dates", "invalid_closes", "return_outliers"]
+# The columns of the validation report, the number of rows failing each check and the calendar gaps of each ticker
+REPORT_COLUMNS: list[str] = ["rows", "bad_rows", *ROW_CHECKS, "missing_dates"]
+# The offset between the days of consecutive tickers, more than the number of days since the epoch
+DAY_OFFSET: float = 1e6
+# The scale of the median absolute deviation of normally distributed values to their standard deviation
+MAD_TO_SIGMA: float = 1.4826
+
+
+class TradingCalendar(AbstractHolidayCalendar):
+    """
+    The full-day holidays of the NYSE, without its unscheduled closures, e.g. national days of mourning.
+    """
+    rules = [
+        Holiday("New Year's Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-06-19", observance=nearest_workday),
+        Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas Day", month=12, day=25, observance=nearest_workday),
+    ]
+
+
+@lru_cache(maxsize=None)
+def _holidays(first_year: int, last_year: int) -> np.ndarray:
+    # The holidays of whole years, cached as the holiday rules are evaluated in Python
+    return TradingCalendar().holidays(f"{first_year}-01-01", f"{last_year}-12-31").to_numpy().astype("datetime64[D]")
+
+
+def trading_days(start: np.datetime64, end: np.datetime64) -> np.ndarray:
+    """
+    Get the trading days of the TradingCalendar from start to end, inclusive, as a sorted datetime64[D] array.
+    """
+    start, end = np.datetime64(start, "D"), np.datetime64(end, "D")
+    days: np.ndarray = np.arange(start, end + 1, dtype="datetime64[D]")
+    holidays: np.ndarray = _holidays(start.astype(object).year, end.astype(object).year)
+    return days[np.is_busday(days, holidays=holidays)]
+
+
+def _sort_by_group(codes: np.ndarray, values: np.ndarray) -> np.ndarray:
+    # The order of the rows by group, then value, then position, skipping the sorts if the rows are in that order
+    if len(codes) < 2 or (np.all(codes[1:] >= codes[:-1])
+                          and np.all((codes[1:] != codes[:-1]) | (values[1:] >= values[:-1]))):
+        return np.arange(len(codes))
+    by_value: np.ndarray = np.argsort(values, kind="stable")
+    return by_value[np.argsort(codes[by_value], kind="stable")]
+
+
+def _group_median(codes: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    # The median of the finite values of each group, NaN for a group without values. The values only need to be
+    # sorted within their group, so they are offset by group past the values of the previous groups and sorted
+    # at once, which loses about 1e-8 of precision for values spanning 1e3 across 1e4 groups.
+    counts: np.ndarray = np.bincount(codes, minlength=n_groups)
+    starts: np.ndarray = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    if not len(values):
+        return np.full(n_groups, np.nan)
+    low: float = float(values.min())
+    width: float = 2 * (float(values.max()) - low) + 1
+    sorted_values: np.ndarray = (np.sort(codes * width + (values - low))
+                                 - np.repeat(np.arange(n_groups) * width, counts) + low)
+    median: np.ndarray = np.full(n_groups, np.nan)
+    has_values: np.ndarray = counts > 0
+    lower: np.ndarray = starts[has_values] + (counts[has_values] - 1) // 2
+    upper: np.ndarray = starts[has_values] + counts[has_values] // 2
+    median[has_values] = (sorted_values[lower] + sorted_values[upper]) / 2
+    return median
+
+
+def validate_stock_price(frame: pd.DataFrame, tickers: Optional[Union[str, Iterable[str]]] = None,
+                         sigma: float = VALIDATION_SIGMA, calendar: bool = True,
+                         spikes_only: bool = False) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Check the cleaned stock price data of one or many tickers with vectorized checks.
+
+    Parameters
+    ----------
+    frame: pd.DataFrame
+        The stock price data with a 'date' string and a 'closing_price' column, as returned by
+        clean_stock_price, or the rows of many tickers concatenated.
+    tickers: Optional[Union[str, Iterable[str]]]
+        The ticker of the rows, or the ticker of each row if the frame holds many tickers. The rows
+        of a ticker do not need to be contiguous.
+    sigma: float
+        The number of standard deviations beyond which a return is an outlier, 0 to skip the check.
+    calendar: bool
+        Whether to count the trading days of the TradingCalendar missing between the first and
+        last date of each ticker.
+    spikes_only: bool
+        Whether return_outliers only flags the rows whose return in and return out are both outliers
+        in opposite directions, i.e. the isolated bad prices, e.g. to drop the bad rows.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, np.ndarray]
+        The report with one row per ticker, in order of first appearance, and the REPORT_COLUMNS,
+        and the boolean mask of the rows failing any of the ROW_CHECKS.
+
+    Notes
+    -----
+    1. Rationale
+        Checking each bar in the StockPriceData model would run Python code per bar, multiplying
+        the cost of building the models. The checks run here on whole columns instead, for every
+        ticker at once, before the models are built.
+
+    2. Implementation Details
+        - invalid_dates: dates which cannot be parsed. invalid_closes: NaN, infinite or
+          non-positive closing prices.
+        - unsorted_dates: dates earlier than the date of a previous row of the ticker, so the rows
+          left are in date order.
+        - duplicate_dates: every row of a ticker but the last one with the same date, as the
+          providers' corrections come last.
+        - return_outliers: log returns, between the valid rows of a ticker in date order, further
+          from their median than sigma times the standard deviation estimated from their median
+          absolute deviation, which a few bad prices do not inflate. A bad price is usually
+          flagged twice, on the jump and on the return back, and a lasting jump, e.g. an unadjusted
+          split, once. With spikes_only, only the bad price is flagged, so that dropping the flagged
+          rows never drops the good row after it or the rows after a lasting jump.
+        - missing_dates: the trading days between the first and last valid date of a ticker
+          without a row. They are not rows, so they are only reported.
+        - The rows are grouped by ticker with one stable sort and the statistics of each ticker
+          are gathered with bincount, so the cost grows with the number of rows, not of tickers.
+    """
+    n_rows: int = len(frame)
+    if tickers is None or isinstance(tickers, str):
+        labels: np.ndarray = np.array([tickers or ""], dtype=object)
+        codes: np.ndarray = np.zeros(n_rows, dtype=np.int64)
+    else:
+        codes, labels = pd.factorize(np.asarray(list(tickers), dtype=object))
+        codes = codes.astype(np.int64)
+    n_tickers: int = len(labels)
+    checks: dict[str, np.ndarray] = {check: np.zeros(n_rows, dtype=bool) for check in ROW_CHECKS}
+
+    dates: pd.DatetimeIndex = pd.DatetimeIndex(pd.to_datetime(frame["date"], format="ISO8601", utc=True,
+                                                              errors="coerce"))
+    days: np.ndarray = dates.tz_localize(None).to_numpy().astype("datetime64[D]")
+    close: np.ndarray = frame["closing_price"].to_numpy(dtype=float)
+    checks["invalid_dates"] = np.isnat(days)
+    checks["invalid_closes"] = ~(np.isfinite(close) & (close > 0))
+
+    # Group the rows by ticker, keeping their order within a ticker, and offset the days of each ticker past the
+    # days of the previous ones, so a single running maximum gives the latest previous date of each ticker
+    grouped: np.ndarray = _sort_by_group(codes, np.zeros(n_rows))
+    same_ticker: np.ndarray = codes[grouped][1:] == codes[grouped][:-1]
+    offset_days: np.ndarray = (np.where(checks["invalid_dates"], -np.inf, days.astype(np.int64))
+                               + DAY_OFFSET * codes)[grouped]
+    latest: np.ndarray = np.maximum.accumulate(offset_days) if n_rows else offset_days
+    checks["unsorted_dates"][grouped[1:]] = same_ticker & (offset_days[1:] < latest[:-1])
+
+    # Sort the rows by ticker, date and position, so the rows of a ticker with the same date are adjacent
+    ordered: np.ndarray = _sort_by_group(codes, days)
+    ordered_days: np.ndarray = days[ordered]
+    same_day: np.ndarray = (codes[ordered][1:] == codes[ordered][:-1]) & (ordered_days[1:] == ordered_days[:-1])
+    checks["duplicate_dates"][ordered[:-1]] = same_day & ~np.isnat(ordered_days[:-1])
+
+    # The rows the returns and calendar gaps are calculated on, by ticker and date
+    excluded: np.ndarray = checks["invalid_dates"] | checks["invalid_closes"] | checks["duplicate_dates"]
+    valid: np.ndarray = ordered[~excluded[ordered]]
+    valid_codes: np.ndarray = codes[valid]
+    if sigma > 0 and len(valid) > 1:
+        has_previous: np.ndarray = valid_codes[1:] == valid_codes[:-1]
+        returns: np.ndarray = np.log(close[valid][1:] / close[valid][:-1])[has_previous]
+        return_rows: np.ndarray = valid[1:][has_previous]
+        return_codes: np.ndarray = codes[return_rows]
+        median: np.ndarray = _group_median(return_codes, returns, n_tickers)
+        deviation: np.ndarray = np.abs(returns - median[return_codes])
+        scale: np.ndarray = MAD_TO_SIGMA * _group_median(return_codes, deviation, n_tickers)
+        with np.errstate(invalid="ignore"):
+            outliers: np.ndarray = (scale[return_codes] > 0) & (deviation > sigma * scale[return_codes])
+        if spikes_only:
+            # The return into each valid row, aligned with valid, and whether it is an outlier. A row is a spike if
+            # the return into the next row, of the same ticker as it has a return, is an outlier the other way.
+            valid_returns: np.ndarray = np.full(len(valid), np.nan)
+            valid_returns[1:][has_previous] = returns
+            valid_outliers: np.ndarray = np.zeros(len(valid), dtype=bool)
+            valid_outliers[1:][has_previous] = outliers
+            checks["return_outliers"][valid[:-1]] = (valid_outliers[:-1] & valid_outliers[1:]
+                                                     & (np.sign(valid_returns[:-1]) != np.sign(valid_returns[1:])))
+        else:
+            checks["return_outliers"][return_rows] = outliers
+
+    missing_dates: np.ndarray = np.zeros(n_tickers, dtype=np.int64)
+    if calendar and len(valid):
+        # The valid rows are in date order within each ticker, so its first and last rows bound its dates
+        starts: np.ndarray = np.flatnonzero(np.concatenate(([True], valid_codes[1:] != valid_codes[:-1])))
+        ends: np.ndarray = np.append(starts[1:] - 1, len(valid) - 1)
+        first: np.ndarray = np.full(n_tickers, -1, dtype=np.int64)
+        first[valid_codes[starts]] = valid[starts]
+        last: np.ndarray = np.full(n_tickers, -1, dtype=np.int64)
+        last[valid_codes[ends]] = valid[ends]
+        has_dates: np.ndarray = first >= 0
+        calendar_days: np.ndarray = trading_days(days[first[has_dates]].min(), days[last[has_dates]].max())
+        expected: np.ndarray = (np.searchsorted(calendar_days, days[last[has_dates]], side="right")
+                                - np.searchsorted(calendar_days, days[first[has_dates]], side="left"))
+        positions: np.ndarray = np.minimum(np.searchsorted(calendar_days, days[valid]), len(calendar_days) - 1)
+        on_calendar: np.ndarray = np.bincount(valid_codes, weights=calendar_days[positions] == days[valid],
+                                              minlength=n_tickers)
+        missing_dates[has_dates] = expected - on_calendar[has_dates].astype(np.int64)
+
+    bad: np.ndarray = np.logical_or.reduce(list(checks.values()))
+    report: pd.DataFrame = pd.DataFrame({
+        "rows": np.bincount(codes, minlength=n_tickers),
+        "bad_rows": np.bincount(codes, weights=bad, minlength=n_tickers).astype(np.int64),
+        **{check: np.bincount(codes, weights=failed, minlength=n_tickers).astype(np.int64)
+           for check, failed in checks.items()},
+        "missing_dates": missing_dates,
+    }, index=pd.Index(labels, name="ticker"), columns=REPORT_COLUMNS)
+    return report, bad
+
+
+def validate_stock_data(stock_data_list: Iterable[Union[StockData, ColumnarStockData]],
+                        sigma: float = VALIDATION_SIGMA,
+                        calendar: bool = True) -> tuple[pd.DataFrame, dict[str, np.ndarray]]:
+    """
+    Check the stock price data of many tickers at once with validate_stock_price.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, dict[str, np.ndarray]]
+        The report with one row per ticker, and the mask of the bad rows of each ticker, keyed by ticker.
+    """
+    stock_data_list = list(stock_data_list)
+    frames: list[pd.DataFrame] = []
+    for stock_data in stock_data_list:
+        if isinstance(stock_data, ColumnarStockData):
+            frame: pd.DataFrame = stock_data.frame[["date", "closing_price"]]
+        else:
+            frame = pd.DataFrame([(stock_price.date, stock_price.closing_price)
+                                  for stock_price in stock_data.stock_price_data], columns=["date", "closing_price"])
+        frames.append(frame)
+    lengths: list[int] = [len(frame) for frame in frames]
+    tickers: np.ndarray = np.repeat(np.array([stock_data.ticker for stock_data in stock_data_list], dtype=object),
+                                    lengths)
+    report, bad = validate_stock_price(pd.concat(frames, ignore_index=True) if frames
+                                       else pd.DataFrame(columns=["date", "closing_price"]),
+                                       tickers, sigma=sigma, calendar=calendar)
+    bounds: np.ndarray = np.cumsum([0] + lengths)
+    masks: dict[str, np.ndarray] = {stock_data.ticker: bad[start:end]
+                                    for stock_data, start, end in zip(stock_data_list, bounds[:-1], bounds[1:])}
+    # The tickers without rows are reported too, in the given order
+    report = report.reindex([stock_data.ticker for stock_data in stock_data_list], fill_value=0)
+    return report, masks
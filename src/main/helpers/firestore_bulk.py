@@ -0,0 +1,161 @@
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from config.app_config import FIRESTORE_LAYOUT, FIRESTORE_READ_MAX_WORKERS, FIRESTORE_READ_PAGE_SIZE
+from src.main.helpers.firestore_init import FirestoreDB
+from src.main.helpers.instrumentation import instrumentation
+from src.main.helpers.firestore_chunks import period_id
+
+
+def read_ticker_columns(ticker: str, firestore_db: FirestoreDB, fields: list[str], layout: str = FIRESTORE_LAYOUT,
+                        start_date: Optional[str] = None, end_date: Optional[str] = None,
+                        page_size: int = FIRESTORE_READ_PAGE_SIZE) -> tuple[dict[str, list], int]:
+    """
+    Stream the stored values of the given fields of a ticker, one page of documents at a time.
+
+    Parameters
+    ----------
+    ticker: str
+        The ticker symbol of the stock.
+    firestore_db: FirestoreDB
+        A FirestoreDB object representing the firestore database.
+    fields: list[str]
+        The StockPriceData fields to read, besides the date.
+    layout: str
+        The storage layout, 'daily', 'monthly' or 'yearly'.
+    start_date: Optional[str]
+        If given, only the bars on or after this 'YYYY-MM-DD' date are returned.
+    end_date: Optional[str]
+        If given, only the bars on or before this 'YYYY-MM-DD' date are returned.
+    page_size: int
+        The number of documents of each query.
+
+    Returns
+    -------
+    tuple[dict[str, list], int]
+        The 'date' and field values of the bars in date order as one list per field, and the
+        number of documents read.
+
+    Notes
+    -----
+    1. Implementation Details
+        - The date documents, or the chunks of a chunked layout, are queried in pages of
+          page_size documents ordered by date or period, each page starting after the last one,
+          so a long history is not held by a single stream.
+        - Only the date and the requested fields are selected, and the values are appended to
+          plain lists, without building a StockPriceData per bar.
+    """
+    key: str = "date" if layout == "daily" else "period"
+    query = (firestore_db.get_collection(ticker) if layout == "daily"
+             else firestore_db.chunk_collection(ticker, layout)).order_by(key)
+    if start_date is not None:
+        query = query.where(key, ">=", start_date if layout == "daily" else period_id(start_date, layout))
+    if end_date is not None:
+        if layout == "daily":
+            # Dates are stored with a time suffix, so compare against the start of the next day
+            query = query.where("date", "<", (pd.Timestamp(end_date) + pd.Timedelta(days=1)).strftime("%Y-%m-%d"))
+        else:
+            query = query.where("period", "<=", period_id(end_date, layout))
+    query = query.select([key, *fields] if layout == "daily" else ["period", "date", *fields])
+
+    columns: dict[str, list] = {field: [] for field in ["date", *fields]}
+    documents: int = 0
+    cursor: Optional[str] = None
+    while True:
+        page = query.limit(page_size) if cursor is None else query.start_after({key: cursor}).limit(page_size)
+        page_documents: int = 0
+        for snapshot in page.stream():
+            data: dict = snapshot.to_dict()
+            page_documents += 1
+            cursor = data[key]
+            if layout == "daily":
+                for field, values in columns.items():
+                    values.append(data.get(field))
+            else:
+                for field, values in columns.items():
+                    values.extend(data.get(field, [None] * len(data["date"])))
+        documents += page_documents
+        if page_documents < page_size:
+            break
+    instrumentation.count("firestore_reads", max(1, documents), ticker=ticker)
+
+    if layout != "daily" and (start_date is not None or end_date is not None):
+        # The first and last chunks may hold bars outside the date range
+        keep: list[bool] = [(start_date is None or date[:10] >= start_date)
+                            and (end_date is None or date[:10] <= end_date) for date in columns["date"]]
+        columns = {field: [value for value, kept in zip(values, keep) if kept] for field, values in columns.items()}
+    return columns, documents
+
+
+def read_panel(tickers: list[str], firestore_db: FirestoreDB, fields: Optional[list[str]] = None,
+               layout: str = FIRESTORE_LAYOUT, start_date: Optional[str] = None, end_date: Optional[str] = None,
+               max_workers: int = FIRESTORE_READ_MAX_WORKERS,
+               page_size: int = FIRESTORE_READ_PAGE_SIZE) -> dict[str, pd.DataFrame]:
+    """
+    Read the stored stock price data of many tickers concurrently into date x ticker panels.
+
+    Parameters
+    ----------
+    tickers: list[str]
+        The ticker symbols of the stocks.
+    firestore_db: FirestoreDB
+        A FirestoreDB object representing the firestore database.
+    fields: Optional[list[str]]
+        The StockPriceData fields to read, ['closing_price'] if not given.
+    layout: str
+        The storage layout, 'daily', 'monthly' or 'yearly'.
+    start_date: Optional[str]
+        If given, only the bars on or after this 'YYYY-MM-DD' date are returned.
+    end_date: Optional[str]
+        If given, only the bars on or before this 'YYYY-MM-DD' date are returned.
+    max_workers: int
+        The maximum number of tickers read concurrently.
+    page_size: int
+        The number of documents of each query.
+
+    Returns
+    -------
+    dict[str, pd.DataFrame]
+        Each field as a panel with one row per stored date string, in date order, and one column
+        per ticker, NaN where a ticker has no bar, keyed by field.
+
+    Notes
+    -----
+    1. Rationale
+        read_stock_data builds a StockPriceData per bar, one ticker at a time, so loading the
+        history of the universe for analysis is bound by the round-trips and the model construction.
+        Here the tickers are streamed by a bounded thread pool and their values go straight into
+        NumPy matrices.
+
+    2. Implementation Details
+        - The rows of each ticker are placed in the panels with a binary search of its dates in
+          the sorted union of the dates, instead of aligning one Series per ticker.
+        - The number of documents read, bars and throughput are printed to stderr, to size jobs.
+    """
+    fields = fields or ["closing_price"]
+    start: float = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers) or 1))) as executor:
+        results: list[tuple[dict[str, list], int]] = list(executor.map(
+            lambda ticker: read_ticker_columns(ticker, firestore_db, fields, layout=layout, start_date=start_date,
+                                               end_date=end_date, page_size=page_size), tickers))
+
+    dates: np.ndarray = np.unique(np.concatenate([np.asarray(columns["date"], dtype=str) for columns, _ in results]
+                                                 or [np.array([], dtype=str)]))
+    panels: dict[str, np.ndarray] = {field: np.full((len(dates), len(tickers)), np.nan) for field in fields}
+    for position, (columns, _) in enumerate(results):
+        rows: np.ndarray = np.searchsorted(dates, np.asarray(columns["date"], dtype=str))
+        for field in fields:
+            panels[field][rows, position] = np.asarray(columns[field], dtype=float)
+
+    elapsed: float = time.perf_counter() - start
+    documents: int = sum(count for _, count in results)
+    bars: int = sum(len(columns["date"]) for columns, _ in results)
+    print(f"Read {documents} documents, {bars} bars of {len(tickers)} tickers in {elapsed:.2f}s "
+          f"({bars / elapsed if elapsed else 0:.0f} bars/s)", file=sys.stderr)
+    index: pd.Index = pd.Index(dates, name="date")
+    return {field: pd.DataFrame(values, index=index, columns=tickers) for field, values in panels.items()}
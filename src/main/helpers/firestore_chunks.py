@@ -0,0 +1,336 @@
+import json
+from typing import Iterable, Iterator, Optional, Union
+
+from config.app_config import FIRESTORE_BATCH_SIZE
+from src.main.helpers.firestore_init import FirestoreDB
+from src.main.helpers.instrumentation import instrumentation
+from src.main.data_models.stock_price_data import ColumnarStockData, StockData, StockPriceData
+
+# Firestore rejects documents larger than 1 MiB
+MAX_DOCUMENT_BYTES: int = 1_048_576
+# The number of characters of a date string identifying its period
+PERIOD_LENGTH: dict[str, int] = {"monthly": 7, "yearly": 4}
+
+
+def period_id(date: str, layout: str) -> str:
+    """
+    Get the id of the chunk document holding the given date.
+
+    Parameters
+    ----------
+    date: str
+        The date string of the stock price data, starting with 'YYYY-MM-DD'.
+    layout: str
+        The chunked storage layout, 'monthly' or 'yearly'.
+
+    Returns
+    -------
+    str
+        'YYYY-MM' for the monthly layout or 'YYYY' for the yearly layout.
+    """
+    if layout not in PERIOD_LENGTH:
+        raise ValueError(f"Unknown chunked layout {layout}, expected one of {list(PERIOD_LENGTH)}")
+    return date[:PERIOD_LENGTH[layout]]
+
+
+def document_size(data: dict) -> int:
+    """
+    Estimate the stored size of a document in bytes.
+
+    Parameters
+    ----------
+    data: dict
+        The data of the document.
+
+    Returns
+    -------
+    int
+        The estimated size following the firestore storage size rules: strings take their
+        UTF-8 length plus one byte, numbers take 8 bytes and nulls take 1 byte.
+    """
+
+    def value_size(value) -> int:
+        if isinstance(value, str):
+            return len(value.encode()) + 1
+        if isinstance(value, list):
+            return sum(value_size(item) for item in value)
+        if value is None:
+            return 1
+        return 8
+
+    return sum(len(str(key).encode()) + 1 + value_size(value) for key, value in data.items()) + 32
+
+
+def same_chunk(chunk: dict, stored: Optional[dict]) -> bool:
+    """
+    Check whether a chunk holds the same data as a stored chunk, treating NaN values as equal.
+
+    Parameters
+    ----------
+    chunk: dict
+        The chunk data to write.
+    stored: Optional[dict]
+        The stored chunk data, None if the chunk is not stored.
+
+    Returns
+    -------
+    bool
+        True if the stored chunk has the same fields and values.
+    """
+    # NaN != NaN, so compare the JSON serializations, in which NaN values are equal
+    return stored is not None and json.dumps(chunk, sort_keys=True) == json.dumps(stored, sort_keys=True)
+
+
+def to_chunks(records: Iterable[dict], layout: str) -> dict[str, dict]:
+    """
+    Pack the stock price data into one columnar chunk per period.
+
+    Parameters
+    ----------
+    records: Iterable[dict]
+        The dictionary representations of the stock price data to pack.
+    layout: str
+        The chunked storage layout, 'monthly' or 'yearly'.
+
+    Returns
+    -------
+    dict[str, dict]
+        The chunk data keyed by period id. Each chunk holds the period id and one array per
+        StockPriceData field, with the values of the bars in date order.
+    """
+    chunks: dict[str, dict] = {}
+    for record in sorted(records, key=lambda stock_price: stock_price["date"]):
+        period: str = period_id(record["date"], layout)
+        chunk: dict = chunks.setdefault(period, {"period": period})
+        for field, value in record.items():
+            chunk.setdefault(field, []).append(value)
+    return chunks
+
+
+def chunk_records(chunk: dict) -> Iterator[dict]:
+    """
+    Iterate over the dictionary representations of the stock price data in a columnar chunk.
+
+    Parameters
+    ----------
+    chunk: dict
+        The data of a chunk document.
+
+    Returns
+    -------
+    Iterator[dict]
+        The dictionary representation of each bar in the chunk, in date order.
+    """
+    fields: list[str] = [field for field in chunk if field != "period"]
+    return (dict(zip(fields, values)) for values in zip(*(chunk[field] for field in fields)))
+
+
+def from_chunk(chunk: dict) -> list[StockPriceData]:
+    """
+    Unpack a columnar chunk into stock price data.
+
+    Parameters
+    ----------
+    chunk: dict
+        The data of a chunk document.
+
+    Returns
+    -------
+    list[StockPriceData]
+        The stock price data of the bars in the chunk, in date order.
+    """
+    return [StockPriceData(**record) for record in chunk_records(chunk)]
+
+
+def merge_chunk(stored: Optional[dict], chunk: dict, layout: str) -> dict:
+    """
+    Merge a new chunk into the chunk already stored for the same period.
+
+    Parameters
+    ----------
+    stored: Optional[dict]
+        The data of the stored chunk document or None if it does not exist.
+    chunk: dict
+        The new chunk, whose bars replace the stored bars with the same date.
+    layout: str
+        The chunked storage layout, 'monthly' or 'yearly'.
+
+    Returns
+    -------
+    dict
+        The merged chunk with the bars of both chunks in date order.
+    """
+    if not stored:
+        return chunk
+    bars: dict[str, dict] = {record["date"]: record for record in chunk_records(stored)}
+    bars.update({record["date"]: record for record in chunk_records(chunk)})
+    return to_chunks(bars.values(), layout)[chunk["period"]]
+
+
+def store_stock_data_chunked(stock_data: Union[StockData, ColumnarStockData], firestore_db: FirestoreDB,
+                             layout: str, batch_size: int = FIRESTORE_BATCH_SIZE) -> int:
+    """
+    Store the stock price data of a single ticker as one columnar document per period.
+
+    Parameters
+    ----------
+    stock_data: Union[StockData, ColumnarStockData]
+        A StockData or ColumnarStockData object containing the ticker and the stock price data.
+    firestore_db: FirestoreDB
+        A FirestoreDB object representing the firestore database.
+    layout: str
+        The chunked storage layout, 'monthly' or 'yearly'.
+    batch_size: int
+        The maximum number of writes per batch commit, firestore allows up to 500.
+
+    Returns
+    -------
+    int
+        The number of chunk documents written.
+
+    Notes
+    -----
+    1. Rationale
+        Storing each bar as its own document costs one read per bar when the history is loaded
+        back. Packing the bars of a period into parallel arrays of a single document divides the
+        number of reads and writes by the number of bars per period.
+
+    2. Implementation Details
+        - The stock price data is grouped into chunks by period.
+        - The stored chunks of the touched periods are read in a single request and merged with
+          the new bars, so an incremental run reads and rewrites only the latest chunk.
+        - A ValueError is raised before writing if a merged chunk would exceed the 1 MiB
+          document size limit, in which case a finer layout should be used.
+        - Merged chunks equal to the stored chunks are not written again.
+        - The chunks are replaced with write batches of up to batch_size writes, see
+          FirestoreDB.set_documents.
+    """
+    chunks: dict[str, dict] = to_chunks(stock_data.records(), layout)
+    if not chunks:
+        return 0
+    collection = firestore_db.chunk_collection(stock_data.ticker, layout)
+    references: list = [collection.document(period) for period in chunks]
+    stored: dict[str, dict] = {
+        snapshot.id: snapshot.to_dict() for snapshot in firestore_db.get_documents(references) if snapshot.exists
+    }
+    instrumentation.count("firestore_reads", len(references), ticker=stock_data.ticker)
+
+    writes: list[tuple[object, dict]] = []
+    for reference, (period, chunk) in zip(references, chunks.items()):
+        merged: dict = merge_chunk(stored.get(period), chunk, layout)
+        if same_chunk(merged, stored.get(period)):
+            # The stored chunk already holds these bars
+            instrumentation.count("skipped_writes", ticker=stock_data.ticker)
+            continue
+        if document_size(merged) > MAX_DOCUMENT_BYTES:
+            raise ValueError(f"Chunk {stock_data.ticker}/{period} exceeds {MAX_DOCUMENT_BYTES} bytes, "
+                             f"use a finer layout than {layout}")
+        writes.append((reference, merged))
+    return firestore_db.set_documents(writes, batch_size=batch_size, merge=False, ticker=stock_data.ticker)
+
+
+def read_stock_data_chunked(ticker: str, firestore_db: FirestoreDB, layout: str,
+                            start_date: Optional[str] = None, end_date: Optional[str] = None) -> StockData:
+    """
+    Read the stock price data of a ticker stored as columnar chunks.
+
+    Parameters
+    ----------
+    ticker: str
+        The ticker symbol of the stock.
+    firestore_db: FirestoreDB
+        A FirestoreDB object representing the firestore database.
+    layout: str
+        The chunked storage layout, 'monthly' or 'yearly'.
+    start_date: Optional[str]
+        If given, only the bars on or after this 'YYYY-MM-DD' date are returned.
+    end_date: Optional[str]
+        If given, only the bars on or before this 'YYYY-MM-DD' date are returned.
+
+    Returns
+    -------
+    StockData
+        A StockData object containing the ticker and the stock price data in date order.
+
+    Notes
+    -----
+    1. Implementation Details
+        - Only the chunks of the periods overlapping the date range are streamed, by filtering
+          on the period field of the chunks.
+        - The bars of the first and last chunk outside the date range are dropped.
+    """
+    query = firestore_db.chunk_collection(ticker, layout).order_by("period")
+    if start_date is not None:
+        query = query.where("period", ">=", period_id(start_date, layout))
+    if end_date is not None:
+        query = query.where("period", "<=", period_id(end_date, layout))
+    chunks: list[dict] = [snapshot.to_dict() for snapshot in query.stream()]
+    instrumentation.count("firestore_reads", max(1, len(chunks)), ticker=ticker)
+    stock_price_data: list[StockPriceData] = [
+        stock_price
+        for chunk in chunks
+        for stock_price in from_chunk(chunk)
+        if (start_date is None or stock_price.date[:10] >= start_date)
+        and (end_date is None or stock_price.date[:10] <= end_date)
+    ]
+    return StockData(ticker=ticker, stock_price_data=stock_price_data)
+
+
+def get_latest_stock_price_chunked(ticker: str, firestore_db: FirestoreDB, layout: str) -> Optional[StockPriceData]:
+    """
+    Get the most recent stock price data stored for the given ticker in a chunked layout.
+
+    Parameters
+    ----------
+    ticker: str
+        The ticker symbol of the stock.
+    firestore_db: FirestoreDB
+        A FirestoreDB object representing the firestore database.
+    layout: str
+        The chunked storage layout, 'monthly' or 'yearly'.
+
+    Returns
+    -------
+    Optional[StockPriceData]
+        The last bar of the latest chunk or None if no data is stored for the ticker.
+    """
+    query = firestore_db.chunk_collection(ticker, layout).order_by("period", direction="DESCENDING").limit(1)
+    instrumentation.count("firestore_reads", ticker=ticker)
+    for snapshot in query.stream():
+        stock_price_data: list[StockPriceData] = from_chunk(snapshot.to_dict())
+        return stock_price_data[-1] if stock_price_data else None
+    return None
+
+
+def migrate_to_chunked(ticker: str, firestore_db: FirestoreDB, layout: str) -> int:
+    """
+    Copy the stock price data of a ticker from the per-day layout into a chunked layout.
+
+    Parameters
+    ----------
+    ticker: str
+        The ticker symbol of the stock.
+    firestore_db: FirestoreDB
+        A FirestoreDB object representing the firestore database.
+    layout: str
+        The chunked storage layout, 'monthly' or 'yearly'.
+
+    Returns
+    -------
+    int
+        The number of chunk documents written.
+
+    Notes
+    -----
+    1. Implementation Details
+        - The date documents of the ticker collection are streamed once and packed into chunks.
+        - The date documents are left in place, so the migration can be verified before they
+          are deleted. Running it again writes no chunk, as store_stock_data_chunked skips the
+          chunks already holding the same bars, except those of the date documents added or
+          changed since.
+    """
+    stock_price_data: list[StockPriceData] = [
+        StockPriceData(**snapshot.to_dict()) for snapshot in firestore_db.get_collection(ticker).stream()
+    ]
+    return store_stock_data_chunked(StockData(ticker=ticker, stock_price_data=stock_price_data), firestore_db,
+                                    layout)
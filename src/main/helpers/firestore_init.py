@@ -1,7 +1,7 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
+from typing import Iterable, Optional
 
-from config.app_config import FIRESTORE_SERVICE_ACCOUNT
+from config.app_config import FIRESTORE_BATCH_SIZE, FIRESTORE_SERVICE_ACCOUNT
+from src.main.helpers.instrumentation import instrumentation
 
 
 def firestore_init(path_to_key: str):
@@ -17,7 +17,16 @@ def firestore_init(path_to_key: str):
     -------
         firestore.client.Client:
             Firestore client object.
+
+    Notes
+    -----
+    1. Implementation Details
+        - firebase_admin is imported here rather than at module level, so that code paths
+          not connecting to firestore do not pay its import time.
     """
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
     # Use a service account
     cred = credentials.Certificate(path_to_key)
     firebase_admin.initialize_app(cred)
@@ -148,6 +157,187 @@ class FirestoreDB:
         except ValueError as ve:
             raise ValueError(f"Error getting document {ticker}/{date}: {ve}") from ve
 
+    def chunk_collection(self, ticker, layout):
+        """
+        Get a reference to the collection holding the chunk documents of the given ticker and layout.
+
+        Parameters
+        ----------
+        ticker: str
+            The ticker symbol of the stock.
+        layout: str
+            The chunked storage layout, 'monthly' or 'yearly'.
+
+        Returns
+        -------
+        firestore.CollectionReference
+            A reference to the '{ticker}/{layout}/periods' collection.
+
+        Notes
+        -----
+        1. Rationale
+            In a chunked layout, the stock price data of a ticker is packed into one document
+            per period. The chunk documents are kept in a subcollection of the ticker collection,
+            so they never mix with the date documents of the daily layout.
+        """
+        return self.db.collection(f"{ticker}/{layout}/periods")
+
+    def interval_collection(self, ticker, interval):
+        """
+        Get a reference to the collection holding the bars of the given ticker resampled to an interval.
+
+        Parameters
+        ----------
+        ticker: str
+            The ticker symbol of the stock.
+        interval: str
+            The interval of the bars, e.g. '1W' or '1M'.
+
+        Returns
+        -------
+        firestore.CollectionReference
+            A reference to the '{ticker}/{interval}/bars' collection, with one document per bar
+            whose id is the date of the bar.
+        """
+        return self.db.collection(f"{ticker}/{interval}/bars")
+
+    def manifest_document(self, ticker):
+        """
+        Get a reference to the document holding the content hashes of the date documents of the given ticker.
+
+        Parameters
+        ----------
+        ticker: str
+            The ticker symbol of the stock.
+
+        Returns
+        -------
+        firestore.DocumentReference
+            A reference to the '_manifests/{ticker}' document.
+
+        Notes
+        -----
+        1. Rationale
+            The manifests are kept in their own collection, so they never mix with the date
+            documents of the ticker collections.
+        """
+        return self.db.document(f"_manifests/{ticker}")
+
+    def get_documents(self, references):
+        """
+        Get the snapshots of the given documents in a single request.
+
+        Parameters
+        ----------
+        references: list[firestore.DocumentReference]
+            References to the documents to get.
+
+        Returns
+        -------
+        list[firestore.DocumentSnapshot]
+            The snapshots of the documents, including the ones that do not exist.
+        """
+        return list(self.db.get_all(references))
+
+    def get_latest_document(self, ticker):
+        """
+        Get the data of the most recent date document in the collection of the given ticker.
+
+        Parameters
+        ----------
+        ticker: str
+            The ticker symbol of the stock.
+
+        Returns
+        -------
+        dict or None
+            The data of the document with the latest date in the ticker collection or None if
+            the collection has no documents.
+
+        Notes
+        -----
+        1. Rationale
+            This method determines the most recent stock price data stored in the database,
+            allowing the application to fetch and store only the data after it.
+
+        2. Implementation Details
+            - The documents of the ticker collection are ordered by their date field in
+              descending order and limited to one, so a single document is read.
+        """
+        from firebase_admin import firestore
+
+        query = (self.db.collection(ticker)
+                 .order_by("date", direction=firestore.Query.DESCENDING)
+                 .limit(1))
+        for snapshot in query.stream():
+            return snapshot.to_dict()
+        return None
+
+    def batch(self):
+        """
+        Create a write batch to group several document writes into a single commit.
+
+        Returns
+        -------
+        firestore.WriteBatch
+            A write batch of the firestore client object.
+
+        Notes
+        -----
+        1. Rationale
+            Writing each document with its own request costs one round-trip per document.
+            A write batch commits up to 500 writes in a single request.
+
+        2. Implementation Details
+            - The batch method of the firestore client object is used to create the batch.
+            - The writes are sent when the commit method of the batch is called.
+        """
+        return self.db.batch()
+
+    def set_documents(self, writes: Iterable[tuple[object, dict]], batch_size: int = FIRESTORE_BATCH_SIZE,
+                      merge: bool = True, ticker: Optional[str] = None) -> int:
+        """
+        Set the data of many documents with write batches.
+
+        Parameters
+        ----------
+        writes: Iterable[tuple[firestore.DocumentReference, dict]]
+            The reference of each document and the data to set, consumed one at a time.
+        batch_size: int
+            The maximum number of writes per batch commit, firestore allows up to 500.
+        merge: bool
+            Whether to merge the data into the existing documents instead of replacing them.
+        ticker: Optional[str]
+            The ticker the writes are counted for by the instrumentation.
+
+        Returns
+        -------
+        int
+            The number of documents written.
+
+        Notes
+        -----
+        1. Implementation Details
+            - The batch is committed whenever it holds batch_size writes, and once more for
+              the remaining writes.
+        """
+        batch = self.batch()
+        pending: int = 0
+        written: int = 0
+        for reference, data in writes:
+            batch.set(reference, data, merge=merge)
+            pending += 1
+            written += 1
+            if pending == batch_size:
+                batch.commit()
+                instrumentation.count("firestore_writes", pending, ticker=ticker)
+                batch = self.batch()
+                pending = 0
+        if pending:
+            batch.commit()
+            instrumentation.count("firestore_writes", pending, ticker=ticker)
+        return written
+
     @staticmethod
     def create_document(collection, doc_id, data):
         """
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+from typing import Iterable
+
+from config.app_config import STORE_MANIFEST, STORE_MANIFEST_DIR
+from src.main.helpers.firestore_init import FirestoreDB
+from src.main.helpers.instrumentation import instrumentation
+from src.main.data_models.stock_price_data import STOCK_PRICE_FIELDS
+
+# The significant digits of the float fields compared by the content hashes
+HASH_SIGNIFICANT_DIGITS: int = 12
+
+
+def record_hash(record: dict) -> str:
+    """
+    Hash the content of a date document.
+
+    Parameters
+    ----------
+    record: dict
+        The dictionary representation of the stock price data of the document.
+
+    Returns
+    -------
+    str
+        A 16 character hexadecimal BLAKE2b digest of the StockPriceData fields of the record.
+
+    Notes
+    -----
+    1. Implementation Details
+        - The fields are serialized as a JSON array in STOCK_PRICE_FIELDS order, so python and
+          NumPy floats of the same value, as produced by StockData and ColumnarStockData, hash the same.
+        - Floats are rounded to HASH_SIGNIFICANT_DIGITS, as the metrics compounded from the last stored
+          bar in incremental mode differ from a full recalculation in their last bits only.
+    """
+    content: str = json.dumps([float(f"{value:.{HASH_SIGNIFICANT_DIGITS}g}") if isinstance(value, float) else value
+                               for value in (record.get(field) for field in STOCK_PRICE_FIELDS)])
+    return hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+
+
+def load_manifest(ticker: str, firestore_db: FirestoreDB, backend: str = STORE_MANIFEST,
+                  directory: str = STORE_MANIFEST_DIR) -> dict[str, str]:
+    """
+    Load the content hashes of the date documents stored for the given ticker.
+
+    Parameters
+    ----------
+    ticker: str
+        The ticker symbol of the stock.
+    firestore_db: FirestoreDB
+        A FirestoreDB object representing the firestore database.
+    backend: str
+        'firestore' to keep the manifest in a firestore document, 'local' to keep it in a JSON
+        sidecar file, or 'off' to not keep a manifest.
+    directory: str
+        The directory of the sidecar files of the local backend.
+
+    Returns
+    -------
+    dict[str, str]
+        The content hash of each date document keyed by date, empty if no manifest is stored.
+    """
+    if backend == "off":
+        return {}
+    if backend == "local":
+        try:
+            with open(os.path.join(directory, f"{ticker}.json")) as manifest_file:
+                manifest: dict = json.load(manifest_file)
+        except (OSError, ValueError):
+            return {}
+    else:
+        snapshot = firestore_db.manifest_document(ticker).get()
+        instrumentation.count("firestore_reads", ticker=ticker)
+        if not snapshot.exists:
+            return {}
+        manifest = snapshot.to_dict()
+    return dict(zip(manifest.get("dates", []), manifest.get("hashes", [])))
+
+
+def save_manifest(ticker: str, firestore_db: FirestoreDB, hashes: dict[str, str], backend: str = STORE_MANIFEST,
+                  directory: str = STORE_MANIFEST_DIR) -> None:
+    """
+    Save the content hashes of the date documents stored for the given ticker.
+
+    Parameters
+    ----------
+    ticker: str
+        The ticker symbol of the stock.
+    firestore_db: FirestoreDB
+        A FirestoreDB object representing the firestore database.
+    hashes: dict[str, str]
+        The content hash of each date document keyed by date.
+    backend: str
+        'firestore', 'local' or 'off', see load_manifest.
+    directory: str
+        The directory of the sidecar files of the local backend.
+
+    Notes
+    -----
+    1. Implementation Details
+        - The manifest is stored as two parallel arrays of dates and hashes, about 40 bytes per
+          date document, so 20 years of daily bars fit well within the 1 MiB document size limit.
+        - The local sidecar file is replaced atomically, so an interrupted run leaves the previous
+          manifest in place.
+    """
+    if backend == "off":
+        return
+    dates: list[str] = sorted(hashes)
+    manifest: dict = {"dates": dates, "hashes": [hashes[date] for date in dates]}
+    if backend == "local":
+        os.makedirs(directory, exist_ok=True)
+        path: str = os.path.join(directory, f"{ticker}.json")
+        with open(f"{path}.tmp", "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(f"{path}.tmp", path)
+    else:
+        firestore_db.manifest_document(ticker).set(manifest)
+        instrumentation.count("firestore_writes", ticker=ticker)
+
+
+def changed_records(records: Iterable[dict], hashes: dict[str, str]) -> list[dict]:
+    """
+    Select the records which are new or differ from the stored date documents, and update the hashes.
+
+    Parameters
+    ----------
+    records: Iterable[dict]
+        The dictionary representations of the stock price data to store.
+    hashes: dict[str, str]
+        The content hash of each stored date document keyed by date, updated in place with the
+        hashes of the changed records.
+
+    Returns
+    -------
+    list[dict]
+        The records whose date is not in the hashes or whose content hash differs.
+    """
+    changed: list[dict] = []
+    for record in records:
+        content_hash: str = record_hash(record)
+        if hashes.get(record["date"]) != content_hash:
+            hashes[record["date"]] = content_hash
+            changed.append(record)
+    return changed
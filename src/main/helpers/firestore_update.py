@@ -1,66 +1,370 @@
-from config.app_config import FIRESTORE_SERVICE_ACCOUNT
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Optional, Union
+
+import pandas as pd
+
+from config.app_config import (FIRESTORE_BATCH_SIZE, FIRESTORE_LAYOUT, FIRESTORE_SERVICE_ACCOUNT, QUERY_SERVICE_URL,
+                               STORE_MANIFEST, STORE_MAX_WORKERS)
 from src.main.helpers.firestore_init import firestore_init, FirestoreDB
-from src.main.data_models.stock_price_data import StockData, StockPriceData
+from src.main.helpers.instrumentation import instrumentation
+from src.main.helpers.firestore_chunks import (get_latest_stock_price_chunked, read_stock_data_chunked,
+                                               store_stock_data_chunked)
+from src.main.helpers.firestore_manifest import changed_records, load_manifest, save_manifest
+from src.main.data_models.stock_price_data import ColumnarStockData, StockData, StockPriceData
+from src.main.analysis.resample import resample_stock_data
 
+# The functions called with the tickers whose new bars were just stored, e.g. QueryService.invalidate
+store_listeners: list[Callable[[list[str]], object]] = []
 
-def store_data(stock_data_list: list[StockData], firestore_db: FirestoreDB) -> None:
+
+def store_data(stock_data_list: list[Union[StockData, ColumnarStockData]], firestore_db: FirestoreDB,
+               max_workers: int = STORE_MAX_WORKERS, layout: str = FIRESTORE_LAYOUT,
+               failed: Optional[dict[str, Exception]] = None) -> int:
     """
     Store the stock price data in the firestore database.
 
     Parameters
     ----------
-    stock_data_list: list[StockData]
-        A list of StockData objects containing the ticker and the stock price data.
+    stock_data_list: list[Union[StockData, ColumnarStockData]]
+        A list of StockData or ColumnarStockData objects containing the ticker and the stock price data.
     firestore_db: FirestoreDB
         A FirestoreDB object representing the firestore database.
+    max_workers: int
+        The maximum number of tickers whose batches are committed concurrently.
+    layout: str
+        The storage layout, 'daily' for one document per bar, or 'monthly' or 'yearly' for
+        one columnar document per period.
+    failed: Optional[dict[str, Exception]]
+        If given, the exception raised for every ticker that could not be stored is recorded here,
+        keyed by ticker symbol.
 
     Returns
     -------
-    None
+    int
+        The number of documents written, for the tickers stored successfully.
+
+    Raises
+    ------
+    RuntimeError
+        If failed is not given and some tickers could not be stored, once all the others are stored.
 
     Notes
     -----
     1. Rationale
         This function stores the stock price data in the firestore database, creating
         or updating the documents in the collections corresponding to the tickers.
+        Reading each document before writing it costs two sequential round-trips per
+        document, so the documents are written with merging write batches instead.
 
     2. Implementation Details
-        - The function iterates over the stock data list and gets the ticker and the
-          stock price data for each StockData object.
-        - The function checks if the ticker collection exists in the firestore database
-          and creates a new collection if not.
-        - The function iterates over the stock price data and gets the date for each
-          stock price object.
+        - The function stores the stock data of each ticker with store_ticker_data on a
+          thread pool, so that the batches of different tickers are committed in parallel.
+        - A failing ticker is reported on stderr and recorded, as in run_pipeline, without
+          interrupting the other tickers.
+        - The number of documents written and the write throughput are printed.
+    """
+    start: float = time.perf_counter()
+    errors: dict[str, Exception] = {} if failed is None else failed
+    writes: int = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures: dict[Future, str] = {executor.submit(store_ticker_data, stock_data, firestore_db, layout):
+                                      stock_data.ticker for stock_data in stock_data_list}
+        for future, ticker in futures.items():
+            try:
+                writes += future.result()
+            except Exception as e:
+                print(f"Error storing {ticker}: {e}", file=sys.stderr)
+                errors[ticker] = e
+    elapsed: float = time.perf_counter() - start
+    print(f"Stored {writes} documents in {elapsed:.2f}s ({writes / elapsed if elapsed else 0:.0f} ops/s)")
+    if errors and failed is None:
+        message: str = f"Failed to store {len(errors)} of {len(futures)} tickers: {sorted(errors)}"
+        raise RuntimeError(message) from next(iter(errors.values()))
+    return writes
+
+
+def store_ticker_data(stock_data: Union[StockData, ColumnarStockData], firestore_db: FirestoreDB,
+                      layout: str = FIRESTORE_LAYOUT, manifest: str = STORE_MANIFEST) -> int:
+    """
+    Store the stock price data of a single ticker in the given storage layout.
+
+    Parameters
+    ----------
+    stock_data: Union[StockData, ColumnarStockData]
+        A StockData or ColumnarStockData object containing the ticker and the stock price data.
+    firestore_db: FirestoreDB
+        A FirestoreDB object representing the firestore database.
+    layout: str
+        The storage layout, 'daily', 'monthly' or 'yearly'.
+    manifest: str
+        Where the content hashes of the date documents of the daily layout are kept, see store_stock_data.
+
+    Returns
+    -------
+    int
+        The number of documents written.
+    """
+    with instrumentation.stage("store", stock_data.ticker):
+        if layout == "daily":
+            writes: int = store_stock_data(stock_data, firestore_db, manifest=manifest)
+        else:
+            writes = store_stock_data_chunked(stock_data, firestore_db, layout)
+    if writes:
+        notify_stored([stock_data.ticker])
+    return writes
+
+
+def notify_stored(tickers: list[str]) -> None:
+    """
+    Notify the store_listeners, and the query service at QUERY_SERVICE_URL if set, that new bars of the tickers
+    were stored, so that their cached data is invalidated.
+    """
+    for listener in store_listeners:
+        listener(tickers)
+    if QUERY_SERVICE_URL:
+        from src.main.helpers.query_service import notify_query_service
+
+        notify_query_service(tickers)
+
+
+def store_stock_data(stock_data: Union[StockData, ColumnarStockData], firestore_db: FirestoreDB,
+                     batch_size: int = FIRESTORE_BATCH_SIZE, manifest: str = STORE_MANIFEST) -> int:
+    """
+    Store the stock price data of a single ticker in the firestore database.
+
+    Parameters
+    ----------
+    stock_data: Union[StockData, ColumnarStockData]
+        A StockData or ColumnarStockData object containing the ticker and the stock price data.
+    firestore_db: FirestoreDB
+        A FirestoreDB object representing the firestore database.
+    batch_size: int
+        The maximum number of writes per batch commit, firestore allows up to 500.
+    manifest: str
+        Where the content hashes of the date documents are kept to skip unchanged documents,
+        'firestore', 'local' or 'off', see load_manifest.
+
+    Returns
+    -------
+    int
+        The number of documents written.
+
+    Notes
+    -----
+    1. Implementation Details
+        - The function iterates over the dictionary representations of the stock price
+          data, so that a ColumnarStockData materializes one bar at a time, and gets the
+          date of each bar.
         - The function uses the document path to get the date document in the ticker
-          collection and tries to get the document snapshot.
-        - The function checks if the document exists and updates the existing document
-          or creates a new document with the stock price data.
-    """
-    # Iterate over the stock price list
-    for stock_data in stock_data_list:
-        # Get the ticker and the stock price data
-        ticker: str = stock_data.ticker
-        stock_price_data: list[StockPriceData] = stock_data.stock_price_data
-
-        # Check if the ticker collection exists
-        # If not, create a new collection
-        collection = firestore_db.get_collection(ticker)
-        if collection is None:
-            collection = firestore_db.create_collection(ticker)
-
-        # Iterate over the stock price data
-        for stock_price in stock_price_data:
-            # Get the date string
-            date: str = stock_price.date
-
-            # Use the document path to get the date document
-            date_document = firestore_db.document(ticker=ticker, date=date)
-            # Try to get the document snapshot
-            date_document_snapshot = date_document.get()
-            # Check if the document exists
-            if date_document_snapshot.exists:
-                # Update the existing document
-                firestore_db.update_document(date_document, stock_price.to_dict())
-            else:
-                # Create a new document
-                firestore_db.create_document(collection, date, stock_price.to_dict())
+          collection and sets it with merge in write batches of batch_size writes, see
+          FirestoreDB.set_documents, which creates the document if it does not exist and
+          updates it otherwise.
+        - Unless manifest is 'off', the content hashes of the stored date documents are loaded
+          in a single read, and only the bars which are new or whose hash differs are written.
+          The manifest is saved after the last commit, so an interrupted run rewrites bars
+          rather than skipping them. It assumes the pipeline is the only writer of the ticker
+          collection, deleting it forces the next run to rewrite every bar.
+    """
+    # Get the ticker
+    ticker: str = stock_data.ticker
+
+    records: Iterable[dict] = stock_data.records()
+    hashes: dict[str, str] = {}
+    if manifest != "off":
+        hashes = load_manifest(ticker, firestore_db, manifest)
+        records = list(records)
+        total: int = len(records)
+        records = changed_records(records, hashes)
+        instrumentation.count("skipped_writes", total - len(records), ticker=ticker)
+
+    # Create or update the date documents without reading them first
+    written: int = firestore_db.set_documents(
+        ((firestore_db.document(ticker=ticker, date=stock_price["date"]), stock_price) for stock_price in records),
+        batch_size=batch_size, ticker=ticker)
+    if written and manifest != "off":
+        save_manifest(ticker, firestore_db, hashes, manifest)
+    return written
+
+
+def store_indicator_data(ticker: str, records: Iterable[dict], firestore_db: FirestoreDB,
+                         batch_size: int = FIRESTORE_BATCH_SIZE) -> int:
+    """
+    Store indicator values next to the stock price data of the date documents of a ticker.
+
+    Parameters
+    ----------
+    ticker: str
+        The ticker symbol of the stock.
+    records: Iterable[dict]
+        The 'date' and indicator values of each bar, e.g. from indicator_records.
+    firestore_db: FirestoreDB
+        A FirestoreDB object representing the firestore database.
+    batch_size: int
+        The maximum number of writes per batch commit, firestore allows up to 500.
+
+    Returns
+    -------
+    int
+        The number of documents written.
+
+    Notes
+    -----
+    1. Implementation Details
+        - The indicator values are merged into the date documents of the daily layout with
+          write batches, so the StockPriceData fields of the documents are left unchanged.
+    """
+    return firestore_db.set_documents(((firestore_db.document(ticker=ticker, date=record["date"]), record)
+                                       for record in records), batch_size=batch_size, ticker=ticker)
+
+
+def store_interval_data(stock_data: Union[StockData, ColumnarStockData], firestore_db: FirestoreDB,
+                        intervals: list[str], incremental: bool = True,
+                        batch_size: int = FIRESTORE_BATCH_SIZE) -> int:
+    """
+    Derive the bars of each interval from the daily stock price data of a ticker and store them.
+
+    Parameters
+    ----------
+    stock_data: Union[StockData, ColumnarStockData]
+        A StockData or ColumnarStockData object containing the ticker and its daily stock price data.
+    firestore_db: FirestoreDB
+        A FirestoreDB object representing the firestore database.
+    intervals: list[str]
+        The intervals to derive, e.g. ['1W', '1M'], see RESAMPLE_FREQUENCIES.
+    incremental: bool
+        Whether the stock price data only holds the daily bars after the stored ones, in which case
+        the bars of each interval continue from the last one stored.
+    batch_size: int
+        The maximum number of writes per batch commit, firestore allows up to 500.
+
+    Returns
+    -------
+    int
+        The number of documents written.
+
+    Notes
+    -----
+    1. Rationale
+        Requesting each interval from the provider costs one more request per ticker and interval,
+        and one more clean_stock_price. The bars of the coarser intervals are derived from the
+        daily bars instead, see resample_stock_price_panel.
+
+    2. Implementation Details
+        - The bars of an interval are kept in the '{ticker}/{interval}/bars' collection, next to the
+          date documents, with one document per period whose id is the last calendar day of the period.
+          The bar of the current period is rewritten as new daily bars arrive.
+        - In incremental mode, the last stored bar of each interval is read with one query.
+        - In incremental mode, an interval without any stored bar, e.g. one requested for the first
+          time, is backfilled: the daily bars stored before the new ones are read once with
+          read_stock_data, and resampled together with the new ones, so its bars start with the
+          daily history instead of the new bars.
+    """
+    if not len(stock_data) or not intervals:
+        return 0
+    ticker: str = stock_data.ticker
+    written: int = 0
+    history: Optional[StockData] = None
+    for interval in intervals:
+        last_stock_price: Optional[StockPriceData] = (get_latest_interval_price(ticker, interval, firestore_db)
+                                                      if incremental else None)
+        daily_data: Union[StockData, ColumnarStockData] = stock_data
+        if incremental and last_stock_price is None:
+            if history is None:
+                stored: StockData = read_stock_data(ticker, firestore_db)
+                history = StockData(ticker=ticker,
+                                    stock_price_data=stored.stock_price_data + stock_data.stock_price_data)
+            daily_data = history
+        with instrumentation.stage("resample", ticker):
+            resampled: ColumnarStockData = resample_stock_data([daily_data], interval,
+                                                               {ticker: last_stock_price})[0]
+        collection = firestore_db.interval_collection(ticker, interval)
+        written += firestore_db.set_documents(((collection.document(record["date"]), record)
+                                               for record in resampled.records()), batch_size=batch_size,
+                                              ticker=ticker)
+    return written
+
+
+def get_latest_interval_price(ticker: str, interval: str, firestore_db: FirestoreDB) -> Optional[StockPriceData]:
+    """
+    Get the most recent bar stored for the given ticker in the collection of an interval, None if there is none.
+    """
+    query = firestore_db.interval_collection(ticker, interval).order_by("date", direction="DESCENDING").limit(1)
+    instrumentation.count("firestore_reads", ticker=ticker)
+    for snapshot in query.stream():
+        return StockPriceData(**snapshot.to_dict())
+    return None
+
+
+def get_latest_stock_price(ticker: str, firestore_db: FirestoreDB,
+                           layout: str = FIRESTORE_LAYOUT) -> Optional[StockPriceData]:
+    """
+    Get the most recent stock price data stored for the given ticker.
+
+    Parameters
+    ----------
+    ticker: str
+        The ticker symbol of the stock.
+    firestore_db: FirestoreDB
+        A FirestoreDB object representing the firestore database.
+    layout: str
+        The storage layout, 'daily', 'monthly' or 'yearly'.
+
+    Returns
+    -------
+    Optional[StockPriceData]
+        The stock price data of the latest date document in the ticker collection or None
+        if no data is stored for the ticker.
+    """
+    if layout != "daily":
+        return get_latest_stock_price_chunked(ticker, firestore_db, layout)
+    latest_document: Optional[dict] = firestore_db.get_latest_document(ticker)
+    # A query is billed at least one read, even without results
+    instrumentation.count("firestore_reads", ticker=ticker)
+    if latest_document is None:
+        return None
+    return StockPriceData(**latest_document)
+
+
+def read_stock_data(ticker: str, firestore_db: FirestoreDB, layout: str = FIRESTORE_LAYOUT,
+                    start_date: Optional[str] = None, end_date: Optional[str] = None) -> StockData:
+    """
+    Read the stock price data stored for the given ticker.
+
+    Parameters
+    ----------
+    ticker: str
+        The ticker symbol of the stock.
+    firestore_db: FirestoreDB
+        A FirestoreDB object representing the firestore database.
+    layout: str
+        The storage layout, 'daily', 'monthly' or 'yearly'.
+    start_date: Optional[str]
+        If given, only the bars on or after this 'YYYY-MM-DD' date are returned.
+    end_date: Optional[str]
+        If given, only the bars on or before this 'YYYY-MM-DD' date are returned.
+
+    Returns
+    -------
+    StockData
+        A StockData object containing the ticker and the stock price data in date order.
+
+    Notes
+    -----
+    1. Implementation Details
+        - For the daily layout, the date documents of the ticker collection are streamed in date
+          order, filtered on their date field.
+        - For a chunked layout, the chunks are read with read_stock_data_chunked.
+    """
+    if layout != "daily":
+        return read_stock_data_chunked(ticker, firestore_db, layout, start_date=start_date, end_date=end_date)
+    query = firestore_db.get_collection(ticker).order_by("date")
+    if start_date is not None:
+        query = query.where("date", ">=", start_date)
+    if end_date is not None:
+        # Dates are stored with a time suffix, so compare against the start of the next day
+        query = query.where("date", "<", (pd.Timestamp(end_date) + pd.Timedelta(days=1)).strftime("%Y-%m-%d"))
+    stock_price_data: list[StockPriceData] = [StockPriceData(**snapshot.to_dict()) for snapshot in query.stream()]
+    instrumentation.count("firestore_reads", max(1, len(stock_price_data)), ticker=ticker)
+    return StockData(ticker=ticker, stock_price_data=stock_price_data)
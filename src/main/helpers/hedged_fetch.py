@@ -0,0 +1,236 @@
+import bisect
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from config.app_config import (HEDGE_INITIAL_DELAY, HEDGE_MAX_WORKERS, HEDGE_MIN_SAMPLES, HEDGE_PERCENTILE,
+                               HEDGE_PROVIDERS)
+from src.main.helpers.instrumentation import instrumentation
+from src.main.helpers.rate_limiter import ProviderRateLimiter
+
+# The upper bounds in seconds of the latency histogram buckets, four per doubling from 1ms to about 2 minutes
+LATENCY_BUCKETS: list[float] = [0.001 * 2 ** (i / 4) for i in range(69)]
+
+
+def normalize_stock_price(stock_price: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalize the raw stock price data of any provider to the same close price frame.
+
+    Parameters
+    ----------
+    stock_price: pd.DataFrame
+        The raw stock price data indexed by date, as returned by a provider.
+
+    Returns
+    -------
+    pd.DataFrame
+        A frame with a float 'close' column indexed by timezone-naive midnight dates named 'date',
+        in date order with one bar per date and without the bars with a missing or non-positive close.
+
+    Notes
+    -----
+    1. Rationale
+        Providers differ in the time and timezone of their daily bars, their column names and
+        dtypes. Normalizing them means the bars answered by any provider clean into the same date
+        strings and values, so the stored documents do not depend on which provider answered.
+    """
+    columns: dict[str, str] = {str(column): str(column).lower() for column in stock_price.columns}
+    frame: pd.DataFrame = stock_price.rename(columns=columns)
+    if "close" not in frame.columns and "adj_close" in frame.columns:
+        frame = frame.rename(columns={"adj_close": "close"})
+    dates: pd.DatetimeIndex = pd.DatetimeIndex(pd.to_datetime(frame.index))
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    close: pd.Series = pd.to_numeric(frame["close"], errors="coerce").astype("float64")
+    normalized: pd.DataFrame = pd.DataFrame({"close": close.to_numpy()},
+                                            index=pd.Index(dates.normalize(), name="date"))
+    normalized = normalized[normalized["close"] > 0]
+    return normalized[~normalized.index.duplicated(keep="last")].sort_index()
+
+
+class LatencyHistogram:
+    """
+    A thread-safe histogram of request latencies with fixed logarithmic buckets.
+
+    Attributes
+    ----------
+    counts: list[int]
+        The number of latencies in each bucket of LATENCY_BUCKETS, the last one counting the
+        latencies above the largest bound.
+    """
+
+    def __init__(self):
+        self.counts: list[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """
+        Add a latency in seconds.
+        """
+        with self._lock:
+            self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    @property
+    def count(self) -> int:
+        """
+        Get the number of latencies recorded.
+        """
+        return sum(self.counts)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Get the upper bound of the bucket holding the q-th percentile of the latencies, None if empty.
+        """
+        with self._lock:
+            counts: np.ndarray = np.cumsum(self.counts)
+        if not counts[-1]:
+            return None
+        bucket: int = int(np.searchsorted(counts, q / 100 * counts[-1]))
+        return LATENCY_BUCKETS[min(bucket, len(LATENCY_BUCKETS) - 1)]
+
+
+class HedgedFetcher:
+    """
+    Sends a provider request to a secondary provider when the primary is slower than usual.
+
+    Attributes
+    ----------
+    providers: list[str]
+        The providers which can answer the requests, in order of preference.
+    rate_limiter: ProviderRateLimiter
+        The rate limiter acquired before each request to a provider.
+    percentile: float
+        The percentile of the latencies of a provider after which the next provider is asked.
+    min_samples: int
+        The number of latencies of a provider needed before its percentile is used.
+    initial_delay: float
+        The delay in seconds after which the next provider is asked while a provider has fewer
+        than min_samples latencies.
+    histograms: dict[str, LatencyHistogram]
+        The latencies of the requests to each provider.
+
+    Notes
+    -----
+    1. Rationale
+        With a single provider, its slowest responses set the runtime of the whole universe.
+        Asking a second provider only when a response is later than the usual latency of the
+        first bounds the tail latency, while the extra requests stay around 100 - percentile
+        percent of the requests.
+
+    2. Implementation Details
+        - The primary provider is asked first. If it has not answered after its latency
+          percentile, or it fails or returns no bars, the next provider is asked, and so on. The
+          first valid answer, a frame with at least one bar, wins. The other requests complete in
+          the background and only their latencies are recorded.
+        - Every answer is normalized with normalize_stock_price before it is returned.
+        - The requests run on a dedicated thread pool, so the calling worker can wait on them
+          with a timeout. Each request acquires the rate limiter of its provider.
+        - The number of hedged requests and the number of requests won by a secondary provider
+          are counted in the instrumentation as hedged_requests and hedge_wins.
+    """
+
+    def __init__(self, providers: Optional[list[str]] = None, rate_limiter: Optional[ProviderRateLimiter] = None,
+                 percentile: float = HEDGE_PERCENTILE, min_samples: int = HEDGE_MIN_SAMPLES,
+                 initial_delay: float = HEDGE_INITIAL_DELAY, max_workers: int = HEDGE_MAX_WORKERS):
+        """
+        Initialize the hedged fetcher, with the providers of HEDGE_PROVIDERS if not given.
+        """
+        self.providers = list(providers if providers is not None else HEDGE_PROVIDERS)
+        self.rate_limiter = rate_limiter or ProviderRateLimiter()
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.histograms: dict[str, LatencyHistogram] = {provider: LatencyHistogram() for provider in self.providers}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="hedge")
+
+    def threshold(self, provider: str) -> float:
+        """
+        Get the delay in seconds after which a request to the given provider is hedged.
+        """
+        histogram: LatencyHistogram = self.histograms.setdefault(provider, LatencyHistogram())
+        if histogram.count < self.min_samples:
+            return self.initial_delay
+        return histogram.percentile(self.percentile)
+
+    def _request(self, request: Callable[[str], pd.DataFrame], provider: str) -> pd.DataFrame:
+        self.rate_limiter.acquire(provider)
+        start: float = time.perf_counter()
+        try:
+            return request(provider)
+        finally:
+            self.histograms.setdefault(provider, LatencyHistogram()).record(time.perf_counter() - start)
+
+    def fetch(self, request: Callable[[str], pd.DataFrame], primary: Optional[str] = None,
+              symbol: Optional[str] = None) -> tuple[pd.DataFrame, str]:
+        """
+        Get the first valid answer to a request from the providers.
+
+        Parameters
+        ----------
+        request: Callable[[str], pd.DataFrame]
+            A function requesting the raw stock price data from the given provider.
+        primary: Optional[str]
+            The provider to ask first, the first of providers if not given.
+        symbol: Optional[str]
+            The ticker symbol of the request, for the instrumentation.
+
+        Returns
+        -------
+        tuple[pd.DataFrame, str]
+            The normalized stock price data, and the provider which answered.
+
+        Raises
+        ------
+        Exception
+            The error of the primary provider, if no provider returned a valid answer. A primary
+            answering without bars raises a ValueError.
+        """
+        order: list[str] = ([primary] if primary else []) + [provider for provider in self.providers
+                                                              if provider != primary]
+        futures: dict[Future, str] = {}
+        errors: dict[str, Exception] = {}
+        asked: int = 0
+
+        def ask_next() -> None:
+            nonlocal asked
+            if asked:
+                instrumentation.count("hedged_requests", ticker=symbol)
+            futures[self._executor.submit(self._request, request, order[asked])] = order[asked]
+            asked += 1
+
+        ask_next()
+        while futures:
+            # Once every provider is asked, wait for any of them without a deadline
+            timeout: Optional[float] = self.threshold(order[asked - 1]) if asked < len(order) else None
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                ask_next()
+                continue
+            for future in done:
+                provider: str = futures.pop(future)
+                try:
+                    stock_price: pd.DataFrame = normalize_stock_price(future.result())
+                except Exception as e:
+                    errors[provider] = e
+                    continue
+                if len(stock_price):
+                    if provider != order[0]:
+                        instrumentation.count("hedge_wins", ticker=symbol)
+                    return stock_price, provider
+                errors[provider] = ValueError(f"No stock price data from {provider}")
+            if not futures and asked < len(order):
+                ask_next()
+        # Every asked provider has answered, the primary included
+        raise errors[order[0]]
+
+    def stats(self) -> dict[str, dict]:
+        """
+        Get the number of requests and the p50, p90 and p99 latencies in seconds of each provider.
+        """
+        return {provider: {"requests": histogram.count, "p50": histogram.percentile(50),
+                           "p90": histogram.percentile(90), "p99": histogram.percentile(99)}
+                for provider, histogram in self.histograms.items()}
@@ -0,0 +1,277 @@
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import ContextManager, Optional
+
+from config.app_config import (INSTRUMENTATION_DIR, INSTRUMENTATION_ENABLED, INSTRUMENTATION_PROFILE,
+                               INSTRUMENTATION_TRACEMALLOC)
+
+# A reusable context manager doing nothing, returned by stage when instrumentation is disabled
+_NULL_STAGE: ContextManager = contextlib.nullcontext()
+
+
+class _Stage:
+    """
+    A context manager adding its wall time to a stage of an Instrumentation.
+    """
+    __slots__ = ("instrumentation", "stage", "ticker", "start")
+
+    def __init__(self, instrumentation: "Instrumentation", stage: str, ticker: Optional[str]):
+        self.instrumentation = instrumentation
+        self.stage = stage
+        self.ticker = ticker
+        self.start = 0.0
+
+    def __enter__(self) -> "_Stage":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.instrumentation.add_time(self.stage, time.perf_counter() - self.start, self.ticker)
+
+
+class Instrumentation:
+    """
+    Records per-stage wall times and counters of an ingestion run.
+
+    Attributes
+    ----------
+    enabled: bool
+        Whether measurements are recorded, every method returns immediately when disabled.
+    profile: bool
+        Whether the run is profiled with cProfile between start and export, in the calling thread and
+        in the threads started after start, e.g. the workers of the thread pools.
+    trace_memory: bool
+        Whether memory allocations are traced with tracemalloc between start and export.
+    """
+
+    def __init__(self, enabled: bool = INSTRUMENTATION_ENABLED, profile: bool = INSTRUMENTATION_PROFILE,
+                 trace_memory: bool = INSTRUMENTATION_TRACEMALLOC):
+        """
+        Initialize the instrumentation.
+
+        Parameters
+        ----------
+        enabled: bool
+            Whether measurements are recorded.
+        profile: bool
+            Whether the run is profiled with cProfile.
+        trace_memory: bool
+            Whether memory allocations are traced with tracemalloc.
+
+        Notes
+        -----
+        1. Rationale
+            When a run is slow, the time has to be attributed to the provider, the cleaning,
+            the model construction or the firestore round-trips before it can be reduced.
+            The pipeline reports every stage and counter here, per ticker.
+
+        2. Implementation Details
+            - Wall times are kept per (stage, ticker) as total seconds and number of calls.
+            - Counters, e.g. rows, provider calls, firestore reads and writes, are kept per
+              (counter, ticker).
+            - A lock guards the measurements, as the pipeline records them from worker threads.
+            - When disabled, stage returns a shared no-op context manager and count returns
+              immediately, so the instrumentation points cost next to nothing.
+            - cProfile only profiles the thread which enables it, so when profiling, every new
+              thread enables its own profiler. On export, the hook is removed so that later threads
+              are not profiled, and the profilers are disabled before their statistics are merged.
+        """
+        self.enabled = enabled
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self._times: dict[tuple[str, Optional[str]], list[float]] = defaultdict(lambda: [0.0, 0])
+        self._counters: dict[tuple[str, Optional[str]], float] = defaultdict(float)
+        self._lock = threading.Lock()
+        self._profiler: Optional[cProfile.Profile] = None
+        self._thread_profilers: list[cProfile.Profile] = []
+        self._start: Optional[float] = None
+
+    def stage(self, stage: str, ticker: Optional[str] = None) -> ContextManager:
+        """
+        Measure the wall time of a block as part of the given stage.
+
+        Parameters
+        ----------
+        stage: str
+            The name of the stage, e.g. 'provider', 'clean', 'model' or 'store'.
+        ticker: Optional[str]
+            The ticker the block works on, if any.
+
+        Returns
+        -------
+        ContextManager
+            A context manager measuring the block it wraps.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, stage, ticker)
+
+    def add_time(self, stage: str, seconds: float, ticker: Optional[str] = None) -> None:
+        """
+        Add a measured wall time to the given stage.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            measurement: list[float] = self._times[(stage, ticker)]
+            measurement[0] += seconds
+            measurement[1] += 1
+
+    def count(self, counter: str, value: float = 1, ticker: Optional[str] = None) -> None:
+        """
+        Add a value to the given counter.
+
+        Parameters
+        ----------
+        counter: str
+            The name of the counter, e.g. 'rows', 'provider_calls', 'firestore_reads' or 'firestore_writes'.
+        value: float
+            The value to add.
+        ticker: Optional[str]
+            The ticker the value belongs to, if any.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[(counter, ticker)] += value
+
+    def start(self) -> None:
+        """
+        Start the run, and the profiler and memory tracing if they are enabled.
+        """
+        if not self.enabled:
+            return
+        self._start = time.perf_counter()
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            # Threads started from now on call _profile_thread once, which replaces it with their own profiler
+            threading.setprofile(self._profile_thread)
+            self._profiler.enable()
+        if self.trace_memory:
+            tracemalloc.start()
+
+    def _profile_thread(self, *args) -> None:
+        # Enable a profiler in the calling thread, which replaces this hook as the profile function of the thread
+        profiler: cProfile.Profile = cProfile.Profile()
+        with self._lock:
+            self._thread_profilers.append(profiler)
+        profiler.enable()
+
+    def summary(self) -> dict:
+        """
+        Summarize the measurements of the run.
+
+        Returns
+        -------
+        dict
+            The run wall time, the totals per stage and counter, and the measurements per ticker.
+        """
+        with self._lock:
+            times: dict = dict(self._times)
+            counters: dict = dict(self._counters)
+        stages: dict[str, dict] = defaultdict(lambda: {"seconds": 0.0, "calls": 0})
+        tickers: dict[str, dict] = defaultdict(lambda: {"stages": {}, "counters": {}})
+        for (stage, ticker), (seconds, calls) in times.items():
+            stages[stage]["seconds"] += seconds
+            stages[stage]["calls"] += calls
+            if ticker is not None:
+                tickers[ticker]["stages"][stage] = {"seconds": seconds, "calls": calls}
+        totals: dict[str, float] = defaultdict(float)
+        for (counter, ticker), value in counters.items():
+            totals[counter] += value
+            if ticker is not None:
+                tickers[ticker]["counters"][counter] = value
+        summary: dict = {
+            "wall_seconds": time.perf_counter() - self._start if self._start is not None else None,
+            "stages": dict(stages),
+            "counters": dict(totals),
+            "tickers": dict(tickers),
+        }
+        if self.trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            summary["memory"] = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top_allocations": [str(statistic) for statistic in
+                                    tracemalloc.take_snapshot().statistics("lineno")[:10]],
+            }
+        return summary
+
+    def prometheus(self, summary: Optional[dict] = None) -> str:
+        """
+        Format the totals of the run in the Prometheus text exposition format.
+
+        Parameters
+        ----------
+        summary: Optional[dict]
+            The summary to format, the current summary if not given.
+
+        Returns
+        -------
+        str
+            The stage wall times, stage calls and counters as Prometheus metrics.
+        """
+        summary = summary or self.summary()
+        lines: list[str] = [
+            "# HELP ingestion_stage_seconds_total Wall time spent in each ingestion stage.",
+            "# TYPE ingestion_stage_seconds_total counter",
+            *(f'ingestion_stage_seconds_total{{stage="{stage}"}} {values["seconds"]}'
+              for stage, values in sorted(summary["stages"].items())),
+            "# HELP ingestion_stage_calls_total Number of times each ingestion stage ran.",
+            "# TYPE ingestion_stage_calls_total counter",
+            *(f'ingestion_stage_calls_total{{stage="{stage}"}} {values["calls"]}'
+              for stage, values in sorted(summary["stages"].items())),
+        ]
+        for counter, value in sorted(summary["counters"].items()):
+            lines += [f"# TYPE ingestion_{counter}_total counter", f"ingestion_{counter}_total {value}"]
+        if summary["wall_seconds"] is not None:
+            lines += ["# TYPE ingestion_run_seconds gauge", f"ingestion_run_seconds {summary['wall_seconds']}"]
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory: str = INSTRUMENTATION_DIR) -> None:
+        """
+        Stop the run and write its summary as JSON and Prometheus text files in the given directory.
+
+        Parameters
+        ----------
+        directory: str
+            The directory to write 'ingestion.json', 'ingestion.prom' and, when profiling,
+            'ingestion.pstats' to, the statistics of all the profiled threads merged.
+        """
+        if not self.enabled:
+            return
+        os.makedirs(directory, exist_ok=True)
+        if self._profiler is not None:
+            # The threads started from now on are not profiled
+            threading.setprofile(None)
+            with self._lock:
+                thread_profilers: list[cProfile.Profile] = self._thread_profilers
+                self._thread_profilers = []
+            # Disabling a profiler records its unfinished calls, and clears the profile function of the calling
+            # thread, so the profiler of this thread is disabled last
+            for profiler in thread_profilers:
+                profiler.disable()
+            self._profiler.disable()
+            statistics: pstats.Stats = pstats.Stats(self._profiler)
+            for profiler in thread_profilers:
+                statistics.add(profiler)
+            statistics.dump_stats(os.path.join(directory, "ingestion.pstats"))
+            self._profiler = None
+        summary: dict = self.summary()
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        with open(os.path.join(directory, "ingestion.json"), "w") as summary_file:
+            json.dump(summary, summary_file, indent=2)
+        with open(os.path.join(directory, "ingestion.prom"), "w") as prometheus_file:
+            prometheus_file.write(self.prometheus(summary))
+
+
+# The instrumentation shared by the modules of the ingestion run
+instrumentation: Instrumentation = Instrumentation()
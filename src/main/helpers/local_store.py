@@ -0,0 +1,238 @@
+import contextlib
+import json
+import os
+import threading
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from config.app_config import LOCAL_STORE_DIR
+from src.main.data_models.stock_price_data import STOCK_PRICE_FIELDS, ColumnarStockData, StockData
+
+# The fields kept as date x ticker panels, every StockPriceData field but the date
+PANEL_FIELDS: list[str] = STOCK_PRICE_FIELDS[1:]
+# The initial number of dates and tickers the panel files have room for, doubled when exceeded
+INITIAL_DATE_CAPACITY: int = 4096
+INITIAL_TICKER_CAPACITY: int = 1024
+
+
+class LocalPanelStore:
+    """
+    A local store of the stock price data as one memory-mapped date x ticker matrix per field.
+
+    Attributes
+    ----------
+    directory: str
+        The directory of the panel files.
+    dates: list[str]
+        The stored dates in ascending order, the rows of the panels.
+    tickers: list[str]
+        The stored tickers in the order they were added, the columns of the panels.
+
+    Notes
+    -----
+    1. Rationale
+        Reading the history of the universe back from firestore takes one document read per
+        ticker and date. Keeping the same data locally as raw float64 matrices lets analytics
+        code map a whole field of the universe in a few milliseconds, without copying it.
+
+    2. Implementation Details
+        - Each field is a raw float64 file `<field>.<generation>.f64` holding one contiguous row of
+          dates per ticker, with room for more dates and tickers than are stored, filled with NaN.
+          It is mapped transposed as the date x ticker panel, so writing the bars of a ticker touches
+          contiguous pages and each column of the panel is contiguous. The number of stored dates
+          and tickers, their labels and the generation of the files are kept in `meta.json`.
+        - Daily updates only append rows and fill cells, so the existing data is never moved.
+          When a file is full, its capacity is doubled, and if a date earlier than the last stored
+          date is added, e.g. when a ticker's history is backfilled, the rows are rewritten in
+          date order. The rewritten files are a new generation, written next to the current one,
+          so a reader never maps them with the shape or the labels of the previous generation.
+        - The data is flushed before `meta.json` is atomically replaced, so a reader never maps
+          rows or columns which are not written yet. The files of the previous generation are
+          removed after the replacement: a reader which mapped them keeps its mapping, and a
+          reader which had not opened them yet reads `meta.json` again.
+        - Writes are serialized by a lock. The store supports a single writing process and any
+          number of readers.
+    """
+
+    def __init__(self, directory: str = LOCAL_STORE_DIR):
+        """
+        Open the store in the given directory, creating it if it does not exist.
+        """
+        self.directory = directory
+        self._lock = threading.Lock()
+        meta: dict = self._read_meta()
+        self.dates: list[str] = meta.get("dates", [])
+        self.tickers: list[str] = meta.get("tickers", [])
+        self._date_capacity: int = meta.get("date_capacity", 0)
+        self._ticker_capacity: int = meta.get("ticker_capacity", 0)
+        self._generation: int = meta.get("generation", 0)
+        self._rows: dict[str, int] = {date: row for row, date in enumerate(self.dates)}
+        self._columns: dict[str, int] = {ticker: column for column, ticker in enumerate(self.tickers)}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _field_path(self, field: str, generation: int) -> str:
+        return self._path(f"{field}.{generation}.f64")
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(self._path("meta.json")) as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self) -> None:
+        meta: dict = {"dates": self.dates, "tickers": self.tickers, "date_capacity": self._date_capacity,
+                      "ticker_capacity": self._ticker_capacity, "generation": self._generation}
+        with open(self._path("meta.json.tmp"), "w") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(self._path("meta.json.tmp"), self._path("meta.json"))
+
+    def _map(self, field: str, mode: str = "r+") -> np.memmap:
+        return np.memmap(self._field_path(field, self._generation), dtype=np.float64, mode=mode,
+                         shape=(self._ticker_capacity, self._date_capacity))
+
+    def _resize(self, n_dates: int, n_tickers: int, stored_shape: tuple[int, int],
+                order: Optional[np.ndarray] = None) -> None:
+        # Write the next generation of the files with room for n_dates and n_tickers, moving the stored rows to the
+        # positions in order. Readers only map it once meta.json points to it.
+        date_capacity: int = max(self._date_capacity, INITIAL_DATE_CAPACITY)
+        while date_capacity < n_dates:
+            date_capacity *= 2
+        ticker_capacity: int = max(self._ticker_capacity, INITIAL_TICKER_CAPACITY)
+        while ticker_capacity < n_tickers:
+            ticker_capacity *= 2
+        if (date_capacity, ticker_capacity) == (self._date_capacity, self._ticker_capacity) and order is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for field in PANEL_FIELDS:
+            resized: np.memmap = np.memmap(self._field_path(field, self._generation + 1), dtype=np.float64,
+                                           mode="w+", shape=(ticker_capacity, date_capacity))
+            resized[:] = np.nan
+            if stored_shape[0]:
+                stored: np.memmap = self._map(field, mode="r")
+                rows: Union[slice, np.ndarray] = slice(0, stored_shape[0]) if order is None else order
+                resized[:stored_shape[1], rows] = stored[:stored_shape[1], :stored_shape[0]]
+                del stored
+            resized.flush()
+            del resized
+        self._date_capacity, self._ticker_capacity = date_capacity, ticker_capacity
+        self._generation += 1
+
+    def write(self, stock_data: Union[StockData, ColumnarStockData]) -> int:
+        """
+        Write the stock price data of a ticker, adding its new dates as rows and the ticker as a column.
+
+        Parameters
+        ----------
+        stock_data: Union[StockData, ColumnarStockData]
+            The stock data of the ticker.
+
+        Returns
+        -------
+        int
+            The number of bars written.
+        """
+        if isinstance(stock_data, ColumnarStockData):
+            frame: pd.DataFrame = stock_data.frame
+        else:
+            frame = pd.DataFrame(list(stock_data.to_dict()["stock_price_data"]), columns=STOCK_PRICE_FIELDS)
+        if frame.empty:
+            return 0
+        frame = frame.drop_duplicates("date", keep="last")
+        dates: list[str] = frame["date"].astype(str).tolist()
+
+        with self._lock:
+            stored_shape: tuple[int, int] = (len(self.dates), len(self.tickers))
+            generation: int = self._generation
+            new_dates: list[str] = sorted(set(dates) - self._rows.keys())
+            order: Optional[np.ndarray] = None
+            if new_dates and self.dates and new_dates[0] < self.dates[-1]:
+                # A date falls between the stored ones, the stored rows move to their position among all the dates
+                all_dates: list[str] = sorted(self.dates + new_dates)
+                positions: dict[str, int] = {date: row for row, date in enumerate(all_dates)}
+                order = np.array([positions[date] for date in self.dates])
+                self.dates = all_dates
+            else:
+                self.dates = self.dates + new_dates
+            if stock_data.ticker not in self._columns:
+                self._columns[stock_data.ticker] = len(self.tickers)
+                self.tickers = self.tickers + [stock_data.ticker]
+            self._resize(len(self.dates), len(self.tickers), stored_shape, order)
+            # _resize moved the stored rows, the labels are updated only once the files match them
+            self._rows = {date: row for row, date in enumerate(self.dates)}
+
+            date_positions: np.ndarray = np.array([self._rows[date] for date in dates])
+            ticker_position: int = self._columns[stock_data.ticker]
+            for field in PANEL_FIELDS:
+                panel: np.memmap = self._map(field)
+                panel[ticker_position, date_positions] = frame[field].to_numpy(dtype=float)
+                panel.flush()
+                del panel
+            if (len(self.dates), len(self.tickers)) != stored_shape or self._generation != generation:
+                self._write_meta()
+            if self._generation != generation:
+                # meta.json points to the new generation, the previous one is no longer mapped by new readers
+                for field in PANEL_FIELDS:
+                    with contextlib.suppress(OSError):
+                        os.remove(self._field_path(field, generation))
+        return len(frame)
+
+    def panel(self, field: str, tickers: Optional[list[str]] = None) -> pd.DataFrame:
+        """
+        Map the stored values of a field as a read-only date x ticker DataFrame, without copying them.
+
+        Parameters
+        ----------
+        field: str
+            One of PANEL_FIELDS.
+        tickers: Optional[list[str]]
+            The tickers to select, all of them if not given. Selecting tickers copies their columns.
+
+        Returns
+        -------
+        pd.DataFrame
+            The values with one row per stored date and one column per ticker, NaN where a ticker
+            has no bar.
+        """
+        return self.panels([field], tickers)[field]
+
+    def panels(self, fields: Optional[list[str]] = None,
+               tickers: Optional[list[str]] = None) -> dict[str, pd.DataFrame]:
+        """
+        Map several fields with panel, all the PANEL_FIELDS if not given, keyed by field.
+
+        The fields are mapped from the same generation of the files, so they share their dates and tickers.
+        """
+        fields = fields or PANEL_FIELDS
+        for field in fields:
+            if field not in PANEL_FIELDS:
+                raise ValueError(f"Unknown field {field}, expected one of {PANEL_FIELDS}")
+        while True:
+            meta: dict = self._read_meta()
+            dates: list[str] = meta.get("dates", [])
+            stored_tickers: list[str] = meta.get("tickers", [])
+            if not dates:
+                return {field: pd.DataFrame(index=pd.Index([], name="date"), columns=tickers or [], dtype=float)
+                        for field in fields}
+            try:
+                values: dict[str, np.memmap] = {
+                    field: np.memmap(self._field_path(field, meta.get("generation", 0)), dtype=np.float64,
+                                     mode="r", shape=(meta["ticker_capacity"], meta["date_capacity"]))
+                    for field in fields
+                }
+            except FileNotFoundError:
+                if self._read_meta().get("generation") == meta.get("generation"):
+                    raise
+                # The writer removed the generation read from meta.json in between, map the new one
+                continue
+            frames: dict[str, pd.DataFrame] = {
+                field: pd.DataFrame(field_values[:len(stored_tickers), :len(dates)].T,
+                                    index=pd.Index(dates, name="date"), columns=stored_tickers, copy=False)
+                for field, field_values in values.items()
+            }
+            return frames if tickers is None else {field: frame.reindex(columns=tickers)
+                                                   for field, frame in frames.items()}
@@ -0,0 +1,366 @@
+import json
+import sys
+import threading
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Hashable, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from config.app_config import FIRESTORE_LAYOUT, QUERY_CACHE_MAX_MB, QUERY_SERVICE_URL
+from src.main.helpers.firestore_init import FirestoreDB
+from src.main.helpers.local_store import PANEL_FIELDS, LocalPanelStore
+
+# A function loading the stored values of a field of many tickers as a date x ticker panel
+PanelLoader = Callable[[list[str], str], pd.DataFrame]
+# A series cached per ticker and field: its dates and values, without the dates it has no bar on
+Series = tuple[np.ndarray, np.ndarray]
+
+
+class LRUCache:
+    """
+    A thread-safe least recently used cache holding entries up to a total size in bytes.
+
+    Attributes
+    ----------
+    max_bytes: int
+        The maximum total size of the entries, least recently used entries are evicted above it.
+    size: int
+        The total size of the entries.
+    hits: int
+        The number of lookups of a cached entry.
+    misses: int
+        The number of lookups of an entry which was not cached.
+    evictions: int
+        The number of entries evicted to stay within max_bytes.
+
+    Notes
+    -----
+    1. Implementation Details
+        - The entries are kept in an OrderedDict in order of use, so a lookup and an eviction
+          take constant time.
+        - Each entry is tagged with the tickers it was built from, so the entries of a ticker
+          are invalidated when new bars of the ticker are stored.
+        - The version is incremented by every invalidation. An entry built from data loaded
+          before an invalidation is not added, since it may hold the replaced bars.
+    """
+
+    def __init__(self, max_bytes: int = QUERY_CACHE_MAX_MB * 2 ** 20):
+        """
+        Initialize an empty cache holding up to max_bytes.
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.version = 0
+        self._entries: OrderedDict[Hashable, tuple[object, int, frozenset[str]]] = OrderedDict()
+        self._keys: dict[str, set[Hashable]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[object]:
+        """
+        Get the cached value of the key, marking it as the most recently used, or None if it is not cached.
+        """
+        with self._lock:
+            entry: Optional[tuple[object, int, frozenset[str]]] = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: object, size: int, tickers: Iterable[str], version: int) -> None:
+        """
+        Add a value of the given size in bytes, built from the data of the tickers loaded at the given version.
+
+        The value is not added if the cache was invalidated since that version, or if it is larger than max_bytes.
+        """
+        with self._lock:
+            if version != self.version or size > self.max_bytes:
+                return
+            self._remove(key)
+            self._entries[key] = (value, size, frozenset(tickers))
+            self.size += size
+            for ticker in self._entries[key][2]:
+                self._keys.setdefault(ticker, set()).add(key)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        entry: Optional[tuple[object, int, frozenset[str]]] = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry[1]
+        for ticker in entry[2]:
+            keys: set[Hashable] = self._keys[ticker]
+            keys.discard(key)
+            if not keys:
+                del self._keys[ticker]
+
+    def invalidate(self, tickers: Optional[Iterable[str]] = None) -> int:
+        """
+        Remove the entries built from any of the tickers, all the entries if not given, and return their number.
+        """
+        with self._lock:
+            self.version += 1
+            keys: set[Hashable] = (set(self._entries) if tickers is None
+                                   else set().union(*(self._keys.get(ticker, ()) for ticker in tickers)))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def stats(self) -> dict:
+        """
+        Get the number of entries, their size and the hit, miss and eviction counts.
+        """
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+def firestore_loader(firestore_db: FirestoreDB, layout: str = FIRESTORE_LAYOUT) -> PanelLoader:
+    """
+    Get a PanelLoader reading the stored stock price data from firestore with read_panel.
+    """
+    from src.main.helpers.firestore_bulk import read_panel
+
+    return lambda tickers, field: read_panel(tickers, firestore_db, fields=[field], layout=layout)[field]
+
+
+def local_store_loader(local_store: LocalPanelStore) -> PanelLoader:
+    """
+    Get a PanelLoader mapping the stored stock price data from a LocalPanelStore.
+    """
+    return lambda tickers, field: local_store.panel(field, tickers)
+
+
+class QueryService:
+    """
+    Serve the stored stock price series of tickers and panels of many tickers from an LRU cache.
+
+    Attributes
+    ----------
+    loader: PanelLoader
+        The function loading the series missing from the cache, in bulk.
+    cache: LRUCache
+        The cache of the series and of the encoded responses.
+
+    Notes
+    -----
+    1. Rationale
+        Reading a series from firestore takes a round-trip per page of documents, far too slow to
+        answer a user interface. The series are loaded once, in bulk for all the tickers of a
+        request, and the repeated queries are answered from memory.
+
+    2. Implementation Details
+        - The cache holds the series of each ticker and field, as datetime64[D] dates and float64
+          values, and the encoded response of each query, in a single memory budget.
+        - The date range of a query is selected with a binary search of the series dates.
+        - The responses are columnar JSON: the dates once, and the values of each ticker as one
+          array aligned with them, null where a ticker of a panel has no bar.
+        - The entries of a ticker are invalidated when new bars of the ticker are stored, see
+          notify_stored in firestore_update.
+    """
+
+    def __init__(self, loader: PanelLoader, max_bytes: int = QUERY_CACHE_MAX_MB * 2 ** 20):
+        """
+        Initialize the service with an empty cache holding up to max_bytes.
+        """
+        self.loader = loader
+        self.cache = LRUCache(max_bytes)
+
+    def series(self, tickers: list[str], field: str) -> dict[str, Series]:
+        """
+        Get the series of a field of the tickers, loading the ones missing from the cache with a single loader call.
+
+        Raises
+        ------
+        ValueError
+            If the field is not one of PANEL_FIELDS.
+        """
+        if field not in PANEL_FIELDS:
+            raise ValueError(f"Unknown field {field}, expected one of {PANEL_FIELDS}")
+        found: dict[str, Series] = {}
+        for ticker in tickers:
+            series: Optional[Series] = self.cache.get(("series", ticker, field))
+            if series is not None:
+                found[ticker] = series
+        missing: list[str] = list(dict.fromkeys(ticker for ticker in tickers if ticker not in found))
+        if missing:
+            version: int = self.cache.version
+            panel: pd.DataFrame = self.loader(missing, field)
+            # The loaders index the panels by 'YYYY-MM-DD' strings, which NumPy parses faster than pandas
+            dates: np.ndarray = panel.index.to_numpy().astype("datetime64[D]")
+            values: np.ndarray = panel.reindex(columns=missing).to_numpy(dtype=float)
+            for position, ticker in enumerate(missing):
+                has_bar: np.ndarray = ~np.isnan(values[:, position])
+                series = (dates[has_bar], values[has_bar, position])
+                self.cache.put(("series", ticker, field), series, series[0].nbytes + series[1].nbytes,
+                               [ticker], version)
+                found[ticker] = series
+        return found
+
+    def _response(self, key: Hashable, tickers: list[str], build: Callable[[], dict]) -> bytes:
+        # The encoded response of the query, built and cached on a miss
+        body: Optional[bytes] = self.cache.get(key)
+        if body is None:
+            version: int = self.cache.version
+            body = json.dumps(build(), separators=(",", ":")).encode()
+            self.cache.put(key, body, len(body), tickers, version)
+        return body
+
+    def series_response(self, ticker: str, field: str = "closing_price", start_date: Optional[str] = None,
+                        end_date: Optional[str] = None) -> bytes:
+        """
+        Get the series of a field of a ticker between two 'YYYY-MM-DD' dates, both included, as columnar JSON.
+
+        The response is {"ticker": ..., "field": ..., "dates": [...], "values": [...]}.
+        """
+        def build() -> dict:
+            dates, values = select_dates(self.series([ticker], field)[ticker], start_date, end_date)
+            return {"ticker": ticker, "field": field, "dates": np.datetime_as_string(dates).tolist(),
+                    "values": values.tolist()}
+
+        return self._response(("series_response", ticker, field, start_date, end_date), [ticker], build)
+
+    def panel_response(self, tickers: list[str], field: str = "closing_price", start_date: Optional[str] = None,
+                       end_date: Optional[str] = None) -> bytes:
+        """
+        Get the series of a field of many tickers between two 'YYYY-MM-DD' dates, both included, as columnar JSON.
+
+        The response is {"field": ..., "tickers": [...], "dates": [...], "values": [[...], ...]}, with the values
+        of each ticker on the union of the dates, null where the ticker has no bar.
+        """
+        def build() -> dict:
+            found: dict[str, Series] = self.series(tickers, field)
+            selected: list[Series] = [select_dates(found[ticker], start_date, end_date) for ticker in tickers]
+            dates: np.ndarray = np.unique(np.concatenate([series_dates for series_dates, _ in selected]
+                                                         or [np.array([], dtype="datetime64[D]")]))
+            columns: list[list] = []
+            for series_dates, values in selected:
+                column: np.ndarray = np.full(len(dates), None, dtype=object)
+                column[np.searchsorted(dates, series_dates)] = values
+                columns.append(column.tolist())
+            return {"field": field, "tickers": tickers, "dates": np.datetime_as_string(dates).tolist(),
+                    "values": columns}
+
+        return self._response(("panel_response", tuple(tickers), field, start_date, end_date), tickers, build)
+
+    def invalidate(self, tickers: Optional[Iterable[str]] = None) -> int:
+        """
+        Remove the cached series and responses of the tickers, all of them if not given.
+        """
+        return self.cache.invalidate(tickers)
+
+
+def select_dates(series: Series, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Series:
+    """
+    Select the bars of a series between two 'YYYY-MM-DD' dates, both included, with a binary search.
+
+    Raises
+    ------
+    ValueError
+        If a date is not a valid 'YYYY-MM-DD' date.
+    """
+    dates, values = series
+    first: int = 0 if start_date is None else int(np.searchsorted(dates, np.datetime64(start_date, "D"), "left"))
+    last: int = len(dates) if end_date is None else int(np.searchsorted(dates, np.datetime64(end_date, "D"),
+                                                                        "right"))
+    return dates[first:last], values[first:last]
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answer the HTTP requests of a QueryServer.
+
+    The routes are:
+
+    - GET /series/<ticker>?field=closing_price&start=YYYY-MM-DD&end=YYYY-MM-DD
+    - GET /panel?tickers=AAPL,MSFT&field=closing_price&start=YYYY-MM-DD&end=YYYY-MM-DD
+    - GET /stats, the counts of the cache
+    - POST /invalidate?tickers=AAPL,MSFT, all the tickers if not given
+    """
+    # Keep the connections open, so that a client does not pay a TCP handshake per query, and send the headers and
+    # the body without waiting for the client to acknowledge the headers
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "QueryServer"
+
+    def _send(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send(status, json.dumps({"error": message}).encode())
+
+    def _route(self) -> tuple[str, dict[str, str]]:
+        url: urllib.parse.SplitResult = urllib.parse.urlsplit(self.path)
+        return url.path, {name: values[-1] for name, values in urllib.parse.parse_qs(url.query).items()}
+
+    def do_GET(self) -> None:
+        path, query = self._route()
+        service: QueryService = self.server.service
+        field: str = query.get("field", "closing_price")
+        try:
+            if path.startswith("/series/") and len(path) > len("/series/"):
+                self._send(200, service.series_response(urllib.parse.unquote(path[len("/series/"):]), field,
+                                                        query.get("start"), query.get("end")))
+            elif path == "/panel" and query.get("tickers"):
+                self._send(200, service.panel_response(query["tickers"].split(","), field, query.get("start"),
+                                                       query.get("end")))
+            elif path == "/stats":
+                self._send(200, json.dumps(service.cache.stats()).encode())
+            else:
+                self._send_error(404, f"Unknown route {path}")
+        except ValueError as e:
+            self._send_error(400, str(e))
+
+    def do_POST(self) -> None:
+        path, query = self._route()
+        if path != "/invalidate":
+            self._send_error(404, f"Unknown route {path}")
+            return
+        tickers: Optional[list[str]] = query["tickers"].split(",") if query.get("tickers") else None
+        self._send(200, json.dumps({"invalidated": self.server.service.invalidate(tickers)}).encode())
+
+    def log_message(self, format: str, *args) -> None:
+        # The requests are not logged, a user interface sends many of them
+        pass
+
+
+class QueryServer(ThreadingHTTPServer):
+    """
+    A local HTTP server answering each connection of a QueryService on its own thread.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], service: QueryService):
+        super().__init__(address, QueryRequestHandler)
+        self.service = service
+
+
+def notify_query_service(tickers: Iterable[str], url: str = QUERY_SERVICE_URL) -> None:
+    """
+    Ask the query service at the given URL to invalidate the cached data of the tickers, if a URL is given.
+
+    A failure is printed to stderr and otherwise ignored, the service may not be running.
+    """
+    if not url:
+        return
+    query: str = urllib.parse.urlencode({"tickers": ",".join(tickers)})
+    try:
+        with urllib.request.urlopen(urllib.request.Request(f"{url.rstrip('/')}/invalidate?{query}", method="POST"),
+                                    timeout=1):
+            pass
+    except OSError as e:
+        print(f"Failed to notify the query service at {url}: {e}", file=sys.stderr)
@@ -0,0 +1,71 @@
+import threading
+
+from pyrate_limiter import Duration, Limiter, Rate
+
+from config.app_config import PROVIDER_RATE_LIMIT
+
+
+class ProviderRateLimiter:
+    """
+    A token bucket rate limiter keeping one bucket per data provider.
+
+    Attributes
+    ----------
+    requests_per_minute: int
+        The number of requests allowed per provider in a one minute window.
+    """
+
+    def __init__(self, requests_per_minute: int = PROVIDER_RATE_LIMIT):
+        """
+        Initialize the rate limiter.
+
+        Parameters
+        ----------
+        requests_per_minute: int
+            The number of requests allowed per provider in a one minute window.
+
+        Notes
+        -----
+        1. Rationale
+            Data providers throttle or reject clients that exceed their request quota. Keeping
+            a separate bucket per provider lets concurrent workers share the quota of the
+            provider they call without slowing down requests to other providers.
+
+        2. Implementation Details
+            - Limiters are created lazily, the first time a provider is acquired.
+            - A lock guards the limiter registry so that concurrent workers share a single
+              bucket per provider.
+        """
+        self.requests_per_minute = requests_per_minute
+        self._limiters: dict[str, Limiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, provider: str) -> Limiter:
+        """
+        Get the limiter for the given provider, creating it if it does not exist.
+
+        Parameters
+        ----------
+        provider: str
+            The data provider.
+
+        Returns
+        -------
+        Limiter
+            The pyrate_limiter limiter for the provider.
+        """
+        with self._lock:
+            if provider not in self._limiters:
+                self._limiters[provider] = Limiter(Rate(self.requests_per_minute, Duration.MINUTE))
+            return self._limiters[provider]
+
+    def acquire(self, provider: str) -> None:
+        """
+        Block until a request to the given provider is allowed.
+
+        Parameters
+        ----------
+        provider: str
+            The data provider.
+        """
+        self.limiter(provider).try_acquire(provider)
@@ -1,7 +1,10 @@
 import pandas as pd
+import polars as pl
 
+from config.app_config import DATAFRAME_ENGINE
 
-def read_ticker_symbols(file_path: str, ticker_column: str) -> list[str]:
+
+def read_ticker_symbols(file_path: str, ticker_column: str, engine: str = DATAFRAME_ENGINE) -> list[str]:
     """
     Read ticker symbols from a CSV file.
 
@@ -11,6 +14,8 @@ def read_ticker_symbols(file_path: str, ticker_column: str) -> list[str]:
         The path to the CSV file.
     ticker_column: str
         The header of the column containing the ticker symbols.
+    engine: str
+        The dataframe library used to read the CSV file, 'polars' or 'pandas'.
 
     Returns
     -------
@@ -27,10 +32,16 @@ def read_ticker_symbols(file_path: str, ticker_column: str) -> list[str]:
 
     2. Implementation Details
         - The CSV file is read into a LazyFrame using pl.scan_csv().
+        - Only the ticker column is selected, so the other columns are not parsed.
         - The LazyFrame is materialized into a DataFrame using df.collect().
         - Ticker symbols are extracted from the specified column and returned as a list.
+        - With the pandas engine, the CSV file is read with pd.read_csv() instead.
 
     """
+    if engine == "polars":
+        # Scan the CSV file and read only the ticker column
+        return pl.scan_csv(str(file_path)).select(ticker_column).collect()[ticker_column].to_list()
+
     # Read the CSV file
     df: pd.DataFrame = pd.read_csv(str(file_path))
 
@@ -0,0 +1,244 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+import pandas as pd
+import polars as pl
+
+from config.app_config import RESPONSE_CACHE_DIR, RESPONSE_CACHE_MAX_MB, RESPONSE_CACHE_TTL
+
+
+def to_polars(stock_price: pd.DataFrame) -> pl.DataFrame:
+    """
+    Convert raw stock price data to a polars DataFrame with the index as a date column.
+
+    Parameters
+    ----------
+    stock_price: pd.DataFrame
+        The raw stock price data indexed by date, as returned by the provider.
+
+    Returns
+    -------
+    pl.DataFrame
+        The stock price data with a 'date' datetime column followed by the other columns.
+    """
+    dates: pd.DatetimeIndex = pd.to_datetime(stock_price.index).as_unit("us")
+    columns: dict[str, pl.Series] = {
+        "date": pl.Series(dates.tz_convert("UTC").tz_localize(None).to_numpy() if dates.tz is not None
+                          else dates.to_numpy())
+    }
+    for column in stock_price.columns:
+        values: pd.Series = stock_price[column]
+        columns[str(column)] = pl.Series(
+            values.to_numpy() if pd.api.types.is_numeric_dtype(values) else values.astype(str).tolist()
+        )
+    return pl.DataFrame(columns)
+
+
+def to_pandas(frame: pl.DataFrame, time_zone: Optional[str]) -> pd.DataFrame:
+    """
+    Convert stock price data read from the cache back to a pandas DataFrame indexed by date.
+
+    Parameters
+    ----------
+    frame: pl.DataFrame
+        The stock price data with a 'date' column, as written by to_polars.
+    time_zone: Optional[str]
+        The timezone of the original dates, whose UTC times are stored in the cache.
+
+    Returns
+    -------
+    pd.DataFrame
+        The stock price data indexed by date.
+    """
+    dates: pd.DatetimeIndex = pd.DatetimeIndex(frame["date"].to_numpy(), name="date")
+    if time_zone is not None:
+        dates = dates.tz_localize("UTC").tz_convert(time_zone)
+    return pd.DataFrame({column: frame[column].to_numpy() for column in frame.columns if column != "date"},
+                        index=dates)
+
+
+class ProviderCache:
+    """
+    A persistent cache of the historical stock price data returned by the data providers.
+
+    Attributes
+    ----------
+    directory: str
+        The directory holding one Parquet file and one metadata file per cache entry.
+    max_bytes: int
+        The maximum total size of the Parquet files, least recently used entries are evicted above it.
+    ttl_seconds: float
+        How long data covering the current day is served before it is fetched again.
+    hits: int
+        The number of requests served entirely from the cache.
+    partial_hits: int
+        The number of requests served from the cache after fetching only the missing tail.
+    misses: int
+        The number of requests fetched entirely from the provider.
+    """
+
+    def __init__(self, directory: str = RESPONSE_CACHE_DIR, max_bytes: int = RESPONSE_CACHE_MAX_MB * 2 ** 20,
+                 ttl_seconds: float = RESPONSE_CACHE_TTL):
+        """
+        Initialize the cache.
+
+        Parameters
+        ----------
+        directory: str
+            The directory holding the cache entries, created if it does not exist.
+        max_bytes: int
+            The maximum total size of the Parquet files.
+        ttl_seconds: float
+            How long data covering the current day is served before it is fetched again.
+
+        Notes
+        -----
+        1. Rationale
+            Development re-runs and retries after a failure fetch the same history again, paying the
+            provider latency and rate limit for data that has not changed. Past bars never change, so
+            they are kept on disk and only the bars after them are fetched.
+
+        2. Implementation Details
+            - A cache entry is keyed by (provider, symbol, interval) and covers a contiguous date range.
+            - The stock price data of an entry is stored as a Parquet file written with polars, and
+              its date range, timezone and fetch and access times in a JSON metadata file.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, provider: str, symbol: str, interval: str) -> str:
+        return os.path.join(self.directory, f"{provider}__{interval}__{symbol}")
+
+    def _read_metadata(self, path: str) -> Optional[dict]:
+        try:
+            with open(f"{path}.json") as metadata_file:
+                return json.load(metadata_file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_metadata(self, path: str, metadata: dict) -> None:
+        with open(f"{path}.json", "w") as metadata_file:
+            json.dump(metadata, metadata_file)
+
+    def historical(self, fetch: Callable[[str, str], pd.DataFrame], provider: str, symbol: str, interval: str,
+                   start_date: str, end_date: Optional[str] = None) -> pd.DataFrame:
+        """
+        Get the historical stock price data for a date range, fetching only what the cache does not hold.
+
+        Parameters
+        ----------
+        fetch: Callable[[str, str], pd.DataFrame]
+            A function fetching the raw stock price data from the provider for a start and end date.
+        provider: str
+            The data provider.
+        symbol: str
+            The stock ticker symbol.
+        interval: str
+            The interval for the stock data.
+        start_date: str
+            The start date in 'YYYY-MM-DD' format.
+        end_date: Optional[str]
+            The end date in 'YYYY-MM-DD' format, today if not given.
+
+        Returns
+        -------
+        pd.DataFrame
+            The raw stock price data between start_date and end_date.
+
+        Notes
+        -----
+        1. Implementation Details
+            - A hit is an entry covering the whole range. If the range reaches the current day, the
+              entry must also have been fetched less than ttl_seconds ago, as today's bar may change.
+            - A partial hit is an entry starting on or before start_date and ending within the range.
+              Only the bars from the last covered day are fetched, replacing the possibly incomplete
+              last bar, and merged into the entry.
+            - Otherwise, the whole range is fetched and replaces the entry.
+        """
+        today: str = pd.Timestamp.today().strftime("%Y-%m-%d")
+        end_date = end_date or today
+        path: str = self._path(provider, symbol, interval)
+        metadata: Optional[dict] = self._read_metadata(path)
+
+        cached: Optional[pd.DataFrame] = None
+        if metadata is not None and metadata["start_date"] <= start_date <= metadata["end_date"]:
+            try:
+                cached = to_pandas(pl.read_parquet(f"{path}.parquet"), metadata["time_zone"])
+            except OSError:
+                cached = None
+
+        # Data covering the current day is only fresh for ttl_seconds
+        fresh: bool = cached is not None and (end_date < today
+                                              or time.time() - metadata["fetched_at"] < self.ttl_seconds)
+        if cached is not None and metadata["end_date"] >= end_date and fresh:
+            self._count("hits")
+            stock_price: pd.DataFrame = cached
+            metadata["last_access"] = time.time()
+            self._write_metadata(path, metadata)
+        elif cached is not None:
+            self._count("partial_hits")
+            tail_start: str = min(metadata["end_date"], end_date)
+            tail: pd.DataFrame = fetch(tail_start, end_date)
+            cached_dates: pd.Index = pd.to_datetime(cached.index).strftime("%Y-%m-%d")
+            stock_price = pd.concat([cached.loc[(cached_dates < tail_start) | (cached_dates > end_date)],
+                                     to_pandas(to_polars(tail), metadata["time_zone"])]).sort_index()
+            self._store(path, stock_price, metadata["start_date"], max(end_date, metadata["end_date"]))
+        else:
+            self._count("misses")
+            stock_price = fetch(start_date, end_date)
+            self._store(path, stock_price, start_date, end_date)
+
+        dates: pd.Index = pd.to_datetime(stock_price.index).strftime("%Y-%m-%d")
+        return stock_price.loc[(dates >= start_date) & (dates <= end_date)]
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _store(self, path: str, stock_price: pd.DataFrame, start_date: str, end_date: str) -> None:
+        tz = pd.to_datetime(stock_price.index).tz
+        time_zone: Optional[str] = str(tz) if tz is not None else None
+        to_polars(stock_price).write_parquet(f"{path}.parquet")
+        now: float = time.time()
+        self._write_metadata(path, {"start_date": start_date, "end_date": end_date, "time_zone": time_zone,
+                                    "fetched_at": now, "last_access": now})
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache fits in max_bytes.
+        """
+        with self._lock:
+            entries: list[tuple[float, str, int]] = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".parquet"):
+                    continue
+                path: str = os.path.join(self.directory, name[:-len(".parquet")])
+                metadata: Optional[dict] = self._read_metadata(path)
+                entries.append((metadata["last_access"] if metadata else 0.0, path,
+                                os.path.getsize(f"{path}.parquet")))
+            total: int = sum(size for _, _, size in entries)
+            for _, path, size in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                for suffix in (".parquet", ".json"):
+                    try:
+                        os.remove(f"{path}{suffix}")
+                    except FileNotFoundError:
+                        pass
+                total -= size
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the hit, partial hit and miss counters of the cache.
+        """
+        return {"hits": self.hits, "partial_hits": self.partial_hits, "misses": self.misses}
@@ -0,0 +1,151 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Union
+
+from config.app_config import RUN_JOURNAL_PATH
+from src.main.data_models.stock_price_data import ColumnarStockData, StockData
+
+
+class RunJournal:
+    """
+    A durable journal of the progress of an ingestion run, kept in a local SQLite file.
+
+    Attributes
+    ----------
+    path: str
+        The path of the SQLite file.
+
+    Notes
+    -----
+    1. Rationale
+        The progress of a run lived only in memory, so a run dying at ticker 400 of 500 had to
+        start again from the first ticker. The journal records when each ticker is fetched,
+        with the date range of its bars, and stored, so a resumed run only processes the
+        tickers which did not finish.
+
+    2. Implementation Details
+        - The parameters of the run, e.g. the provider and the date range, are kept in the `run`
+          table, and a resumed run must use the same parameters.
+        - Each ticker has one row in the `tickers` table with its status, 'fetched', 'stored' or
+          'failed', the first and last date of its bars, its number of attempts and last error.
+        - Every update is committed immediately in WAL mode, so an interrupted run loses at most
+          the ticker in progress. A lock serializes the updates of the pipeline threads.
+    """
+
+    def __init__(self, path: str = RUN_JOURNAL_PATH):
+        """
+        Open the journal, creating the file and its tables if they do not exist.
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS run (key TEXT PRIMARY KEY, value TEXT)")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS tickers (ticker TEXT PRIMARY KEY, status TEXT NOT NULL, first_date TEXT, "
+            "last_date TEXT, bars INTEGER, attempts INTEGER NOT NULL DEFAULT 0, error TEXT, updated_at REAL)"
+        )
+
+    def _execute(self, statement: str, parameters: tuple = ()) -> list[tuple]:
+        with self._lock:
+            return self._connection.execute(statement, parameters).fetchall()
+
+    def start(self, parameters: dict) -> None:
+        """
+        Start a new run with the given parameters, discarding the progress of the previous run.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN")
+            self._connection.execute("DELETE FROM tickers")
+            self._connection.execute("DELETE FROM run")
+            self._connection.executemany("INSERT INTO run VALUES (?, ?)",
+                                         [(key, json.dumps(value)) for key, value in parameters.items()])
+            self._connection.execute("COMMIT")
+
+    def parameters(self) -> dict:
+        """
+        Get the parameters of the run recorded in the journal.
+        """
+        return {key: json.loads(value) for key, value in self._execute("SELECT key, value FROM run")}
+
+    def resume(self, parameters: dict) -> None:
+        """
+        Check that the journal records a run with the given parameters, so that its progress can be reused.
+
+        Raises
+        ------
+        ValueError
+            If the journal is empty or records a run with different parameters.
+        """
+        recorded: dict = self.parameters()
+        if not recorded:
+            raise ValueError(f"No run to resume in {self.path}")
+        if recorded != parameters:
+            raise ValueError(f"The run in {self.path} was started with {recorded}, not {parameters}, "
+                             "run without resuming to start a new run")
+
+    def record_fetched(self, stock_data: Union[StockData, ColumnarStockData]) -> None:
+        """
+        Record that the stock data of a ticker was fetched, with the date range of its bars.
+        """
+        if isinstance(stock_data, ColumnarStockData):
+            dates: list[str] = stock_data.frame["date"].tolist()
+        else:
+            dates = [stock_price.date for stock_price in stock_data.stock_price_data]
+        self._execute(
+            "INSERT INTO tickers (ticker, status, first_date, last_date, bars, updated_at) "
+            "VALUES (?, 'fetched', ?, ?, ?, ?) ON CONFLICT(ticker) DO UPDATE SET status = 'fetched', "
+            "first_date = excluded.first_date, last_date = excluded.last_date, bars = excluded.bars, "
+            "updated_at = excluded.updated_at",
+            (stock_data.ticker, min(dates, default=None), max(dates, default=None), len(dates), time.time()),
+        )
+
+    def record_stored(self, ticker: str) -> None:
+        """
+        Record that the stock data of a ticker was stored, which completes the ticker.
+        """
+        self._execute("UPDATE tickers SET status = 'stored', error = NULL, updated_at = ? WHERE ticker = ?",
+                      (time.time(), ticker))
+
+    def record_failed(self, ticker: str, error: Exception) -> None:
+        """
+        Record that fetching or storing a ticker failed, and count the attempt.
+        """
+        self._execute(
+            "INSERT INTO tickers (ticker, status, attempts, error, updated_at) VALUES (?, 'failed', 1, ?, ?) "
+            "ON CONFLICT(ticker) DO UPDATE SET status = 'failed', attempts = attempts + 1, error = excluded.error, "
+            "updated_at = excluded.updated_at",
+            (ticker, repr(error), time.time()),
+        )
+
+    def pending(self, symbols: Iterable[str]) -> list[str]:
+        """
+        Get the symbols which are not stored yet, in the given order.
+        """
+        stored: set[str] = {ticker for ticker, in self._execute("SELECT ticker FROM tickers WHERE status = 'stored'")}
+        return [symbol for symbol in symbols if symbol not in stored]
+
+    def summary(self) -> dict[str, int]:
+        """
+        Get the number of tickers of each status.
+        """
+        return dict(self._execute("SELECT status, COUNT(*) FROM tickers GROUP BY status"))
+
+    def close(self) -> None:
+        """
+        Close the connection to the journal.
+        """
+        with self._lock:
+            self._connection.close()
+
+
+def retry_delay(attempt: int, backoff: float) -> float:
+    """
+    Get the delay in seconds before the given retry, backoff * 2 ** (attempt - 1) for attempts starting at 1.
+    """
+    return backoff * 2 ** (attempt - 1)
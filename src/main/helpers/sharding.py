@@ -0,0 +1,160 @@
+import hashlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from typing import IO, Iterable, Optional
+
+from config.app_config import PROVIDER_RATE_LIMIT
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    """
+    Parse a shard given as 'i/N', the i-th of N shards counting from 0.
+
+    Raises
+    ------
+    ValueError
+        If the shard is not two integers 'i/N' with 0 <= i < N.
+    """
+    try:
+        index, count = (int(part) for part in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {shard!r}, expected i/N, e.g. 0/4") from None
+    if not 0 <= index < count:
+        raise ValueError(f"Invalid shard {shard!r}, expected 0 <= i < N")
+    return index, count
+
+
+def shard_index(ticker: str, count: int) -> int:
+    """
+    Get the shard of a ticker among count shards, from a hash of its symbol which is the same in every process.
+    """
+    digest: bytes = hashlib.blake2b(ticker.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+def shard_symbols(symbols: Iterable[str], index: int, count: int) -> list[str]:
+    """
+    Get the symbols assigned to the given shard, in the given order.
+
+    Parameters
+    ----------
+    symbols: Iterable[str]
+        The ticker symbols of the whole universe, e.g. from read_ticker_symbols.
+    index: int
+        The shard, from 0 to count - 1.
+    count: int
+        The number of shards.
+
+    Returns
+    -------
+    list[str]
+        The symbols whose shard_index is index.
+
+    Notes
+    -----
+    1. Rationale
+        The shard of a ticker only depends on its symbol and the number of shards, not on the order
+        or the content of the tickers file or on the process, unlike Python's salted hash(). Hosts
+        running different shards of the same universe therefore split it without coordinating, and
+        a ticker keeps its shard, and its run journal, when the tickers file changes.
+    """
+    return [symbol for symbol in symbols if shard_index(symbol, count) == index]
+
+
+def shard_path(path: str, index: int, count: int) -> str:
+    """
+    Get the path of a per-shard file or directory, e.g. 'run_journal.sqlite' -> 'run_journal.shard-0-of-4.sqlite'.
+    """
+    root, extension = os.path.splitext(path.rstrip(os.sep))
+    return f"{root}.shard-{index}-of-{count}{extension}"
+
+
+def _relay(stream: IO[str], output: IO[str], lock: threading.Lock, lines: list[int], position: int) -> None:
+    # Copy the lines of a worker's stdout whole, so that the NDJSON records of the workers do not interleave
+    for line in stream:
+        with lock:
+            output.write(line)
+            output.flush()
+        lines[position] += 1
+
+
+def launch_shards(argv: list[str], workers: int, journal_path: Optional[str] = None,
+                  output: IO[str] = sys.stdout, rate_limit: int = PROVIDER_RATE_LIMIT) -> int:
+    """
+    Run a subcommand of the command line interface in one worker process per shard, and merge their summaries.
+
+    Parameters
+    ----------
+    argv: list[str]
+        The command line arguments of the subcommand, which each worker runs with '--shard i/workers'.
+    workers: int
+        The number of worker processes, and of shards.
+    journal_path: Optional[str]
+        The run journal of the subcommand, whose per-shard journals are merged into the summary.
+    output: IO[str]
+        The stream the workers' stdout is copied to, line by line.
+    rate_limit: int
+        The requests per minute allowed by the provider, split evenly between the workers.
+
+    Returns
+    -------
+    int
+        The highest exit status of the workers.
+
+    Notes
+    -----
+    1. Rationale
+        A single process uses one core for cleaning the stock price data and building the models.
+        Running each shard in its own process scales the run with the number of cores, up to the
+        rate limit of the provider, which the workers split between them.
+
+    2. Implementation Details
+        - Each worker is `python -m src.main.cli` with the same arguments and '--shard i/N', so
+          it is the same command another host would run for its shard.
+        - The rate limiter of each worker only counts the requests of its own process, so each
+          worker is given PROVIDER_RATE_LIMIT / workers requests per minute through the
+          environment, and together they stay within the provider's quota.
+        - The stdout of the workers is copied line by line under a lock, and their stderr is
+          inherited.
+        - Once every worker exits, the number of lines each wrote and the counts of its run
+          journal are printed to stderr, with their totals and the tickers per second.
+    """
+    start: float = time.perf_counter()
+    environment: dict[str, str] = dict(os.environ, PROVIDER_RATE_LIMIT=str(max(1, rate_limit // workers)))
+    processes: list[subprocess.Popen] = [
+        subprocess.Popen([sys.executable, "-m", "src.main.cli", *argv, "--workers", "1",
+                          "--shard", f"{index}/{workers}"], stdout=subprocess.PIPE, text=True, env=environment)
+        for index in range(workers)
+    ]
+    lock: threading.Lock = threading.Lock()
+    lines: list[int] = [0] * workers
+    relays: list[threading.Thread] = [
+        threading.Thread(target=_relay, args=(process.stdout, output, lock, lines, index))
+        for index, process in enumerate(processes)
+    ]
+    for relay in relays:
+        relay.start()
+    statuses: list[int] = [process.wait() for process in processes]
+    for relay in relays:
+        relay.join()
+    elapsed: float = time.perf_counter() - start
+
+    total: Counter = Counter()
+    for index, status in enumerate(statuses):
+        summary: dict[str, int] = {}
+        if journal_path is not None and os.path.exists(shard_path(journal_path, index, workers)):
+            from src.main.helpers.run_journal import RunJournal
+
+            journal: RunJournal = RunJournal(shard_path(journal_path, index, workers))
+            summary = journal.summary()
+            journal.close()
+        total.update(summary)
+        print(f"Shard {index}/{workers}: exit status {status}, {lines[index]} lines, {summary}", file=sys.stderr)
+    tickers: int = sum(total.values()) or sum(lines)
+    print(f"{workers} shards in {elapsed:.2f}s ({tickers / elapsed if elapsed else 0:.1f} tickers/s): {dict(total)}",
+          file=sys.stderr)
+    return max(statuses, default=0)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.main.analysis.backtest import BACKTEST_METRICS, backtest
+
+
+def simulate(growth: np.ndarray, weights: np.ndarray, rebalance_every: int, cost: float) -> tuple[np.ndarray, float]:
+    # The value of one portfolio, holding by holding and period by period
+    value, turnover = 1.0, 0.0
+    holdings, cash = weights * value, 1 - weights.sum()
+    curve = np.empty(len(growth))
+    for period, period_growth in enumerate(growth):
+        holdings = holdings * period_growth
+        value = holdings.sum() + cash
+        curve[period] = value
+        if rebalance_every and (period + 1) % rebalance_every == 0 and period + 1 < len(growth):
+            traded = np.abs(weights - holdings / value).sum()
+            turnover += traded
+            value *= 1 - cost * traded
+            holdings, cash = weights * value, (1 - weights.sum()) * value
+    return curve, turnover
+
+
+def random_case(seed: int = 8) -> tuple[pd.DataFrame, np.ndarray]:
+    generator = np.random.default_rng(seed)
+    returns = pd.DataFrame(generator.normal(0.0003, 0.01, (300, 5)), columns=list("ABCDE"))
+    # A ticker without a return on some dates, carried at its last price
+    returns.iloc[[3, 50, 51], 2] = np.nan
+    weights = generator.dirichlet(np.ones(5), size=12)
+    # Candidates partly in cash, and with a short position
+    weights[:3] *= 0.8
+    weights[3] = [0.6, 0.6, -0.2, 0.0, 0.0]
+    return returns, weights
+
+
+@pytest.mark.parametrize("rebalance_every", [0, 1, 21])
+def test_backtest_matches_loop_reference(rebalance_every):
+    returns, weights = random_case()
+    growth = 1 + returns.fillna(0.0).to_numpy()
+
+    result = backtest(returns, weights, rebalance_every=rebalance_every, cost=0.001, max_workers=1)
+
+    assert result.columns.tolist() == BACKTEST_METRICS
+    for candidate, candidate_weights in enumerate(weights):
+        curve, turnover = simulate(growth, candidate_weights, rebalance_every, 0.001)
+        values = pd.Series(np.concatenate([[1.0], curve]))
+        period_returns = values.pct_change().dropna()
+        years = len(curve) / 252
+        metrics = result.iloc[candidate]
+        assert metrics["final_value"] == pytest.approx(curve[-1], rel=1e-10)
+        assert metrics["cagr"] == pytest.approx(curve[-1] ** (1 / years) - 1, rel=1e-9)
+        assert metrics["sharpe"] == pytest.approx(period_returns.mean() / period_returns.std() * np.sqrt(252),
+                                                  rel=1e-8)
+        assert metrics["max_drawdown"] == pytest.approx((values / values.cummax() - 1).min(), rel=1e-9)
+        assert metrics["turnover"] == pytest.approx(turnover / years, rel=1e-9, abs=1e-12)
+
+
+def test_schedules_chunks_and_workers_do_not_change_the_results():
+    returns, weights = random_case()
+    schedules = np.tile([0, 5, 21], 4)
+
+    result = backtest(returns, weights, rebalance_every=schedules, max_workers=1)
+
+    for candidate, schedule in enumerate(schedules):
+        alone = backtest(returns, weights[candidate], rebalance_every=int(schedule), max_workers=1)
+        pd.testing.assert_series_equal(result.iloc[candidate], alone.iloc[0], check_names=False)
+    pd.testing.assert_frame_equal(backtest(returns, weights, rebalance_every=schedules, max_workers=2,
+                                           chunk_size=2), result)
@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+from benchmarks.fakes import fake_firestore_db, synthetic_stock_price
+from src.main.data_models.stock_price_data import STOCK_PRICE_FIELDS, to_stock_data
+from src.main.helpers.firestore_bulk import read_panel, read_ticker_columns
+from src.main.helpers.firestore_update import read_stock_data, store_ticker_data
+
+FIELDS: list[str] = ["closing_price", "returns"]
+LAYOUTS: list[str] = ["daily", "monthly", "yearly"]
+
+
+def stored_db(layout: str):
+    firestore_db = fake_firestore_db()
+    stock_prices = {
+        "AAA": synthetic_stock_price(120, seed=1),
+        # Ending earlier, with missing bars
+        "BBB": synthetic_stock_price(90, seed=2, end_date="2023-12-15").drop(pd.Timestamp("2023-11-01")),
+        "CCC": synthetic_stock_price(10, seed=3),
+    }
+    for ticker, stock_price in stock_prices.items():
+        store_ticker_data(to_stock_data(ticker, stock_price, columnar=True), firestore_db, layout=layout)
+    return firestore_db, list(stock_prices)
+
+
+def expected_frame(ticker: str, firestore_db, layout: str, start_date=None, end_date=None) -> pd.DataFrame:
+    stock_data = read_stock_data(ticker, firestore_db, layout=layout, start_date=start_date, end_date=end_date)
+    return pd.DataFrame(list(stock_data.to_dict()["stock_price_data"]), columns=STOCK_PRICE_FIELDS)
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+@pytest.mark.parametrize("start_date, end_date", [(None, None), ("2023-10-17", "2023-12-12"),
+                                                  ("2023-12-02", None), (None, "2023-09-30")])
+def test_read_ticker_columns_matches_read_stock_data(layout, start_date, end_date):
+    firestore_db, tickers = stored_db(layout)
+
+    for ticker in tickers:
+        columns, _ = read_ticker_columns(ticker, firestore_db, FIELDS, layout=layout, start_date=start_date,
+                                         end_date=end_date, page_size=2)
+
+        # The chunks overlapping the range are trimmed to the bars within it
+        pd.testing.assert_frame_equal(pd.DataFrame(columns),
+                                      expected_frame(ticker, firestore_db, layout, start_date, end_date)[
+                                          ["date", *FIELDS]], check_dtype=False)
+
+
+@pytest.mark.parametrize("page_size", [1, 3, 4, 5, 6, 100])
+def test_pagination(page_size):
+    # 20 date documents, and 6 monthly chunks from August 2023 to January 2024, a whole number of pages for some
+    # page sizes
+    firestore_db = fake_firestore_db()
+    store_ticker_data(to_stock_data("AAA", synthetic_stock_price(20, seed=4), columnar=True), firestore_db,
+                      layout="daily")
+    store_ticker_data(to_stock_data("AAA", synthetic_stock_price(100, seed=4), columnar=True), firestore_db,
+                      layout="monthly")
+
+    for layout, n_documents, n_bars in [("daily", 20, 20), ("monthly", 6, 100)]:
+        rpcs = firestore_db.db.counters["rpcs"]
+        columns, documents = read_ticker_columns("AAA", firestore_db, FIELDS, layout=layout, page_size=page_size)
+
+        # A page shorter than page_size ends the stream, an exactly full last page needs one more query
+        assert firestore_db.db.counters["rpcs"] - rpcs == n_documents // page_size + 1
+        assert documents == n_documents and len(columns["date"]) == n_bars
+        assert columns["date"] == expected_frame("AAA", firestore_db, layout)["date"].tolist()
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_read_panel_aligns_tickers_with_different_dates(layout):
+    firestore_db, tickers = stored_db(layout)
+
+    panels = read_panel(tickers + ["ZZZ"], firestore_db, fields=FIELDS, layout=layout, start_date="2023-10-02",
+                        page_size=3)
+
+    for field in FIELDS:
+        expected = pd.DataFrame({ticker: expected_frame(ticker, firestore_db, layout, "2023-10-02")
+                                 .set_index("date")[field] for ticker in tickers}).sort_index()
+        expected["ZZZ"] = float("nan")
+        pd.testing.assert_frame_equal(panels[field], expected, check_names=False, check_index_type=False)
+    # The dates a ticker has no bar on are NaN, not the value of another date
+    dates = panels["closing_price"].index.str[:10]
+    assert (panels["closing_price"]["BBB"].isna().tolist()
+            == ((dates > "2023-12-15") | (dates == "2023-11-01")).tolist())
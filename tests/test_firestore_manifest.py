@@ -0,0 +1,47 @@
+import pytest
+
+from benchmarks.fakes import fake_firestore_db, synthetic_stock_price
+from src.main.data_models.stock_price_data import StockPriceData, to_stock_data
+from src.main.helpers.firestore_manifest import load_manifest, record_hash
+from src.main.helpers.firestore_update import store_ticker_data
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_incremental_writes_update_the_manifest(columnar):
+    firestore_db = fake_firestore_db()
+    stock_price = synthetic_stock_price(300, seed=3)
+
+    history = to_stock_data("AAA", stock_price.iloc[:200], columnar=columnar)
+    assert store_ticker_data(history, firestore_db, layout="daily") == 200
+    last_stock_price = StockPriceData(**list(history.records())[-1])
+
+    # An incremental run only holds the bars after the last stored one, continuing its metrics
+    new_bars = to_stock_data("AAA", stock_price, last_stock_price=last_stock_price, columnar=columnar)
+    assert store_ticker_data(new_bars, firestore_db, layout="daily") == 100
+    assert len(load_manifest("AAA", firestore_db)) == 300
+
+    # A full run after the incremental one finds every bar in the manifest
+    full = to_stock_data("AAA", stock_price, columnar=columnar)
+    assert store_ticker_data(full, firestore_db, layout="daily") == 0
+
+
+def test_changed_bars_are_rewritten():
+    firestore_db = fake_firestore_db()
+    stock_price = synthetic_stock_price(100, seed=4)
+    store_ticker_data(to_stock_data("AAA", stock_price, columnar=True), firestore_db, layout="daily")
+
+    # A provider correction of the last close only changes the last bar
+    corrected = stock_price.copy()
+    corrected.iloc[-1, 0] *= 1.01
+    assert store_ticker_data(to_stock_data("AAA", corrected, columnar=True), firestore_db, layout="daily") == 1
+    last_record = list(to_stock_data("AAA", corrected).records())[-1]
+    assert load_manifest("AAA", firestore_db)[last_record["date"]] == record_hash(last_record)
+
+
+def test_record_hash_ignores_rounding_noise():
+    record = {"date": "2024-01-02 00:00:00", "closing_price": 101.5, "returns": 0.015,
+              "holding_period_yield": 0.015, "holding_period_return": 1.015, "portfolio_of_1000": 1015.0}
+    noisy = dict(record, portfolio_of_1000=1015.0 * (1 + 1e-15))
+
+    assert record_hash(record) == record_hash(noisy)
+    assert record_hash(record) != record_hash(dict(record, closing_price=101.6))
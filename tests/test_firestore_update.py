@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+import src.main.helpers.firestore_update as firestore_update
+from benchmarks.fakes import fake_firestore_db, synthetic_stock_price
+from src.main.data_models.stock_price_data import STOCK_PRICE_FIELDS, ColumnarStockData, StockData, to_stock_data
+from src.main.helpers.firestore_chunks import migrate_to_chunked
+from src.main.helpers.firestore_update import read_stock_data, store_data
+
+
+def to_frame(stock_data) -> pd.DataFrame:
+    return pd.DataFrame(list(stock_data.records()), columns=STOCK_PRICE_FIELDS)
+
+
+@pytest.mark.parametrize("layout", ["daily", "monthly", "yearly"])
+@pytest.mark.parametrize("columnar", [False, True])
+def test_store_then_read_round_trip(layout, columnar):
+    firestore_db = fake_firestore_db()
+    stock_data = to_stock_data("AAA", synthetic_stock_price(700, seed=1), columnar=columnar)
+
+    writes = store_data([stock_data], firestore_db, layout=layout)
+    stored = read_stock_data("AAA", firestore_db, layout=layout)
+
+    assert isinstance(stored, (StockData, ColumnarStockData))
+    pd.testing.assert_frame_equal(to_frame(stored), to_frame(stock_data), check_dtype=False)
+    # One document per bar in the daily layout, one per month or year in the chunked layouts
+    assert writes == {"daily": 700, "monthly": 34, "yearly": 4}[layout]
+    # The writes are batched, a single document is never read before being written
+    assert firestore_db.db.counters["commits"] == {"daily": 2, "monthly": 1, "yearly": 1}[layout]
+    assert store_data([stock_data], firestore_db, layout=layout) == 0
+
+
+@pytest.mark.parametrize("layout", ["daily", "monthly", "yearly"])
+def test_read_date_range(layout):
+    firestore_db = fake_firestore_db()
+    stock_data = to_stock_data("AAA", synthetic_stock_price(700, seed=1), columnar=True)
+    store_data([stock_data], firestore_db, layout=layout)
+
+    stored = read_stock_data("AAA", firestore_db, layout=layout, start_date="2022-03-01", end_date="2022-06-30")
+
+    expected = to_frame(stock_data)
+    expected = expected.loc[(expected["date"] >= "2022-03-01") & (expected["date"] < "2022-07-01")]
+    pd.testing.assert_frame_equal(to_frame(stored), expected.reset_index(drop=True), check_dtype=False)
+
+
+def test_store_data_collects_failures(monkeypatch):
+    store_stock_data = firestore_update.store_stock_data
+
+    def failing_store_stock_data(stock_data, firestore_db, **kwargs):
+        if stock_data.ticker == "BAD":
+            raise ValueError("write failed")
+        return store_stock_data(stock_data, firestore_db, **kwargs)
+
+    monkeypatch.setattr(firestore_update, "store_stock_data", failing_store_stock_data)
+    stock_data_list = [to_stock_data(ticker, synthetic_stock_price(50, seed=seed), columnar=True)
+                       for seed, ticker in enumerate(["AAA", "BAD", "CCC"])]
+
+    failed = {}
+    assert store_data(stock_data_list, fake_firestore_db(), layout="daily", failed=failed) == 100
+    assert list(failed) == ["BAD"]
+
+    firestore_db = fake_firestore_db()
+    with pytest.raises(RuntimeError, match="BAD") as raised:
+        store_data(stock_data_list, firestore_db, layout="daily")
+    assert isinstance(raised.value.__cause__, ValueError)
+    # The other tickers are stored before the failures are raised
+    assert len(read_stock_data("CCC", firestore_db).stock_price_data) == 50
+
+
+@pytest.mark.parametrize("layout", ["monthly", "yearly"])
+def test_migrate_to_chunked_again_writes_only_changed_chunks(layout):
+    firestore_db = fake_firestore_db()
+    store_data([to_stock_data("AAA", synthetic_stock_price(300, seed=3))], firestore_db, layout="daily")
+
+    assert migrate_to_chunked("AAA", firestore_db, layout) == {"monthly": 15, "yearly": 3}[layout]
+    assert migrate_to_chunked("AAA", firestore_db, layout) == 0
+    # A date document added since, in the last period
+    store_data([to_stock_data("AAA", synthetic_stock_price(301, seed=3, end_date="2024-01-02"))], firestore_db,
+               layout="daily")
+    assert migrate_to_chunked("AAA", firestore_db, layout) == 1
+    pd.testing.assert_frame_equal(to_frame(read_stock_data("AAA", firestore_db, layout=layout)),
+                                  to_frame(read_stock_data("AAA", firestore_db, layout="daily")), check_dtype=False)
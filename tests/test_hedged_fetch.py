@@ -0,0 +1,127 @@
+import time
+
+import pandas as pd
+import pytest
+
+import src.main.helpers.hedged_fetch as hedged_fetch
+from benchmarks.fakes import synthetic_stock_price
+from src.main.helpers.hedged_fetch import HedgedFetcher, normalize_stock_price
+from src.main.helpers.instrumentation import Instrumentation
+from src.main.helpers.rate_limiter import ProviderRateLimiter
+
+PROVIDERS: list[str] = ["fmp", "polygon", "tiingo"]
+
+
+@pytest.fixture
+def counters(monkeypatch) -> Instrumentation:
+    instrumentation = Instrumentation(enabled=True)
+    monkeypatch.setattr(hedged_fetch, "instrumentation", instrumentation)
+    return instrumentation
+
+
+def counted(instrumentation: Instrumentation) -> dict[str, float]:
+    counters = instrumentation.summary()["counters"]
+    return {counter: counters.get(counter, 0) for counter in ["hedged_requests", "hedge_wins"]}
+
+
+def stub_request(answers: dict[str, tuple[float, object]]):
+    # A request answering each provider after a delay with a frame, or raising an exception
+    def request(provider: str) -> pd.DataFrame:
+        delay, answer = answers[provider]
+        time.sleep(delay)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    return request
+
+
+def fetcher(**kwargs) -> HedgedFetcher:
+    return HedgedFetcher(providers=PROVIDERS, rate_limiter=ProviderRateLimiter(requests_per_minute=10 ** 9),
+                         **{"percentile": 90, "min_samples": 5, "initial_delay": 10.0, **kwargs})
+
+
+def prices(seed: int) -> pd.DataFrame:
+    return synthetic_stock_price(5, seed=seed)
+
+
+def test_fast_primary_is_not_hedged(counters):
+    hedged = fetcher()
+    for _ in range(5):
+        hedged.histograms["fmp"].record(0.5)
+
+    stock_price, provider = hedged.fetch(stub_request({"fmp": (0.0, prices(1))}), primary="fmp", symbol="AAA")
+
+    assert provider == "fmp"
+    pd.testing.assert_frame_equal(stock_price, normalize_stock_price(prices(1)))
+    assert counted(counters) == {"hedged_requests": 0, "hedge_wins": 0}
+
+
+def test_slow_primary_is_hedged_after_its_percentile(counters):
+    hedged = fetcher()
+    # Once the primary has min_samples latencies, its 90th percentile replaces the initial delay
+    for _ in range(5):
+        hedged.histograms["fmp"].record(0.01)
+    assert hedged.threshold("fmp") == pytest.approx(0.01, rel=0.2)
+    assert hedged.threshold("polygon") == 10.0
+
+    start = time.perf_counter()
+    stock_price, provider = hedged.fetch(stub_request({"fmp": (1.0, prices(1)), "polygon": (0.0, prices(2))}),
+                                         primary="fmp", symbol="AAA")
+
+    assert provider == "polygon" and time.perf_counter() - start < 0.5
+    pd.testing.assert_frame_equal(stock_price, normalize_stock_price(prices(2)))
+    assert counted(counters) == {"hedged_requests": 1, "hedge_wins": 1}
+
+
+def test_first_valid_answer_wins(counters):
+    hedged = fetcher(initial_delay=0.02)
+
+    # The providers are asked 20ms apart, the last one asked answers first
+    stock_price, provider = hedged.fetch(stub_request({"fmp": (1.0, prices(1)), "polygon": (0.6, prices(2)),
+                                                       "tiingo": (0.05, prices(3))}), primary="fmp")
+
+    assert provider == "tiingo"
+    pd.testing.assert_frame_equal(stock_price, normalize_stock_price(prices(3)))
+    assert counted(counters) == {"hedged_requests": 2, "hedge_wins": 1}
+
+
+def test_errors_and_empty_answers_fall_through(counters):
+    hedged = fetcher()
+    empty = pd.DataFrame({"close": []}, index=pd.DatetimeIndex([], name="date"))
+
+    # Without waiting for the initial delay
+    start = time.perf_counter()
+    stock_price, provider = hedged.fetch(stub_request({"fmp": (0.0, ConnectionError("fmp down")),
+                                                       "polygon": (0.0, empty), "tiingo": (0.0, prices(3))}),
+                                         primary="fmp")
+
+    assert provider == "tiingo" and time.perf_counter() - start < 1
+    assert len(stock_price) == 5
+    assert counted(counters) == {"hedged_requests": 2, "hedge_wins": 1}
+
+
+def test_primary_valid_answer_after_an_empty_hedge(counters):
+    hedged = fetcher(initial_delay=0.02)
+
+    stock_price, provider = hedged.fetch(stub_request({"fmp": (0.2, prices(1)),
+                                                       "polygon": (0.0, prices(2).iloc[:0]),
+                                                       "tiingo": (1.0, prices(3))}), primary="fmp")
+
+    assert provider == "fmp"
+    assert counted(counters) == {"hedged_requests": 2, "hedge_wins": 0}
+
+
+def test_raises_the_error_of_the_primary(counters):
+    hedged = fetcher(initial_delay=0.02)
+
+    # The primary fails last, after the other providers
+    with pytest.raises(ConnectionError, match="fmp down"):
+        hedged.fetch(stub_request({"fmp": (0.2, ConnectionError("fmp down")),
+                                   "polygon": (0.0, ValueError("polygon down")),
+                                   "tiingo": (0.0, prices(3).iloc[:0])}), primary="fmp")
+    # A primary without bars raises a ValueError
+    with pytest.raises(ValueError, match="No stock price data from polygon"):
+        hedged.fetch(stub_request({"fmp": (0.0, ValueError("fmp down")), "polygon": (0.0, prices(2).iloc[:0]),
+                                   "tiingo": (0.0, TimeoutError())}), primary="polygon")
+    assert hedged.stats()["fmp"]["requests"] == 2
@@ -0,0 +1,40 @@
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.import_time import HEAVY_MODULES, PROJECT_DIR, TARGETS, import_times
+
+# The cumulative import time of the command line help in milliseconds, a few times its usual time, which pandas
+# alone exceeds
+CLI_HELP_BUDGET_MS: float = 300
+
+
+def startup_statement(arguments: list[str]) -> str:
+    # The statement running a target of benchmarks.import_time, a module run with -m or a -c statement
+    if arguments[0] == "-m":
+        return (f"import runpy\nsys.argv = {[arguments[1], *arguments[2:]]!r}\n"
+                f"try:\n    runpy.run_module({arguments[1]!r}, run_name='__main__')\nexcept SystemExit:\n    pass")
+    return arguments[1]
+
+
+@pytest.mark.parametrize("target", list(TARGETS))
+def test_startup_does_not_import_heavy_modules(target):
+    code = (f"import sys\n{startup_statement(TARGETS[target])}\n"
+            f"print(','.join(module for module in {HEAVY_MODULES!r} if module in sys.modules))")
+
+    # A fresh interpreter, as the test process may already have imported the modules
+    process = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, capture_output=True, text=True)
+
+    assert process.returncode == 0, process.stderr
+    assert process.stdout.splitlines()[-1] == ""
+
+
+def test_cli_help_import_time_budget():
+    # The best of a few runs, so that a slow start of the machine does not fail the test
+    runs = [import_times(TARGETS["cli --help"]) for _ in range(3)]
+
+    for top_level, modules in runs:
+        assert "src.main" in modules and not any(module in modules for module in HEAVY_MODULES)
+    total_ms = min(sum(top_level.values()) for top_level, _ in runs) / 1000
+    assert total_ms <= CLI_HELP_BUDGET_MS, f"cli --help imports in {total_ms:.0f}ms"
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.fakes import synthetic_stock_price
+from src.main.analysis.indicators import (EMA_SPAN, INDICATOR_FIELDS, SMA_WINDOW, IndicatorState, drawdown, ema,
+                                          indicator_panels, rsi, sma)
+
+
+def close_panel() -> pd.DataFrame:
+    # A ticker listed after the first dates of the panel, next to one with the whole history
+    return pd.DataFrame({"AAA": synthetic_stock_price(300, seed=5)["close"],
+                         "BBB": synthetic_stock_price(180, seed=6)["close"]})
+
+
+def test_reference_values():
+    close = pd.DataFrame({"AAA": [100.0, 120.0, 90.0, 99.0]})
+
+    np.testing.assert_allclose(sma(close, 2)["AAA"], [np.nan, 110.0, 105.0, 94.5])
+    # alpha = 2 / (3 + 1) = 0.5, starting at the first close
+    np.testing.assert_allclose(ema(close, 3)["AAA"], [100.0, 110.0, 100.0, 99.5])
+    np.testing.assert_allclose(drawdown(close)["AAA"], [0.0, 0.0, -0.25, -0.175])
+    # Only gains, then only losses, over a window of 2 changes
+    np.testing.assert_allclose(rsi(pd.DataFrame({"AAA": [1.0, 2.0, 3.0]}), 2)["AAA"], [np.nan, np.nan, 100.0])
+    np.testing.assert_allclose(rsi(pd.DataFrame({"AAA": [3.0, 2.0, 1.0]}), 2)["AAA"], [np.nan, np.nan, 0.0])
+
+
+def test_panel_matches_each_ticker_alone():
+    close = close_panel()
+
+    panels = indicator_panels(close)
+
+    for ticker in close.columns:
+        alone = indicator_panels(close[[ticker]].dropna())
+        for field in INDICATOR_FIELDS:
+            pd.testing.assert_series_equal(panels[field][ticker].dropna(), alone[field][ticker].dropna(),
+                                           check_names=False)
+
+
+def test_panel_matches_loop_reference():
+    close = close_panel()["BBB"].dropna().to_numpy()
+
+    panels = indicator_panels(close_panel())
+
+    expected_sma = [close[end - SMA_WINDOW:end].mean() for end in range(SMA_WINDOW, len(close) + 1)]
+    np.testing.assert_allclose(panels["sma"]["BBB"].dropna(), expected_sma)
+    alpha = 2 / (EMA_SPAN + 1)
+    expected_ema = [close[0]]
+    for value in close[1:]:
+        expected_ema.append((1 - alpha) * expected_ema[-1] + alpha * value)
+    np.testing.assert_allclose(panels["ema"]["BBB"].dropna(), expected_ema)
+
+
+def test_incremental_state_matches_panel():
+    close = close_panel()["AAA"]
+    panels = indicator_panels(close.to_frame())
+
+    state = IndicatorState.from_closes(close.iloc[:200])
+    # The state is stored between runs
+    state = IndicatorState(**state.model_dump())
+    for date, value in close.iloc[200:].items():
+        values = state.update(value)
+        for field in INDICATOR_FIELDS:
+            np.testing.assert_allclose(values[field], panels[field].at[date, "AAA"], rtol=1e-9, err_msg=field)
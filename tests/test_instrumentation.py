@@ -0,0 +1,60 @@
+import json
+import os
+import pstats
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.main.helpers.instrumentation import Instrumentation
+
+
+def worker_function(n: int) -> int:
+    return sum(range(n))
+
+
+def waiting_function(started: threading.Event, release: threading.Event) -> None:
+    started.set()
+    release.wait()
+
+
+def profiled_functions(directory: str) -> set[str]:
+    return {function for _, _, function in pstats.Stats(os.path.join(directory, "ingestion.pstats")).stats}
+
+
+def test_profile_merges_threads_and_stops_on_export(tmp_path):
+    instrumentation = Instrumentation(enabled=True, profile=True)
+    started, release = threading.Event(), threading.Event()
+
+    instrumentation.start()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert list(executor.map(worker_function, [10, 20, 30])) == [45, 190, 435]
+        # A call still running in a worker thread when the run is exported
+        waiting = executor.submit(waiting_function, started, release)
+        started.wait()
+        with instrumentation.stage("store", "AAA"):
+            instrumentation.count("rows", 3, ticker="AAA")
+        instrumentation.export(str(tmp_path / "run"))
+        release.set()
+        waiting.result()
+
+    # The calls of the worker threads, finished or not, are merged with the calls of this thread
+    assert {"worker_function", "waiting_function"} <= profiled_functions(str(tmp_path / "run"))
+    with open(tmp_path / "run" / "ingestion.json") as summary_file:
+        summary = json.load(summary_file)
+    assert summary["counters"] == {"rows": 3} and summary["stages"]["store"]["calls"] == 1
+    # The threads started after the export are not profiled
+    assert threading.getprofile() is None
+    thread = threading.Thread(target=worker_function, args=(10,))
+    thread.start()
+    thread.join()
+    assert instrumentation._thread_profilers == []
+
+
+def test_disabled_instrumentation_records_nothing(tmp_path):
+    instrumentation = Instrumentation(enabled=False, profile=True)
+
+    instrumentation.start()
+    instrumentation.count("rows", 3)
+    instrumentation.export(str(tmp_path / "run"))
+
+    assert threading.getprofile() is None
+    assert not os.path.exists(tmp_path / "run") and instrumentation.summary()["counters"] == {}
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.main.helpers.local_store as local_store_module
+from benchmarks.fakes import synthetic_stock_price
+from src.main.data_models.stock_price_data import to_stock_data
+from src.main.helpers.local_store import PANEL_FIELDS, LocalPanelStore
+
+
+@pytest.fixture(autouse=True)
+def small_capacity(monkeypatch):
+    # Small files, so that a few bars grow them
+    monkeypatch.setattr(local_store_module, "INITIAL_DATE_CAPACITY", 8)
+    monkeypatch.setattr(local_store_module, "INITIAL_TICKER_CAPACITY", 2)
+
+
+def stock_data(ticker: str, n_days: int, seed: int, end_date: str = "2024-01-01"):
+    return to_stock_data(ticker, synthetic_stock_price(n_days, seed=seed, end_date=end_date), columnar=True)
+
+
+def expected_panel(stock_data_list, field: str) -> pd.DataFrame:
+    return pd.DataFrame({data.ticker: data.frame.set_index("date")[field] for data in stock_data_list}).sort_index()
+
+
+def assert_panels_match(local_store: LocalPanelStore, stock_data_list) -> None:
+    for field in PANEL_FIELDS:
+        pd.testing.assert_frame_equal(local_store.panel(field), expected_panel(stock_data_list, field),
+                                      check_names=False, check_index_type=False)
+
+
+def test_append_and_grow(tmp_path):
+    local_store = LocalPanelStore(str(tmp_path))
+    stock_data_list = [stock_data("AAA", 20, seed=1), stock_data("BBB", 10, seed=2), stock_data("CCC", 30, seed=3)]
+
+    for data in stock_data_list:
+        assert local_store.write(data) == len(data)
+
+    assert_panels_match(local_store, stock_data_list)
+    # The capacities doubled past the 30 dates and 3 tickers, and only the current generation is kept
+    assert (local_store._date_capacity, local_store._ticker_capacity) == (32, 4)
+    assert sorted(os.listdir(tmp_path)) == sorted([f"{field}.{local_store._generation}.f64" for field in PANEL_FIELDS]
+                                                  + ["meta.json"])
+    # A new day is appended to the files in place
+    generation = local_store._generation
+    appended = stock_data("AAA", 21, seed=1, end_date="2024-01-02")
+    local_store.write(appended)
+    assert local_store._generation == generation
+    assert_panels_match(LocalPanelStore(str(tmp_path)), [appended, *stock_data_list[1:]])
+
+
+def test_out_of_order_backfill(tmp_path):
+    local_store = LocalPanelStore(str(tmp_path))
+    recent = stock_data("AAA", 5, seed=1)
+    local_store.write(recent)
+    # A ticker whose history starts before, and interleaves with, the stored dates
+    backfilled = stock_data("BBB", 12, seed=2, end_date="2023-12-28")
+    local_store.write(backfilled)
+
+    assert local_store.dates == sorted(local_store.dates)
+    assert_panels_match(local_store, [recent, backfilled])
+    assert_panels_match(LocalPanelStore(str(tmp_path)), [recent, backfilled])
+
+
+def test_panel_selection_and_errors(tmp_path):
+    local_store = LocalPanelStore(str(tmp_path))
+    assert local_store.panel("closing_price").empty
+    data = stock_data("AAA", 5, seed=1)
+    local_store.write(data)
+
+    selected = local_store.panel("closing_price", ["ZZZ", "AAA"])
+    assert selected.columns.tolist() == ["ZZZ", "AAA"] and selected["ZZZ"].isna().all()
+    np.testing.assert_array_equal(selected["AAA"], data.frame["closing_price"])
+    with pytest.raises(ValueError, match="Unknown field"):
+        local_store.panel("volume")
+
+
+def test_reader_of_a_replaced_generation(tmp_path, monkeypatch):
+    writer = LocalPanelStore(str(tmp_path))
+    first = stock_data("AAA", 5, seed=1)
+    writer.write(first)
+    reader = LocalPanelStore(str(tmp_path))
+    mapped = reader.panel("closing_price")
+    stale_meta = reader._read_meta()
+
+    # The next write grows the files, a new generation with another shape
+    second = stock_data("BBB", 20, seed=2)
+    writer.write(second)
+
+    # A reader which mapped the previous generation keeps its values
+    pd.testing.assert_frame_equal(mapped, expected_panel([first], "closing_price"), check_names=False,
+                                  check_index_type=False)
+    # A reader which read meta.json before the write maps the new generation instead of the removed one
+    reads = iter([stale_meta])
+    read_meta = reader._read_meta
+    monkeypatch.setattr(reader, "_read_meta", lambda: next(reads, None) or read_meta())
+    pd.testing.assert_frame_equal(reader.panel("closing_price"), expected_panel([first, second], "closing_price"),
+                                  check_names=False, check_index_type=False)
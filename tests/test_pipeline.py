@@ -0,0 +1,41 @@
+import pytest
+
+import src.main.data_models.stock_price_data as stock_price_data
+from benchmarks.fakes import StubProvider, fake_firestore_db
+from src.main.app import run_pipeline
+from src.main.helpers.firestore_update import read_stock_data
+from src.main.helpers.local_store import LocalPanelStore
+from src.main.helpers.run_journal import RunJournal
+
+SYMBOLS: list[str] = ["AAA", "BBB", "CCC"]
+
+
+@pytest.fixture
+def stub(monkeypatch) -> StubProvider:
+    stub = StubProvider(n_days=30)
+    monkeypatch.setattr(stock_price_data, "obb", stub.as_obb())
+    return stub
+
+
+class FailingLocalStore(LocalPanelStore):
+    def write(self, stock_data):
+        if stock_data.ticker == "BBB":
+            raise OSError("No space left on device")
+        return super().write(stock_data)
+
+
+def test_local_store_failure_is_not_stored(stub, tmp_path):
+    firestore_db = fake_firestore_db()
+    journal = RunJournal(str(tmp_path / "journal.sqlite"))
+    journal.start({"symbols": SYMBOLS})
+
+    failed = run_pipeline(SYMBOLS, firestore_db, incremental=False, log_stream=None, intervals=[],
+                          start_date="2023-01-01", local_store=FailingLocalStore(str(tmp_path / "local")),
+                          journal=journal)
+
+    assert list(failed) == ["BBB"]
+    # The ticker is neither in firestore nor journaled as stored, so a resumed run processes it again
+    assert len(read_stock_data("BBB", firestore_db, layout="daily").stock_price_data) == 0
+    assert len(read_stock_data("AAA", firestore_db, layout="daily").stock_price_data) == 30
+    assert journal.summary() == {"stored": 2, "failed": 1}
+    assert journal.pending(SYMBOLS) == ["BBB"]
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.main.analysis.portfolio import (CovarianceCache, mean_variance_weights, minimum_variance_weights,
+                                         optimize_portfolio, risk_parity_weights)
+
+
+def random_returns(n_days: int = 400, n_tickers: int = 6, seed: int = 7) -> pd.DataFrame:
+    generator = np.random.default_rng(seed)
+    mixing = generator.normal(0, 0.01, (n_tickers, n_tickers))
+    return pd.DataFrame(generator.normal(0, 1, (n_days, n_tickers)) @ mixing,
+                        index=[f"2020-{day:04d}" for day in range(n_days)],
+                        columns=[f"T{ticker}" for ticker in range(n_tickers)])
+
+
+def ledoit_wolf(values: np.ndarray) -> tuple[np.ndarray, float]:
+    # The Ledoit-Wolf shrinkage towards a scaled identity, computed from its definition
+    n_days, n_tickers = values.shape
+    demeaned = values - values.mean(axis=0)
+    sample = demeaned.T @ demeaned / n_days
+    target = np.trace(sample) / n_tickers * np.eye(n_tickers)
+    distance = np.sum((sample - target) ** 2)
+    estimation_error = sum(np.sum((np.outer(day, day) - sample) ** 2) for day in demeaned) / n_days ** 2
+    shrinkage = min(estimation_error, distance) / distance
+    return shrinkage * target + (1 - shrinkage) * sample, shrinkage
+
+
+def test_covariance_matches_reference():
+    returns = random_returns()
+
+    cache = CovarianceCache.from_returns(returns)
+
+    np.testing.assert_allclose(cache.sample_covariance(), np.cov(returns.to_numpy().T, bias=True), rtol=1e-9)
+    covariance, shrinkage = ledoit_wolf(returns.to_numpy())
+    assert cache.shrinkage == pytest.approx(shrinkage, rel=1e-9)
+    np.testing.assert_allclose(cache.covariance(), covariance, rtol=1e-9)
+
+
+def test_incremental_covariance_matches_full(tmp_path):
+    returns = random_returns()
+
+    cache = CovarianceCache.from_returns(returns.iloc[:300])
+    cache.save(str(tmp_path / "covariance.npz"))
+    cache = CovarianceCache.load(str(tmp_path / "covariance.npz"))
+    assert cache.extend(returns) == 100
+
+    full = CovarianceCache.from_returns(returns)
+    assert cache.count == full.count and cache.last_date == full.last_date
+    np.testing.assert_allclose(cache.covariance(), full.covariance(), rtol=1e-9)
+    assert cache.shrinkage == pytest.approx(full.shrinkage, rel=1e-9)
+
+
+def test_weights_match_closed_forms():
+    covariance = CovarianceCache.from_returns(random_returns()).covariance()
+    ones = np.ones(len(covariance))
+
+    inverse_ones = np.linalg.solve(covariance, ones)
+    np.testing.assert_allclose(minimum_variance_weights(covariance, long_only=False), inverse_ones / inverse_ones.sum())
+
+    expected_returns = np.linspace(0.0, 0.001, len(covariance))
+    weights = mean_variance_weights(expected_returns, covariance, risk_aversion=2.0, long_only=False)
+    # The gradient of the objective is the same for every asset at the optimum under the budget constraint
+    gradient = expected_returns - 2.0 * covariance @ weights
+    np.testing.assert_allclose(gradient, gradient.mean(), atol=1e-12)
+    assert weights.sum() == pytest.approx(1.0)
+
+    assert (minimum_variance_weights(covariance) >= 0).all()
+    weights = risk_parity_weights(covariance)
+    contributions = weights * (covariance @ weights)
+    np.testing.assert_allclose(contributions, contributions.mean(), rtol=1e-6)
+
+
+def test_short_history_is_left_out():
+    returns = random_returns()
+    # A ticker listed shortly before the last date
+    returns.iloc[:350, 0] = np.nan
+
+    weights, cache = optimize_portfolio(returns, min_history=100)
+
+    assert weights.index.tolist() == returns.columns.tolist()
+    assert weights.iloc[0] == 0.0 and weights.sum() == pytest.approx(1.0)
+    # The covariance of the other tickers is estimated on their whole history
+    assert cache.tickers == returns.columns[1:].tolist() and cache.count == len(returns)
@@ -0,0 +1,139 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.main.helpers.query_service import LRUCache, QueryServer, QueryService, select_dates
+
+DATES: list[str] = ["2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05", "2024-01-08"]
+PANEL: pd.DataFrame = pd.DataFrame({"AAA": [1.0, 2.0, 3.0, 4.0, 5.0], "BBB": [np.nan, 20.0, np.nan, 40.0, 50.0]},
+                                   index=pd.Index(DATES, name="date"))
+
+
+class RecordingLoader:
+    # A PanelLoader over PANEL recording the tickers of each call, and running a hook during the load
+    def __init__(self):
+        self.calls: list[list[str]] = []
+        self.during_load = None
+
+    def __call__(self, tickers: list[str], field: str) -> pd.DataFrame:
+        self.calls.append(tickers)
+        if self.during_load is not None:
+            self.during_load()
+        return PANEL.reindex(columns=tickers)
+
+
+def test_lru_eviction_within_budget():
+    cache = LRUCache(max_bytes=100)
+    for key in "abc":
+        cache.put(key, key, 40, [key.upper()], cache.version)
+
+    # Adding the third entry evicted the least recently used one
+    assert cache.get("a") is None and cache.stats()["bytes"] == 80
+    cache.get("b")
+    cache.put("d", "d", 40, ["D"], cache.version)
+    assert cache.get("c") is None and cache.get("b") == "b"
+    # An entry larger than the budget is not added and evicts nothing
+    cache.put("e", "e", 101, ["E"], cache.version)
+    assert cache.get("e") is None and cache.get("d") == "d"
+    assert cache.stats() == {"entries": 2, "bytes": 80, "max_bytes": 100, "hits": 3, "misses": 3, "evictions": 2}
+
+
+def test_invalidate_by_ticker():
+    cache = LRUCache(max_bytes=1000)
+    cache.put("a", 1, 10, ["AAA"], cache.version)
+    cache.put("ab", 2, 10, ["AAA", "BBB"], cache.version)
+    cache.put("b", 3, 10, ["BBB"], cache.version)
+
+    assert cache.invalidate(["AAA", "ZZZ"]) == 2
+    assert cache.get("a") is None and cache.get("ab") is None and cache.get("b") == 3
+    assert cache.size == 10 and "AAA" not in cache._keys and cache._keys["BBB"] == {"b"}
+    assert cache.invalidate() == 1 and cache.size == 0
+
+
+def test_value_loaded_before_an_invalidation_is_not_cached():
+    loader = RecordingLoader()
+    service = QueryService(loader, max_bytes=2 ** 20)
+    # New bars of AAA are stored while its series is loaded
+    loader.during_load = lambda: service.invalidate(["AAA"])
+
+    series = service.series(["AAA"], "closing_price")["AAA"]
+
+    np.testing.assert_array_equal(series[1], PANEL["AAA"])
+    assert service.cache.stats()["entries"] == 0
+    loader.during_load = None
+    service.series(["AAA"], "closing_price")
+    service.series(["AAA"], "closing_price")
+    assert loader.calls == [["AAA"], ["AAA"]]
+
+
+def test_series_are_loaded_once_in_bulk():
+    loader = RecordingLoader()
+    service = QueryService(loader, max_bytes=2 ** 20)
+
+    service.series(["AAA"], "closing_price")
+    found = service.series(["AAA", "BBB", "BBB"], "closing_price")
+
+    # Only the missing ticker is loaded, and the dates without a bar are left out of its series
+    assert loader.calls == [["AAA"], ["BBB"]]
+    assert np.datetime_as_string(found["BBB"][0]).tolist() == ["2024-01-03", "2024-01-05", "2024-01-08"]
+    with pytest.raises(ValueError, match="Unknown field"):
+        service.series(["AAA"], "volume")
+
+
+@pytest.mark.parametrize("start_date, end_date, expected", [
+    (None, None, DATES),
+    ("2024-01-03", "2024-01-05", DATES[1:4]),
+    # Bounds between bars, and on the first and last bars
+    ("2024-01-06", None, DATES[4:]),
+    ("2024-01-02", "2024-01-02", DATES[:1]),
+    (None, "2024-01-07", DATES[:4]),
+    ("2024-01-09", None, []),
+    ("2024-01-05", "2024-01-04", []),
+])
+def test_select_dates(start_date, end_date, expected):
+    series = (np.array(DATES, dtype="datetime64[D]"), np.arange(len(DATES), dtype=float))
+
+    dates, values = select_dates(series, start_date, end_date)
+
+    assert np.datetime_as_string(dates).tolist() == expected
+    np.testing.assert_array_equal(values, [DATES.index(date) for date in expected])
+
+
+def test_select_dates_rejects_invalid_dates():
+    with pytest.raises(ValueError):
+        select_dates((np.array(DATES, dtype="datetime64[D]"), np.zeros(len(DATES))), "2024-13-01")
+
+
+def test_http_round_trip():
+    loader = RecordingLoader()
+    server = QueryServer(("127.0.0.1", 0), QueryService(loader, max_bytes=2 ** 20))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def request(path: str, method: str = "GET") -> tuple[int, dict]:
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url + path, method=method), timeout=5) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    try:
+        assert request("/series/AAA?start=2024-01-03&end=2024-01-04") == (200, {
+            "ticker": "AAA", "field": "closing_price", "dates": ["2024-01-03", "2024-01-04"], "values": [2.0, 3.0]})
+        assert request("/panel?tickers=AAA,BBB&start=2024-01-04") == (200, {
+            "field": "closing_price", "tickers": ["AAA", "BBB"], "dates": DATES[2:],
+            "values": [[3.0, 4.0, 5.0], [None, 40.0, 50.0]]})
+        assert request("/invalidate?tickers=BBB", method="POST") == (200, {"invalidated": 2})
+        assert request("/series/AAA?field=volume")[0] == 400
+        assert request("/unknown")[0] == 404
+        assert request("/stats")[1]["entries"] == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert loader.calls == [["AAA"], ["BBB"]]
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from benchmarks.fakes import fake_firestore_db, synthetic_stock_price
+from src.main.analysis.resample import RESAMPLE_FREQUENCIES, resample_stock_data
+from src.main.data_models.stock_price_data import STOCK_PRICE_FIELDS, StockPriceData, to_stock_data
+from src.main.helpers.firestore_update import read_stock_data, store_interval_data, store_ticker_data
+
+
+def to_frame(records) -> pd.DataFrame:
+    return pd.DataFrame(list(records), columns=STOCK_PRICE_FIELDS).set_index("date")
+
+
+def stored_bars(firestore_db, ticker: str, interval: str) -> pd.DataFrame:
+    return to_frame(sorted((snapshot.to_dict() for snapshot in firestore_db.interval_collection(ticker, interval)
+                            .stream()), key=lambda record: record["date"]))
+
+
+def test_reference_values():
+    stock_price = pd.DataFrame({"close": [100.0, 101.0, 110.0, 120.0, 99.0]},
+                               index=pd.to_datetime(["2024-01-02", "2024-01-05", "2024-01-08", "2024-01-31",
+                                                     "2024-02-01"]))
+
+    weekly = to_frame(resample_stock_data([to_stock_data("AAA", stock_price)], "1W")[0].records())
+
+    assert weekly.index.str[:10].tolist() == ["2024-01-05", "2024-01-12", "2024-02-02"]
+    assert weekly["closing_price"].tolist() == [101.0, 110.0, 99.0]
+    assert weekly["portfolio_of_1000"].iloc[1:].tolist() == pytest.approx([1000 * 110 / 101, 1000 * 99 / 101])
+
+
+@pytest.mark.parametrize("interval", list(RESAMPLE_FREQUENCIES))
+# Split on a Friday, where the new daily bars start a new period, and mid-week, where they extend the last one
+@pytest.mark.parametrize("split_date", ["2023-06-30", "2023-07-12"])
+def test_incremental_resampling_matches_full(interval, split_date):
+    stock_price = synthetic_stock_price(400, seed=9)
+    history = stock_price.loc[:split_date]
+    full = to_frame(resample_stock_data([to_stock_data("AAA", stock_price)], interval)[0].records())
+    stored = to_frame(resample_stock_data([to_stock_data("AAA", history)], interval)[0].records())
+    last_daily_bar = StockPriceData(**list(to_stock_data("AAA", history).records())[-1])
+    new_daily_bars = to_stock_data("AAA", stock_price, last_stock_price=last_daily_bar, columnar=True)
+
+    last_stock_price = StockPriceData(date=stored.index[-1], **stored.iloc[-1])
+    incremental = to_frame(resample_stock_data([new_daily_bars], interval, {"AAA": last_stock_price})[0].records())
+
+    # The incremental bars replace the last stored one if they fall in its period
+    combined = pd.concat([stored.loc[stored.index < incremental.index[0]], incremental])
+    pd.testing.assert_frame_equal(combined, full, check_exact=False, rtol=1e-12)
+
+
+def test_store_interval_data_backfills_new_intervals():
+    firestore_db = fake_firestore_db()
+    stock_price = synthetic_stock_price(400, seed=10)
+    history = to_stock_data("AAA", stock_price.loc[:"2023-08-09"], columnar=True)
+    # The daily bars are stored before the intervals are enabled
+    store_ticker_data(history, firestore_db, layout="daily")
+
+    for end_date in ["2023-10-18", "2023-12-29", None]:
+        last_stock_price = StockPriceData(**list(read_stock_data("AAA", firestore_db).records())[-1])
+        new_daily_bars = to_stock_data("AAA", stock_price.loc[:end_date], last_stock_price=last_stock_price,
+                                       columnar=True)
+        store_interval_data(new_daily_bars, firestore_db, ["1W", "1M"], incremental=True)
+        store_ticker_data(new_daily_bars, firestore_db, layout="daily")
+
+    for interval in ["1W", "1M"]:
+        full = to_frame(resample_stock_data([to_stock_data("AAA", stock_price)], interval)[0].records())
+        pd.testing.assert_frame_equal(stored_bars(firestore_db, "AAA", interval), full, check_exact=False,
+                                      rtol=1e-12)
@@ -0,0 +1,115 @@
+import os
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import src.main.helpers.response_cache as response_cache
+from benchmarks.fakes import StubProvider
+from src.main.helpers.response_cache import ProviderCache
+
+
+class Clock:
+    # The time.time of the cache, advanced by the tests
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=clock.time))
+    return clock
+
+
+class RecordingFetch:
+    # A fetch function of ProviderCache.historical over a StubProvider, recording the requested ranges
+    def __init__(self, stub: StubProvider, symbol: str):
+        self.stub = stub
+        self.symbol = symbol
+        self.ranges: list[tuple] = []
+
+    def __call__(self, start_date: str, end_date: str) -> pd.DataFrame:
+        self.ranges.append((start_date, end_date))
+        return self.stub.historical(self.symbol, start_date=start_date, end_date=end_date).to_df()
+
+
+class IncompleteLastBar(RecordingFetch):
+    # A fetch function answering a different close for the last bar, as on the day of the bar
+    def __call__(self, start_date: str, end_date: str) -> pd.DataFrame:
+        stock_price = super().__call__(start_date, end_date)
+        stock_price.iloc[-1] *= 0.9
+        return stock_price
+
+
+def historical(cache: ProviderCache, fetch: RecordingFetch, start_date: str, end_date=None) -> pd.DataFrame:
+    return cache.historical(fetch, provider="fmp", symbol=fetch.symbol, interval="1d", start_date=start_date,
+                            end_date=end_date)
+
+
+def test_current_day_expires_after_ttl(tmp_path, clock):
+    cache = ProviderCache(str(tmp_path), ttl_seconds=900)
+    fetch = RecordingFetch(StubProvider(n_days=300), "AAA")
+    today = pd.Timestamp.today().strftime("%Y-%m-%d")
+
+    first = historical(cache, fetch, "2023-06-01")
+    clock.now += 899
+    pd.testing.assert_frame_equal(historical(cache, fetch, "2023-06-01"), first, check_freq=False)
+    assert cache.stats() == {"hits": 1, "partial_hits": 0, "misses": 1}
+
+    # Past the TTL, only the current day is fetched again
+    clock.now += 2
+    historical(cache, fetch, "2023-06-01")
+    assert fetch.ranges == [("2023-06-01", today), (today, today)]
+    assert cache.stats() == {"hits": 1, "partial_hits": 1, "misses": 1}
+    # A range ending before today never expires
+    clock.now += 10 ** 6
+    historical(cache, fetch, "2023-07-01", "2023-12-01")
+    assert len(fetch.ranges) == 2 and cache.hits == 2
+
+
+def test_partial_hit_fetches_only_the_tail(tmp_path, clock):
+    cache = ProviderCache(str(tmp_path))
+    stub = StubProvider(n_days=300)
+    fetch = RecordingFetch(stub, "AAA")
+    expected = stub.historical("AAA", start_date="2023-06-01", end_date="2024-01-01").to_df()
+    # The last bar of the first response is incomplete, it is replaced by the tail
+    historical(cache, IncompleteLastBar(stub, "AAA"), "2023-06-01", "2023-12-01")
+    merged = historical(cache, fetch, "2023-06-01", "2024-01-01")
+
+    assert fetch.ranges == [("2023-12-01", "2024-01-01")]
+    pd.testing.assert_frame_equal(merged, expected, check_freq=False, check_names=False, check_index_type=False)
+    # The merged entry covers the whole range
+    pd.testing.assert_frame_equal(historical(cache, fetch, "2023-08-01", "2023-12-15"),
+                                  expected.loc["2023-08-01":"2023-12-15"], check_freq=False, check_names=False,
+                                  check_index_type=False)
+    assert len(fetch.ranges) == 1
+    assert cache.stats() == {"hits": 1, "partial_hits": 1, "misses": 1}
+
+
+def test_lru_eviction_to_the_size_cap(tmp_path, clock):
+    cache = ProviderCache(str(tmp_path))
+    stub = StubProvider(n_days=300)
+    for symbol in ["AAA", "BBB", "CCC"]:
+        clock.now += 1
+        historical(cache, RecordingFetch(stub, symbol), "2023-06-01", "2023-12-01")
+    entry_size = os.path.getsize(os.path.join(str(tmp_path), "fmp__1d__AAA.parquet"))
+    clock.now += 1
+    historical(cache, RecordingFetch(stub, "AAA"), "2023-06-01", "2023-12-01")
+
+    # Room for two entries, the least recently used BBB and CCC make room for DDD
+    cache.max_bytes = int(2.5 * entry_size)
+    clock.now += 1
+    historical(cache, RecordingFetch(stub, "DDD"), "2023-06-01", "2023-12-01")
+
+    assert sorted(os.listdir(str(tmp_path))) == ["fmp__1d__AAA.json", "fmp__1d__AAA.parquet", "fmp__1d__DDD.json",
+                                                 "fmp__1d__DDD.parquet"]
+    assert sum(os.path.getsize(os.path.join(str(tmp_path), name)) for name in os.listdir(str(tmp_path))
+               if name.endswith(".parquet")) <= cache.max_bytes
+    # An evicted entry is fetched again
+    fetch = RecordingFetch(stub, "BBB")
+    historical(cache, fetch, "2023-06-01", "2023-12-01")
+    assert fetch.ranges == [("2023-06-01", "2023-12-01")]
@@ -0,0 +1,134 @@
+import pytest
+
+import src.main.cli as cli
+import src.main.data_models.stock_price_data as stock_price_data
+import src.main.helpers.firestore_update as firestore_update
+from benchmarks.fakes import StubProvider, fake_firestore_db
+from src.main.app import run_pipeline
+from src.main.data_models.stock_price_data import to_stock_data
+from src.main.helpers.firestore_update import read_stock_data
+from src.main.helpers.run_journal import RunJournal, retry_delay
+
+SYMBOLS: list[str] = ["AAA", "BBB", "CCC", "DDD"]
+PARAMETERS: dict = {"provider": "yfinance", "start_date": "2023-01-01", "end_date": None, "full": True}
+
+
+class FlakyProvider(StubProvider):
+    # A stub provider failing the first requests of some symbols, counting the requests of each symbol
+    def __init__(self, failures: dict[str, int]):
+        super().__init__(n_days=30)
+        self.failures = dict(failures)
+        self.requests: dict[str, int] = {}
+
+    def historical(self, symbol: str, **kwargs):
+        self.requests[symbol] = self.requests.get(symbol, 0) + 1
+        if self.failures.get(symbol):
+            self.failures[symbol] -= 1
+            raise ConnectionError(f"Provider unavailable for {symbol}")
+        return super().historical(symbol, **kwargs)
+
+
+def install(monkeypatch, provider: FlakyProvider) -> None:
+    monkeypatch.setattr(stock_price_data, "obb", provider.as_obb())
+
+
+def ticker_rows(journal: RunJournal) -> dict[str, tuple]:
+    return {ticker: (status, attempts) for ticker, status, attempts
+            in journal._execute("SELECT ticker, status, attempts FROM tickers")}
+
+
+def test_resume_requires_the_same_parameters(tmp_path):
+    journal = RunJournal(str(tmp_path / "journal.sqlite"))
+    with pytest.raises(ValueError, match="No run to resume"):
+        journal.resume(PARAMETERS)
+
+    journal.start(PARAMETERS)
+
+    journal.resume(dict(PARAMETERS))
+    with pytest.raises(ValueError, match="was started with"):
+        journal.resume({**PARAMETERS, "provider": "fmp"})
+    with pytest.raises(ValueError, match="was started with"):
+        journal.resume({key: value for key, value in PARAMETERS.items() if key != "end_date"})
+
+
+def test_pending_skips_only_stored_tickers(tmp_path):
+    journal = RunJournal(str(tmp_path / "journal.sqlite"))
+    journal.start(PARAMETERS)
+    for ticker in ["AAA", "BBB", "CCC"]:
+        journal.record_fetched(to_stock_data(ticker, StubProvider(n_days=5).historical(ticker).to_df()))
+    journal.record_stored("AAA")
+    journal.record_failed("CCC", ConnectionError("timeout"))
+
+    # Fetched but not stored, failed and never seen tickers are pending, in the given order
+    assert journal.pending(["DDD", "CCC", "BBB", "AAA"]) == ["DDD", "CCC", "BBB"]
+    assert journal.summary() == {"stored": 1, "fetched": 1, "failed": 1}
+    # Starting a new run discards the progress
+    journal.start(PARAMETERS)
+    assert journal.pending(SYMBOLS) == SYMBOLS
+
+
+def test_record_failed_counts_attempts(tmp_path):
+    journal = RunJournal(str(tmp_path / "journal.sqlite"))
+    journal.start(PARAMETERS)
+
+    journal.record_failed("AAA", ConnectionError("first"))
+    journal.record_failed("AAA", ValueError("second"))
+    assert ticker_rows(journal) == {"AAA": ("failed", 2)}
+    assert journal._execute("SELECT error FROM tickers")[0][0] == repr(ValueError("second"))
+
+    # A later success keeps the count and clears the error
+    journal.record_fetched(to_stock_data("AAA", StubProvider(n_days=5).historical("AAA").to_df()))
+    journal.record_stored("AAA")
+    assert ticker_rows(journal) == {"AAA": ("stored", 2)}
+    assert journal._execute("SELECT error, bars FROM tickers") == [(None, 5)]
+
+
+def test_retry_delay_doubles():
+    assert [retry_delay(attempt, 1.5) for attempt in [1, 2, 3]] == [1.5, 3.0, 6.0]
+
+
+def test_resume_a_run_failing_part_way(monkeypatch, tmp_path):
+    firestore_db = fake_firestore_db()
+    provider = FlakyProvider({"CCC": 1, "DDD": 1})
+    install(monkeypatch, provider)
+    journal = RunJournal(str(tmp_path / "journal.sqlite"))
+    journal.start(PARAMETERS)
+
+    failed = run_pipeline(SYMBOLS, firestore_db, incremental=False, log_stream=None, start_date="2023-01-01",
+                          batch_size=1, intervals=[], journal=journal)
+    journal.close()
+
+    assert sorted(failed) == ["CCC", "DDD"]
+    # The next run reopens the journal and only processes the failed tickers
+    journal = RunJournal(str(tmp_path / "journal.sqlite"))
+    journal.resume(PARAMETERS)
+    pending = journal.pending(SYMBOLS)
+    assert pending == ["CCC", "DDD"]
+    assert run_pipeline(pending, firestore_db, incremental=False, log_stream=None, start_date="2023-01-01",
+                        batch_size=1, intervals=[], journal=journal) == {}
+
+    assert provider.requests == {"AAA": 1, "BBB": 1, "CCC": 2, "DDD": 2}
+    assert ticker_rows(journal) == {"AAA": ("stored", 0), "BBB": ("stored", 0), "CCC": ("stored", 1),
+                                    "DDD": ("stored", 1)}
+    for ticker in SYMBOLS:
+        assert len(read_stock_data(ticker, firestore_db, layout="daily").stock_price_data) == 30
+
+
+@pytest.mark.parametrize("retries, status", [(2, 0), (1, 1)])
+def test_cli_store_retries_failed_tickers(monkeypatch, tmp_path, retries, status):
+    firestore_db = fake_firestore_db()
+    monkeypatch.setattr(firestore_update, "FirestoreDB", lambda: firestore_db)
+    monkeypatch.setattr(cli, "RUN_RETRY_BACKOFF", 0)
+    provider = FlakyProvider({"BBB": 2})
+    install(monkeypatch, provider)
+    journal_path = str(tmp_path / "journal.sqlite")
+
+    exit_status = cli.main(["store", "--tickers", "AAA", "BBB", "CCC", "--start-date", "2023-01-01", "--full",
+                            "--quiet", "--batch-size", "1", "--intervals", "--retries", str(retries),
+                            "--journal", journal_path])
+
+    assert exit_status == status
+    # Each retry only requests the tickers which failed
+    assert provider.requests == {"AAA": 1, "BBB": retries + 1, "CCC": 1}
+    expected = ("stored", 2) if status == 0 else ("failed", 2)
+    assert ticker_rows(RunJournal(journal_path)) == {"AAA": ("stored", 0), "BBB": expected, "CCC": ("stored", 0)}
@@ -0,0 +1,64 @@
+import json
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+from src.main.helpers.read_csv import read_ticker_symbols
+from src.main.helpers.sharding import parse_shard, shard_index, shard_path, shard_symbols
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TICKER_FILES: list[str] = ["data/sp-500-ticker-list.csv", "data/test.csv"]
+
+
+def universe() -> list[str]:
+    return list(dict.fromkeys(symbol for file_path in TICKER_FILES
+                              for symbol in read_ticker_symbols(os.path.join(PROJECT_DIR, file_path), "Symbol")))
+
+
+@pytest.mark.parametrize("count", [1, 3, 4])
+def test_shards_partition_the_universe(count):
+    symbols = universe()
+
+    shards = [shard_symbols(symbols, index, count) for index in range(count)]
+
+    # Every ticker is in exactly one shard, in the order of the universe
+    assert sorted(symbol for shard in shards for symbol in shard) == sorted(symbols)
+    for shard in shards:
+        assert shard == [symbol for symbol in symbols if symbol in set(shard)]
+    if count > 1:
+        assert all(shards), "a shard of the universe is empty"
+
+
+@pytest.mark.parametrize("count", [1, 3, 4])
+def test_shards_are_stable(count):
+    symbols = universe()
+    assignment = {symbol: shard_index(symbol, count) for symbol in symbols}
+
+    # The shard of a ticker does not depend on the order or the other tickers of the universe
+    shuffled = random.Random(count).sample(symbols, len(symbols))
+    subset = shuffled[:50] + ["NEWCO"]
+    for index in range(count):
+        expected = [symbol for symbol in shuffled if assignment[symbol] == index]
+        assert shard_symbols(shuffled, index, count) == expected
+        assert [symbol for symbol in shard_symbols(subset, index, count) if symbol != "NEWCO"] == [
+            symbol for symbol in expected if symbol in subset]
+    # Nor on the process, unlike the salted hash()
+    code = (f"import json\nfrom src.main.helpers.sharding import shard_index\n"
+            f"print(json.dumps({{symbol: shard_index(symbol, {count}) for symbol in {symbols!r}}}))")
+    for hash_seed in ["1", "2"]:
+        process = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, capture_output=True, text=True,
+                                 env={**os.environ, "PYTHONHASHSEED": hash_seed})
+        assert process.returncode == 0, process.stderr
+        assert json.loads(process.stdout) == assignment
+
+
+def test_parse_shard_and_shard_path():
+    assert parse_shard("1/4") == (1, 4)
+    for shard in ["4/4", "-1/4", "1", "a/b"]:
+        with pytest.raises(ValueError, match="Invalid shard"):
+            parse_shard(shard)
+    assert shard_path("data/run_journal.sqlite", 1, 4) == "data/run_journal.shard-1-of-4.sqlite"
+    assert shard_path(".cache/local/", 0, 3) == ".cache/local.shard-0-of-3"
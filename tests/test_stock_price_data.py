@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.fakes import synthetic_stock_price
+from src.main.data_models.stock_price_data import (StockPriceData, clean_stock_price, clean_stock_price_panel,
+                                                   split_stock_price_panel)
+
+FIELDS = ["closing_price", "returns", "holding_period_yield", "holding_period_return", "portfolio_of_1000"]
+
+
+def test_clean_stock_price_reference_values():
+    stock_price = pd.DataFrame({"close": [100.0, 110.0, 99.0]}, index=pd.bdate_range("2024-01-01", periods=3))
+
+    clean = clean_stock_price(stock_price)
+
+    np.testing.assert_allclose(clean["returns"], [np.nan, 0.1, -0.1])
+    np.testing.assert_allclose(clean["holding_period_return"], [np.nan, 1.1, 0.9])
+    np.testing.assert_allclose(clean["portfolio_of_1000"], [np.nan, 1100.0, 990.0])
+
+
+def test_clean_stock_price_continues_from_last_stock_price():
+    stock_price = synthetic_stock_price(300, seed=2)
+    full = clean_stock_price(stock_price)
+    last = full.iloc[199]
+    last_stock_price = StockPriceData(**{field: last[field] for field in ["date", *FIELDS]})
+
+    incremental = clean_stock_price(stock_price, last_stock_price=last_stock_price)
+
+    pd.testing.assert_frame_equal(incremental[FIELDS], full[FIELDS].iloc[200:])
+
+
+def test_clean_stock_price_panel_matches_clean_stock_price():
+    # Tickers listed on different dates, one of them with missing bars
+    raw = {ticker: synthetic_stock_price(n_days, seed=seed)
+           for seed, (ticker, n_days) in enumerate([("AAA", 300), ("BBB", 120), ("CCC", 250)])}
+    raw["CCC"] = raw["CCC"].drop(raw["CCC"].index[[10, 11, 100]])
+    close = pd.DataFrame({ticker: stock_price["close"] for ticker, stock_price in raw.items()})
+
+    frames = split_stock_price_panel(clean_stock_price_panel(close))
+
+    for ticker, stock_price in raw.items():
+        expected = clean_stock_price(stock_price)
+        pd.testing.assert_frame_equal(frames[ticker][FIELDS], expected[FIELDS], check_names=False)
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fakes import synthetic_stock_price
+from src.main.data_models.stock_price_data import StockPriceData, clean_stock_price
+from src.main.data_models.stock_price_polars import CLEAN_COLUMNS, clean_stock_price_universe
+
+
+def raw_stock_prices() -> dict[str, pd.DataFrame]:
+    stock_prices = {ticker: synthetic_stock_price(n_days, seed=seed)
+                    for seed, (ticker, n_days) in enumerate([("AAA", 120), ("BBB", 80), ("CCC", 120), ("DDD", 60)])}
+    # Missing bars, and NaN closes in the middle, on consecutive bars, and on the first and last bars
+    stock_prices["BBB"] = stock_prices["BBB"].drop(stock_prices["BBB"].index[[5, 6, 40]])
+    stock_prices["CCC"].iloc[[6, 30, 31, -1], 0] = np.nan
+    stock_prices["DDD"].iloc[0, 0] = np.nan
+    return stock_prices
+
+
+def assert_engines_match(stock_prices, last_stock_prices=None):
+    expected = clean_stock_price_universe(stock_prices, engine="pandas", last_stock_prices=last_stock_prices)
+    cleaned = clean_stock_price_universe(stock_prices, engine="polars", last_stock_prices=last_stock_prices)
+
+    # The polars engine leaves out the tickers without new bars
+    assert list(cleaned) == [ticker for ticker, frame in expected.items() if len(frame)]
+    for ticker, frame in cleaned.items():
+        pd.testing.assert_frame_equal(frame[CLEAN_COLUMNS], expected[ticker][CLEAN_COLUMNS], check_dtype=False,
+                                      check_names=False, check_index_type=False)
+
+
+def test_engines_match_with_nan_closes_and_missing_bars():
+    stock_prices = raw_stock_prices()
+
+    assert_engines_match(stock_prices)
+    # The portfolio value resumes after a NaN close instead of staying NaN
+    portfolio = clean_stock_price_universe(stock_prices, engine="polars")["CCC"]["portfolio_of_1000"]
+    assert portfolio.iloc[[6, 7]].isna().all() and portfolio.iloc[8:30].notna().all()
+
+
+@pytest.mark.parametrize("last_portfolio", [1234.5, np.nan])
+def test_engines_match_in_incremental_mode(last_portfolio):
+    stock_prices = raw_stock_prices()
+    last_stock_prices = {}
+    for ticker, position in [("AAA", 99), ("BBB", 20), ("CCC", 29)]:
+        last = clean_stock_price(stock_prices[ticker]).iloc[position]
+        last_stock_prices[ticker] = StockPriceData(date=last["date"], closing_price=last["closing_price"],
+                                                   returns=last["returns"],
+                                                   holding_period_yield=last["holding_period_yield"],
+                                                   holding_period_return=last["holding_period_return"],
+                                                   portfolio_of_1000=last_portfolio)
+    # A ticker whose last stored bar is its last bar has nothing new
+    last = clean_stock_price(stock_prices["DDD"]).iloc[-1]
+    last_stock_prices["DDD"] = StockPriceData(**{field: last[field] for field in StockPriceData.model_fields})
+
+    assert_engines_match(stock_prices, last_stock_prices)
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError, match="engine"):
+        clean_stock_price_universe(raw_stock_prices(), engine="spark")
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.main.data_models.stock_price_validation import (MAD_TO_SIGMA, REPORT_COLUMNS, ROW_CHECKS, _group_median,
+                                                         trading_days, validate_stock_price)
+
+# The NYSE holidays of the ranges below. Juneteenth is a holiday from 2022 on, observed on Monday 2022-06-20.
+HOLIDAYS: list[str] = ["2021-04-02", "2021-05-31", "2021-07-05", "2022-04-15", "2022-05-30", "2022-06-20",
+                       "2022-07-04"]
+SIGMA: float = 8
+
+
+def bars(start: str, end: str, seed: int) -> pd.DataFrame:
+    days: pd.DatetimeIndex = pd.bdate_range(start, end, freq="C", holidays=HOLIDAYS)
+    rng: np.random.Generator = np.random.default_rng(seed)
+    return pd.DataFrame({"date": days.strftime("%Y-%m-%d 00:00:00"),
+                         "closing_price": 100 * np.cumprod(1 + rng.normal(0, 0.01, len(days)))})
+
+
+def raw_frames() -> dict[str, pd.DataFrame]:
+    # An isolated spike, a lasting split-like jump and missing bars, over Good Friday and Juneteenth 2021
+    aaa = bars("2021-03-25", "2021-07-09", seed=1)
+    aaa.loc[20, "closing_price"] *= 1.5
+    aaa.loc[50:, "closing_price"] /= 2
+    aaa = aaa.drop([5, 30, 31]).reset_index(drop=True)
+    # Duplicates corrected by a later row, invalid closes and dates, an unsorted row and a bar on Good Friday 2022
+    bbb = bars("2022-04-01", "2022-07-08", seed=2)
+    bbb.loc[[10, 11, 12], "closing_price"] = [np.nan, 0.0, -5.0]
+    bbb.loc[40, "date"] = "not a date"
+    bbb = pd.concat([bbb, bbb.loc[[25]].assign(closing_price=bbb.loc[25, "closing_price"] * 1.001),
+                     pd.DataFrame({"date": ["2022-04-15 00:00:00"], "closing_price": [bbb.loc[9, "closing_price"]]})])
+    bbb = pd.concat([bbb.drop(bbb.index[[30]]), bbb.iloc[[30]]], ignore_index=True)
+    # A jump in two steps in the same direction, which is not a spike
+    ccc = bars("2021-06-01", "2021-06-30", seed=3)
+    ccc.loc[10:, "closing_price"] *= 1.4
+    ccc.loc[11:, "closing_price"] *= 1.4
+    # A single bar, and no valid bar
+    ddd = bars("2022-06-01", "2022-06-01", seed=4)
+    eee = pd.DataFrame({"date": ["2022-06-01 00:00:00", "2022-06-02 00:00:00"], "closing_price": [np.nan, -1.0]})
+    return {"AAA": aaa, "BBB": bbb, "CCC": ccc, "DDD": ddd, "EEE": eee}
+
+
+def interleave(frames: dict[str, pd.DataFrame], seed: int) -> tuple[pd.DataFrame, np.ndarray]:
+    # The rows of the tickers in a random interleaving, keeping the order of the rows of each ticker
+    tickers: np.ndarray = np.random.default_rng(seed).permutation(
+        np.repeat(list(frames), [len(frame) for frame in frames.values()]))
+    rows: dict[str, list] = {ticker: frame.to_dict("records") for ticker, frame in frames.items()}
+    positions: dict[str, int] = dict.fromkeys(frames, 0)
+    records: list[dict] = []
+    for ticker in tickers:
+        records.append(rows[ticker][positions[ticker]])
+        positions[ticker] += 1
+    return pd.DataFrame(records, columns=["date", "closing_price"]), tickers
+
+
+def reference(frame: pd.DataFrame, sigma: float, spikes_only: bool) -> tuple[pd.DataFrame, pd.Series]:
+    # The checks of the rows of a single ticker, written with pandas operations
+    days: pd.Series = (pd.to_datetime(frame["date"], format="ISO8601", utc=True, errors="coerce")
+                       .dt.tz_localize(None).dt.normalize())
+    close: pd.Series = frame["closing_price"]
+    checks: pd.DataFrame = pd.DataFrame(False, index=frame.index, columns=ROW_CHECKS)
+    checks["invalid_dates"] = days.isna()
+    checks["invalid_closes"] = ~(np.isfinite(close) & (close > 0))
+    latest: pd.Series = days.cummax().ffill().shift(1)
+    checks["unsorted_dates"] = latest.notna() & (days.isna() | (days < latest))
+    checks["duplicate_dates"] = days.notna() & days.duplicated(keep="last")
+
+    valid: pd.Index = days[~checks[["invalid_dates", "invalid_closes", "duplicate_dates"]].any(axis=1)].sort_values(
+        kind="stable").index
+    returns: pd.Series = np.log(close[valid]).diff()
+    if returns.notna().any():
+        deviation: pd.Series = (returns - returns.median()).abs()
+        scale: float = MAD_TO_SIGMA * deviation.median()
+        outliers: pd.Series = (deviation > sigma * scale) if scale > 0 else deviation > np.inf
+        if spikes_only:
+            sign: pd.Series = np.sign(returns)
+            outliers = outliers & outliers.shift(-1, fill_value=False) & (sign != sign.shift(-1))
+        checks.loc[valid, "return_outliers"] = outliers
+
+    missing_dates: int = 0
+    if len(valid):
+        calendar_days: pd.DatetimeIndex = pd.bdate_range(days[valid].min(), days[valid].max(), freq="C",
+                                                         holidays=HOLIDAYS)
+        missing_dates = len(calendar_days.difference(pd.DatetimeIndex(days[valid])))
+    bad: pd.Series = checks.any(axis=1)
+    report: pd.DataFrame = pd.DataFrame({"rows": len(frame), "bad_rows": int(bad.sum()),
+                                         **checks.sum().astype(int).to_dict(), "missing_dates": missing_dates},
+                                        index=[0], columns=REPORT_COLUMNS)
+    return report, bad
+
+
+@pytest.mark.parametrize("spikes_only", [False, True])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_matches_per_ticker_reference(spikes_only, seed):
+    frame, tickers = interleave(raw_frames(), seed)
+
+    report, bad = validate_stock_price(frame, tickers, sigma=SIGMA, spikes_only=spikes_only)
+
+    expected_bad: np.ndarray = np.zeros(len(frame), dtype=bool)
+    expected_reports: list[pd.DataFrame] = []
+    for ticker in pd.unique(tickers):
+        ticker_report, ticker_bad = reference(frame[tickers == ticker], SIGMA, spikes_only)
+        expected_reports.append(ticker_report.set_axis(pd.Index([ticker], name="ticker")))
+        expected_bad[ticker_bad.index] = ticker_bad
+    pd.testing.assert_frame_equal(report, pd.concat(expected_reports), check_dtype=False)
+    np.testing.assert_array_equal(bad, expected_bad)
+
+
+def test_checks_flag_the_expected_rows():
+    frames: dict[str, pd.DataFrame] = raw_frames()
+    frame: pd.DataFrame = pd.concat(frames.values(), ignore_index=True)
+    tickers: np.ndarray = np.repeat(list(frames), [len(ticker_frame) for ticker_frame in frames.values()])
+
+    report, _ = validate_stock_price(frame, tickers, sigma=SIGMA)
+    spikes, _ = validate_stock_price(frame, tickers, sigma=SIGMA, spikes_only=True)
+
+    # The spike is flagged on the jump and on the return back, and the split and each step of the jump once,
+    # while only the spike is flagged with spikes_only
+    assert report["return_outliers"].tolist() == [3, 0, 2, 0, 0]
+    assert spikes["return_outliers"].tolist() == [1, 0, 0, 0, 0]
+    # The invalid date, the correction, the bar on Good Friday and the row moved to the end follow later dates
+    assert report.loc["BBB", ["invalid_dates", "invalid_closes", "duplicate_dates", "unsorted_dates"]].tolist() == [
+        1, 3, 1, 4]
+    # The missing bars, and the invalid bars of BBB, which the bar on Good Friday 2022 does not make up for
+    assert report["missing_dates"].tolist() == [3, 4, 0, 0, 0]
+    # Juneteenth 2021 is a trading day, Juneteenth 2022 is not
+    assert pd.Timestamp("2021-06-18") in trading_days(np.datetime64("2021-06-01"), np.datetime64("2021-06-30"))
+    assert pd.Timestamp("2022-06-20") not in trading_days(np.datetime64("2022-06-01"), np.datetime64("2022-06-30"))
+
+
+def test_group_median():
+    rng: np.random.Generator = np.random.default_rng(5)
+    codes: np.ndarray = rng.integers(0, 50, 2000)
+    values: np.ndarray = np.where(codes % 2, rng.normal(0, 1e-2, 2000), rng.normal(500, 200, 2000))
+    # Groups of even and odd sizes, and a group without values
+    codes[codes == 7] = 8
+    codes[:3] = 49
+    codes[3:] = np.where(codes[3:] == 49, 48, codes[3:])
+
+    median: np.ndarray = _group_median(codes, values, 51)
+
+    expected: np.ndarray = np.array([np.median(values[codes == code]) if np.any(codes == code) else np.nan
+                                     for code in range(51)])
+    np.testing.assert_allclose(median, expected, rtol=0, atol=1e-8)
+    assert np.isnan(median[[7, 50]]).all()
+    assert np.isnan(_group_median(np.array([], dtype=np.int64), np.array([]), 2)).all()